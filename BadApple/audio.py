@@ -2,145 +2,38 @@
 #files for this were preprocessed and downsampled in Audacity, and converted to IMA with SoX (Sound eXchange) as follows:
 #sox inputfilename outputfilename.ima
 
-#there is a slight tick every time a buffer is filled - I suspect that running the audio loop entirely in RAM will likely eliminate it.
-#the only part that still runs from flash is setting the pulse width, but configuring PWM with raw register writes if a hassle so it's been left for now.
-
-import time
-import struct
-import _thread
-import array
-
-bufsize = 800 #enough for 6 frames at 30 FPS at 8 KHz
-sampledelay = 125 #microseconds between samples
-buf1 = bytearray(bufsize)
-buf2 = bytearray(bufsize)
-data = None
-playing = False
-
-#current buffer, pos in buffer, bufsize, current sample, total samples, buf1NeedsFilling, buf2NeedsFilling
-bufstate = array.array("I", [0, 0, bufsize, 0, 0, 1, 1])
-
-IMAindextable = array.array("i", [ #it appears that only ptr32 works with signed numbers in viper
-    -1, -1, -1, -1, 2, 4, 6, 8,
-    -1, -1, -1, -1, 2, 4, 6, 8
-])
-
-IMAsteptable = array.array("h", [
-    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 
-    19, 21, 23, 25, 28, 31, 34, 37, 41, 45, 
-    50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 
-    130, 143, 157, 173, 190, 209, 230, 253, 279, 307,
-    337, 371, 408, 449, 494, 544, 598, 658, 724, 796,
-    876, 963, 1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 
-    2272, 2499, 2749, 3024, 3327, 3660, 4026, 4428, 4871, 5358,
-    5894, 6484, 7132, 7845, 8630, 9493, 10442, 11487, 12635, 13899, 
-    15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794, 32767
-])
-
-@micropython.viper
-def audioloop():
-    from machine import PWM, Pin
-    pwm = PWM(Pin(23), freq=120000)
-    setwidth = pwm.duty_u16 #Redefining these reduces clicks. Directly writing to the register would be better, but this works.
-    #curtime = time.ticks_us
-    curtime = ptr32(0x400b0028) #location of microsecond register, as per RP2350 datasheet (TIMERAWL of TIMER0)
-    state:ptr32 = ptr32(bufstate)
-    b1:ptr8 = ptr8(buf1)
-    b2:ptr8 = ptr8(buf2)
-    delay:int = int(sampledelay)
-    #nexttime:int = int(curtime()) + delay
-    nexttime:int = (curtime[0] & 0x3fffffff) #mask off highest bit so it can't be treated as signed - should be 7 instead of 3 but can't due to viper funkiness
-    
-    indextable:ptr32 = ptr32(IMAindextable)
-    steptable:ptr16 = ptr16(IMAsteptable)
-    prediction:int = 32768 #would normally be 0 and signed, but since duty_u16 is unsigned, the offset is built-in here. Over/underflow checks have been changed accordingly.
-    index:int = 0
-    step:int = steptable[index]
-    delta:int = 0
-    diff:int = 0
-    
-    while state[3] < state[4]: #still playing
-        if state[0]: #second buffer
-            delta = b2[state[1]]
-        else: #first buffer
-            delta = b1[state[1]]
-        
-        if state[3] & 1: #odd sample
-            delta &= 0b1111 #NOTE: Some variants of IMA ADPCM swap which half is processed first
-            state[1] += 1 #increment bufpos
-            if state[1] >= state[2]: #if end of buffer
-                state[5+state[0]] = 1 #set flag
-                state[0] ^= 1 #swap buffers
-                state[1] = 0 #reset bufpos
-        else:
-            delta >>= 4
-        
-        state[3] += 1 #increment sample number
-        
-        diff = step >> 3 #calculate next sample
-        if delta & 0b100: diff += step
-        if delta & 0b10: diff += (step >> 1)
-        if delta & 0b1: diff += (step >> 2)
-        if delta & 0b1000:
-            prediction -= diff
-            if prediction < 0: prediction = 0 #cap to valid range (normally -32768 with no offset)
-        else:
-            prediction += diff
-            if prediction > 65535: prediction = 65535 #normally 32767 with no offset
-        
-        index += indextable[delta] #update state
-        if index < 0: index = 0
-        elif index > 88: index = 88
-        step = steptable[index]
-        
-        #while int(curtime()) < nexttime: pass
-        while (curtime[0] & 0x3fffffff) < nexttime or (curtime[0] & 0x3fffffff) - nexttime > 0x1fffffff: pass #wait for next sample, or for overflow
-        setwidth(prediction) #TODO: Replace this line with raw register writes
-        nexttime += delay
-        nexttime &= 0x3fffffff #keep within valid range
-    
-    setwidth(0)
-    pwm.deinit()
-    print("Thread ended")
-    stop()
-
-
-def fillbufs():
-    global bufstate
-    if bufstate[5]: #5 and 6 are the buffer empty flags
-        data.readinto(buf1)
-        bufstate[5] = 0
-        print("buf1 filled")
-    if bufstate[6]:
-        data.readinto(buf2)
-        bufstate[6] = 0
-        print("buf2 filled")
-
-
-validrates = [15625, 12500, 10000, 8000, 6250, 5000, 4000] #not exhaustive - anything that evenly divides 1000000, provided fillbuffs() is called often enough to keep up
+#the streaming, decoding and output live in imastream.py, which is shared with the other games that play .ima audio.
+#this only keeps the interface main.py uses.
+
+import imastream
+
+bufstate = imastream.state #current sample and total samples are [3] and [4], mvf.play() uses them as its clock
+
+
+def fillbufs(): #top up the ADPCM ring from the file, call at least once per ring's worth of samples
+    imastream.fill()
+
+
+def stats(): #underruns, late fills and the longest gap between fillbufs() calls in samples
+    return imastream.stats()
+
+
+def printstats():
+    underruns, late, gap = imastream.stats()
+    print(f"[Audio] {bufstate[imastream.CURSAMPLE]} samples played, {underruns} underruns, {late} late fills, longest fill gap {gap} samples, ADPCM ring {bufstate[imastream.RINGSIZE]} bytes")
+
+
 def load(f, samplerate, samplecount):
-    global data, buf1, buf2, bufstate, sampledelay
-    if not samplerate in validrates:
-        print("Unsupported sample rate")
-        return
-    sampledelay = 1000000//samplerate
-    data = f
-    buf1 = bytearray(bufsize)
-    buf2 = bytearray(bufsize)
-    #current buffer, pos in buffer, bufsize, current sample, total samples, buf1NeedsFilling, buf2NeedsFilling
-    bufstate = array.array("I", [0, 0, bufsize, 0, samplecount, 1, 1])
-    fillbufs()
+    if not imastream.load(f, samplerate, samplecount): print("Unsupported sample rate")
 
 
 def play():
-    global playing
-    playing = True
-    _thread.start_new_thread(audioloop, ())
+    imastream.play()
 
 
-def stop():
-    global playing
-    playing = False
-    bufstate[3] = bufstate[4] #set current sample to limit
-    #time.sleep_ms(500)
+def playing():
+    return imastream.playing()
+
 
+def stop():
+    imastream.stop()
@@ -0,0 +1,377 @@
+#streams raw 4-bit IMA ADPCM from a file to the PWM audio pin, shared by every game that plays .ima audio.
+#games are installed one folder at a time, so each game ships an identical copy of this file (and imatool.py) - change them together.
+
+#the main thread only copies ADPCM data from the file into a ring buffer (fill). The second core decodes it a block at a time
+#into a small PCM ring in the spare time between samples (decodeblock), so the output itself only has to pace samples.
+#looping is part of the stream: when the file reaches the loop end, fill() seeks back to the loop start and marks the join in
+#the ring, the decoder restores the predictor saved at the loop start when it reaches the join, and the output moves the
+#current sample back when it plays the first sample after it. Volume is applied while decoding, in Q15 (32768 is unity).
+
+#state is shared with the second core and never replaced, so references to it (like a video clock) stay valid between files.
+#every field is an unsigned 32-bit int; positions in the ADPCM and PCM rings count up forever and are masked on access.
+
+import time
+import _thread
+import array
+from micropython import const
+
+DECODED = const(0) #ADPCM bytes decoded
+BUFFERED = const(1) #ADPCM bytes buffered
+RINGSIZE = const(2) #ADPCM ring size
+CURSAMPLE = const(3) #sample in the file being played, moves back to the loop start when looping
+TOTAL = const(4) #samples in the file
+PCMWRITE = const(5) #samples decoded
+PCMREAD = const(6) #samples played
+UNDERRUNS = const(7) #sample periods where the decoder hadn't caught up
+LATEFILLS = const(8) #fill() calls that found the decoder about to run dry
+VOLUME = const(9) #Q15, 0 to 65535
+LOOP = const(10) #looping enabled
+LOOPSTART = const(11) #even sample numbers
+LOOPEND = const(12) #0 loops at the end of the file
+JOIN = const(13) #ADPCM ring position where the data jumps back to the loop start, 0 if none is pending
+JOINSAMPLE = const(14) #sample the data jumps back to
+JUMP = const(15) #PCM ring position where the output jumps back to the loop start, 0 if none is pending
+JUMPSAMPLE = const(16) #sample the output jumps back to
+DECSAMPLE = const(17) #sample in the file being decoded
+PREDICTION = const(18) #decoder state between blocks, prediction is offset by 32768
+INDEX = const(19)
+SAVEDPREDICTION = const(20) #decoder state at the loop start
+SAVEDINDEX = const(21) #index + 1, 0 until the decoder has passed the loop start
+INPUTDONE = const(22) #fill() has reached the end of the file and isn't looping
+DONE = const(23) #the decoder has reached the end of the file
+STOP = const(24) #stop requested
+ACTIVE = const(25) #output thread running
+STATESIZE = const(26)
+
+UNITY = const(32768) #Q15 volume
+CHUNK = const(256) #ADPCM bytes per readinto(), power of two
+BLOCK = const(8) #ADPCM bytes decoded at a time on the second core (16 samples)
+PCMSIZE = const(256) #decoded samples kept ahead of the output, power of two
+MINRING = 1024 #ADPCM ring size limits, powers of two
+MAXRING = 16384
+GAPGUESS = 4096 #fill gap in samples to size the ring for before one has been measured
+decodeslack = 20 #microseconds that must be left before the next sample to start decoding a block
+sampledelay = 125 #microseconds between samples
+samplerate = 8000
+adpcmbuf = bytearray(0) #ADPCM ring, sized at load() from the longest gap between fill() calls
+adpcmviews = [] #one memoryview per chunk, so readinto() doesn't allocate
+pcmbuf = array.array("H", [UNITY]*PCMSIZE)
+data = None
+datastart = 0 #file offset of the first sample
+filepos = 0 #next ADPCM byte fill() will read, from datastart
+lastfill = 0 #samples played at the last fill()
+maxgap = 0 #most samples played between two fill() calls
+
+state = array.array("I", [0]*STATESIZE)
+state[VOLUME] = UNITY
+
+IMAindextable = array.array("i", [ #it appears that only ptr32 works with signed numbers in viper
+    -1, -1, -1, -1, 2, 4, 6, 8,
+    -1, -1, -1, -1, 2, 4, 6, 8
+])
+
+IMAsteptable = array.array("h", [
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17,
+    19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+    50, 55, 60, 66, 73, 80, 88, 97, 107, 118,
+    130, 143, 157, 173, 190, 209, 230, 253, 279, 307,
+    337, 371, 408, 449, 494, 544, 598, 658, 724, 796,
+    876, 963, 1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066,
+    2272, 2499, 2749, 3024, 3327, 3660, 4026, 4428, 4871, 5358,
+    5894, 6484, 7132, 7845, 8630, 9493, 10442, 11487, 12635, 13899,
+    15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794, 32767
+])
+
+validrates = [15625, 12500, 10000, 8000, 6250, 5000, 4000] #not exhaustive - anything that evenly divides 1000000, provided fill() is called often enough to keep up
+
+
+@micropython.viper
+def decodeblock() -> int: #decode up to a block ahead into the PCM ring, returns the number of samples decoded
+    s:ptr32 = ptr32(state)
+    readpos:int = s[DECODED]
+    writepos:int = s[PCMWRITE]
+    n:int = int(BLOCK)
+    avail:int = s[BUFFERED] - readpos
+    if avail < n:
+        if s[INPUTDONE] == 0: return 0 #wait for a whole block unless it's the last one
+        if avail <= 0:
+            s[DONE] = 1
+            return 0
+        n = avail
+    if int(PCMSIZE) - (writepos - s[PCMREAD]) < n*2: return 0 #no room
+
+    adpcm:ptr8 = ptr8(adpcmbuf)
+    pcm:ptr16 = ptr16(pcmbuf)
+    indextable:ptr32 = ptr32(IMAindextable)
+    steptable:ptr16 = ptr16(IMAsteptable)
+    adpcmmask:int = s[RINGSIZE] - 1
+    pcmmask:int = int(PCMSIZE) - 1
+    prediction:int = s[PREDICTION] #would normally be 0 and signed, but since duty_u16 is unsigned, the offset is built-in here. Over/underflow checks have been changed accordingly.
+    index:int = s[INDEX]
+    step:int = steptable[index]
+    volume:int = s[VOLUME]
+    sample:int = s[DECSAMPLE]
+    join:int = s[JOIN]
+    start:int = writepos
+    end:int = readpos + n
+    delta:int = 0
+    diff:int = 0
+    byte:int = 0
+    out:int = 0
+    half:int = 0
+
+    while readpos < end:
+        if join != 0 and readpos == join: #the data jumps back to the loop start here
+            if s[JUMP] != 0: break #the output hasn't reached the previous jump yet (loops shorter than the PCM ring)
+            sample = s[JOINSAMPLE]
+            if s[SAVEDINDEX] != 0:
+                prediction = s[SAVEDPREDICTION]
+                index = s[SAVEDINDEX] - 1
+                step = steptable[index]
+            s[JUMPSAMPLE] = sample
+            s[JUMP] = writepos
+            s[JOIN] = 0
+            join = 0
+        elif sample >= s[TOTAL]:
+            if s[LOOP] == 0: s[DONE] = 1 #otherwise wait for fill() to loop the data
+            break
+        if sample == s[LOOPSTART] and s[SAVEDINDEX] == 0 and s[LOOP] != 0:
+            s[SAVEDPREDICTION] = prediction
+            s[SAVEDINDEX] = index + 1
+
+        byte = adpcm[readpos & adpcmmask]
+        readpos += 1
+        sample += 2
+        half = 0
+        while half < 2:
+            if half: #odd sample
+                delta = byte & 0b1111 #NOTE: Some variants of IMA ADPCM swap which half is processed first
+            else:
+                delta = byte >> 4
+            half += 1
+
+            diff = step >> 3 #calculate next sample
+            if delta & 0b100: diff += step
+            if delta & 0b10: diff += (step >> 1)
+            if delta & 0b1: diff += (step >> 2)
+            if delta & 0b1000:
+                prediction -= diff
+                if prediction < 0: prediction = 0 #cap to valid range (normally -32768 with no offset)
+            else:
+                prediction += diff
+                if prediction > 65535: prediction = 65535 #normally 32767 with no offset
+
+            index += indextable[delta] #update state
+            if index < 0: index = 0
+            elif index > 88: index = 88
+            step = steptable[index]
+
+            out = prediction
+            if volume != int(UNITY):
+                out = ((prediction - 32768) * volume) >> 15 #volume is at most 65535, so this can't overflow
+                if out > 32767: out = 32767
+                elif out < -32768: out = -32768
+                out += 32768
+            pcm[writepos & pcmmask] = out
+            writepos += 1
+
+    s[DECODED] = readpos
+    s[PCMWRITE] = writepos
+    s[DECSAMPLE] = sample
+    s[PREDICTION] = prediction
+    s[INDEX] = index
+    return writepos - start
+
+
+@micropython.viper
+def streamloop(): #output thread, paces samples and decodes ahead in between
+    from machine import PWM, Pin
+    pwm = PWM(Pin(23), freq=120000)
+    setwidth = pwm.duty_u16 #Redefining these reduces clicks. Directly writing to the register would be better, but this works.
+    curtime = ptr32(0x400b0028) #location of microsecond register, as per RP2350 datasheet (TIMERAWL of TIMER0)
+    s:ptr32 = ptr32(state)
+    pcm:ptr16 = ptr16(pcmbuf)
+    pcmmask:int = int(PCMSIZE) - 1
+    delay:int = int(sampledelay)
+    slack:int = int(decodeslack)
+    nexttime:int = (curtime[0] + delay) & 0x3fffffff #mask off highest bit so it can't be treated as signed - should be 7 instead of 3 but can't due to viper funkiness. One sample late so the first block can be decoded
+    remaining:int = 0
+    readpos:int = 0
+
+    while s[STOP] == 0:
+        remaining = (nexttime - (curtime[0] & 0x3fffffff)) & 0x3fffffff #time to the next sample, wraps with the timer
+        if remaining == 0 or remaining >= 0x20000000: #due or overdue
+            readpos = s[PCMREAD]
+            if s[PCMWRITE] != readpos:
+                if readpos == s[JUMP] and readpos != 0: #first sample after the loop join
+                    s[CURSAMPLE] = s[JUMPSAMPLE]
+                    s[JUMP] = 0
+                setwidth(pcm[readpos & pcmmask]) #TODO: Replace this line with raw register writes
+                s[PCMREAD] = readpos + 1
+                s[CURSAMPLE] += 1
+            elif s[DONE]:
+                break
+            else:
+                s[UNDERRUNS] += 1 #underrun (counted per sample period) - the sample is played when it's ready instead
+            nexttime = (nexttime + delay) & 0x3fffffff #keep within valid range
+            continue
+
+        if remaining < slack or s[DONE]: continue
+        decodeblock()
+
+    setwidth(0)
+    pwm.deinit()
+    s[ACTIVE] = 0 #last, the buffers may be replaced once this is seen
+
+
+def fill(): #top up the ADPCM ring from the file, call at least once per ring's worth of samples
+    global lastfill, maxgap, filepos
+    s = state
+    gap = s[PCMREAD] - lastfill
+    lastfill = s[PCMREAD]
+    if gap > maxgap: maxgap = gap
+    if s[ACTIVE] and not s[INPUTDONE] and s[BUFFERED] - s[DECODED] < CHUNK: s[LATEFILLS] += 1 #late: the decoder was about to run dry
+    size = s[RINGSIZE]
+    while not s[INPUTDONE] and s[BUFFERED] - s[DECODED] <= size - CHUNK:
+        looping = s[LOOP]
+        end = ((s[LOOPEND] if looping and s[LOOPEND] else s[TOTAL]) + 1) >> 1 #in bytes
+        if filepos >= end:
+            if not looping:
+                s[INPUTDONE] = 1
+                break
+            if s[JOIN]: break #the decoder hasn't reached the last join yet
+            filepos = s[LOOPSTART] >> 1
+            data.seek(datastart + filepos)
+            s[JOINSAMPLE] = s[LOOPSTART]
+            s[JOIN] = s[BUFFERED]
+            continue
+
+        pos = s[BUFFERED] & (size - 1)
+        view = adpcmviews[pos // CHUNK]
+        offset = pos & (CHUNK - 1)
+        if offset or end - filepos < CHUNK: #only partial chunks next to a loop join or at the end allocate
+            view = view[offset:offset + min(CHUNK - offset, end - filepos)]
+        n = data.readinto(view)
+        if not n: #the file is shorter than its sample count, end it here
+            s[TOTAL] = filepos << 1
+            if s[LOOPEND] > s[TOTAL]: s[LOOPEND] = 0
+            continue
+        filepos += n
+        s[BUFFERED] += n
+
+
+def load(f, rate, samplecount): #prepare to stream samplecount samples from f's current position, returns False for unsupported rates
+    global data, datastart, filepos, adpcmbuf, adpcmviews, sampledelay, samplerate, lastfill, maxgap
+    if rate not in validrates: return False
+    stop()
+    sampledelay = 1000000//rate
+    samplerate = rate
+    data = f
+    datastart = f.tell()
+    filepos = 0
+
+    #room for the longest gap between fills seen last time (2 samples per byte), the chunk being decoded and one spare
+    need = (maxgap if maxgap else GAPGUESS)//2 + 2*CHUNK
+    size = MINRING
+    while size < need and size < MAXRING: size <<= 1
+    if len(adpcmbuf) != size:
+        adpcmbuf = bytearray(size)
+        view = memoryview(adpcmbuf)
+        adpcmviews = [view[i:i + CHUNK] for i in range(0, size, CHUNK)]
+
+    s = state
+    for i in range(STATESIZE):
+        if i not in (VOLUME, LOOP, LOOPSTART, LOOPEND): s[i] = 0 #volume and loop points carry over to the next file
+    s[RINGSIZE] = size
+    s[TOTAL] = samplecount
+    s[PREDICTION] = 32768
+    if s[LOOPSTART] == 0: #the decoder state at the start of the file is known
+        s[SAVEDPREDICTION] = 32768
+        s[SAVEDINDEX] = 1
+    lastfill = maxgap = 0
+    fill()
+    return True
+
+
+def play(): #start the output thread, returns False if it couldn't be started
+    if state[ACTIVE] or data is None: return False
+    state[STOP] = 0
+    state[ACTIVE] = 1
+    try:
+        _thread.start_new_thread(streamloop, ())
+    except OSError:
+        state[ACTIVE] = 0
+        return False
+    return True
+
+
+def stop(timeout=100): #stop the output thread and wait up to timeout ms for it to finish, returns False if it hasn't
+    if state[ACTIVE]:
+        state[STOP] = 1
+        while state[ACTIVE] and timeout > 0:
+            time.sleep_ms(2)
+            timeout -= 2
+    return not state[ACTIVE]
+
+
+def playing():
+    return state[ACTIVE] == 1
+
+
+def finished(): #the end of the file has been played
+    return state[DONE] == 1 and state[PCMREAD] == state[PCMWRITE]
+
+
+def setvolume(q15): #Q15 fixed point, 32768 is unity and up to 65535 (just under double) is allowed
+    state[VOLUME] = max(0, min(65535, int(q15)))
+
+
+def setloop(enabled=True, start=0, end=0): #sample numbers, rounded down to whole bytes; end 0 loops at the end of the file
+    s = state
+    start &= ~1
+    end &= ~1
+    if end and end <= start: enabled = False
+    if start != s[LOOPSTART]: #the saved decoder state belongs to the old loop start
+        s[SAVEDPREDICTION] = 32768
+        s[SAVEDINDEX] = 1 if start == 0 else 0
+    s[LOOPSTART] = start
+    s[LOOPEND] = end
+    s[LOOP] = 1 if enabled else 0
+    if enabled: s[INPUTDONE] = 0 #fill() may have stopped at the end of the file
+
+
+def stats(): #underruns, late fills and the longest gap between fill() calls in samples
+    return state[UNDERRUNS], state[LATEFILLS], maxgap
+
+
+def decode(adpcm, volume=UNITY): #decode bytes with decodeblock() and return signed samples, for selfcheck() - not while playing
+    global adpcmbuf, adpcmviews, data
+    if state[ACTIVE]: return None
+    s = state
+    size = MINRING
+    while size < len(adpcm): size <<= 1
+    if len(adpcmbuf) < size:
+        adpcmbuf = bytearray(size)
+        adpcmviews = []
+    data = None #the state is reset, so the file has to be loaded again
+    for i in range(STATESIZE): s[i] = 0
+    adpcmbuf[:len(adpcm)] = adpcm
+    s[RINGSIZE] = len(adpcmbuf)
+    s[BUFFERED] = len(adpcm)
+    s[TOTAL] = len(adpcm)*2
+    s[INPUTDONE] = 1
+    s[PREDICTION] = 32768
+    s[VOLUME] = volume
+    out = []
+    while decodeblock():
+        while s[PCMREAD] != s[PCMWRITE]:
+            out.append(pcmbuf[s[PCMREAD] & (PCMSIZE - 1)] - 32768)
+            s[PCMREAD] += 1
+    for i in range(STATESIZE): s[i] = 0
+    s[VOLUME] = UNITY
+    return out
+
+
+def selfcheck(): #compare the viper decoder against imatool's reference decoder and golden vectors, returns the failures
+    import imatool
+    return imatool.check(decode)
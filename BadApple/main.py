@@ -14,6 +14,7 @@ from os import stat
 from time import sleep_ms
 
 videopath = "/Games/BadApple/badapple-128x96.mvf"
+indexpath = "/Games/BadApple/badapple-128x96.mvf.idx" #keyframe index, rebuilt and saved if missing or stale
 audiopath = "/Games/BadApple/badapple-15625Hz-EQ.ima"
 audiorate = 15625
 
@@ -21,7 +22,10 @@ camera = CameraNode()
 
 def callback():
     audio.fillbufs()
-    if engine_io.A.is_just_pressed: mvf.printmem()
+    if engine_io.A.is_just_pressed:
+        mvf.printmem()
+        mvf.printstats()
+        audio.printstats()
     if engine_io.B.is_just_pressed:
         audio.stop()
         mvf.stop()
@@ -61,14 +65,14 @@ class FPStext(Text2DNode):
 fps = FPStext()
 
 vf = open(videopath, "rb")
-mvf.load(vf)
+mvf.load(vf, indexpath)
 af = open(audiopath, "rb")
 audiosamples = stat(audiopath)[6] * 2 #sample count is filesize * 2
 audio.load(af, audiorate, audiosamples) #raw IMA files don't contain any metadata, so sample rate and sample count have to be specified
 audio.play()
-mvf.play(callback=callback)
+mvf.play(callback=callback, clock=audio.bufstate, clockrate=audiorate) #video follows the audio's sample counter
 
-while audio.playing: #allow audio to finish if the audio is longer than the video
+while audio.playing(): #allow audio to finish if the audio is longer than the video
     callback()
     sleep_ms(33)
     gc.collect()
@@ -1,7 +1,5 @@
 #TODO:
 # -eliminate the excessive amount of global variables
-# -speed up LUT generation (probably viper)
-# -arbitrary positioning of the video (could be movable while playing with fast LUTs)
 # -reduce allocations
 # -general cleanup
 
@@ -9,6 +7,7 @@ import engine
 import engine_draw
 import struct
 import time
+from array import array
 #import thumby
 import gc
 from micropython import mem_info
@@ -32,7 +31,8 @@ framecount = 0
 framezero = 0 #offset of frame 0
 curframe = 0 #frames displayed
 metadata = "" #embedded text
-framequeue = []
+pendingheader = 0 #header byte of the current frame pair
+pendingframes = 0 #frames of pendingheader not decoded yet
 data = None
 stopped = False
 
@@ -44,48 +44,143 @@ hIndexLUT = bytearray(width*height*2) #gets interpreted as little endian
 #hBitLUT = bytearray(width*height)
 vIndexLUT = bytearray(width*height*2) #gets interpreted as little endian
 #vBitLUT = bytearray(width*height)
-framebuf = bytearray(displaywidth*displayheight*2)
+framebuf = bytearray(0) #only used when decodedirect is False
 
+#decodedirect: decode into a 1-bit shadow of the video and expand it straight into the engine's back buffer
+#otherwise decode into the 32 KB framebuf and copy the video area over with copyframe_precise()
+decodedirect = True
+shadow = bytearray(0) #1 bit per video pixel, row-major, bit 0 first; LUTs hold video-local indices in this mode
+
+#Palettized video (scheme 2): the header adds a plane count (2 or 4) and a palette of 2^planes RGB565
+#colours. Every video frame is that many 1-bit frames in the stream, one per bit of the palette index,
+#lowest first, each with its own header nibble and decoded like any other frame. Needs decodedirect
+planes = 1
+palette = array("H")
+planebuf = bytearray(0) #all the planes' shadows back to back
+shadows = [] #one view of planebuf per plane, shadow is pointed at each in turn
+
+#Streaming reader: frames are decoded straight out of a power-of-two ring buffer that is
+#refilled a chunk at a time with readinto(), so playback doesn't allocate
+RINGSIZE = 8192 #must hold the largest frame plus a chunk
+CHUNK = 512
+readahead = 30 #frames to buffer ahead in the idle time left by the frame limiter
+ring = bytearray(0)
+ringviews = [] #one memoryview per chunk, made once so readinto() doesn't allocate
+ringmask = 0
+ringfill = 0 #stream bytes (counted from framezero) read into the ring
+ringpos = 0 #stream position of the next byte to decode
+ringeof = False
+framestart = 0 #ring offset of the frame being decoded, read by the decoders
+scanpos = 0 #read-ahead scan: stream position of the next frame not known to be buffered
+scanleft = 0 #frames left in the pair being scanned
+scannedframes = 0 #stream frames from the start that are completely in the ring
+streamframes = 0 #framecount * planes
+
+#Keyframe index: frame number and stream offset of the pair header of I-frames, at most one every
+#indexstep frames. Entry 0 is always frame 0, which may be a P-frame on the cleared screen
+INDEXMAGIC = b"MVFI"
+indexstep = 30 #a seek decodes up to about this many frames past the keyframe
+keyframes = array("I")
+keyoffsets = array("I")
+resumeframe = 0 #set by stop()
+
+#frame timing (decode + copy to the back buffer), see printstats()
+statframes = 0
+stattotal = 0 #us
+statmax = 0 #us
+statpeakram = 0
+statdropped = 0 #frames decoded but not shown to catch up
+statlate = 0 #times play() found itself behind
+
+
+lutdirect = None #decodedirect setting the LUTs were made for
+lutx = 0 #video position the LUTs were made for. The scan snakes by the parity of this position,
+luty = 0 #and in the framebuf path it's where frames are decoded; move() only changes xpos/ypos
+lutcache = {} #(width, height, x, y, decodedirect): (hIndexLUT, vIndexLUT)
+lutcachesize = 2 #LUT pairs kept, 48 KB each for 128x96
 
 def makeluts():
-    global hIndexLUT, vIndexLUT
+    global hIndexLUT, vIndexLUT, lutdirect, lutx, luty
+    key = (width, height, xpos, ypos, decodedirect)
+    lutdirect = decodedirect
+    lutx, luty = xpos, ypos
+    if key in lutcache:
+        hIndexLUT, vIndexLUT = lutcache[key]
+        return
+    hIndexLUT = vIndexLUT = None
+    while len(lutcache) >= lutcachesize: #make room before allocating the new pair
+        del lutcache[next(iter(lutcache))]
+    gc.collect()
+    print("[MVF] Generating LUTs")
     hIndexLUT = bytearray(width*height*2) #gets interpreted as little endian
     vIndexLUT = bytearray(width*height*2) #gets interpreted as little endian
-    
-    print("[MVF] Generating horizontal LUT")
-    i = 0
-    for y in range(height): #horizontal scanning
-        y += ypos
-        for x in range(width):
-            if y & 1: x = width - x - 1 #snake back on odd rows
-            x += xpos
-            index = y*displaywidth + x
-            hIndexLUT[i*2] = index & 255
-            hIndexLUT[i*2+1] = index >> 8
-            i += 1
-    
-    print("[MVF] Generating vertical LUT")
-    i = 0
-    for x in range(width): #vertical scanning
-        x += xpos
-        for y in range(height):
-            if x & 1: y = height - y - 1 #snake back on odd columns
-            y += ypos
-            index = y*displaywidth + x
-            vIndexLUT[i*2] = index & 255
-            vIndexLUT[i*2+1] = index >> 8
-            i += 1
+    filllut(hIndexLUT, 0)
+    filllut(vIndexLUT, 1)
+    if lutcachesize > 0: lutcache[key] = (hIndexLUT, vIndexLUT)
 
 
-def decodevlq(data): #takes a file-like object, returns an int.
-    total = 0
-    nextbyte = ord(data.read(1))
-    while nextbyte >= 128:
-        total += nextbyte & 127
-        total <<= 7
-        nextbyte = ord(data.read(1))
-    total += nextbyte
-    return total
+@micropython.viper
+def filllut(lut, vertical:int): #scan position to pixel index, snaking back on odd rows (columns) of the display
+    out = ptr16(lut)
+    w:int = int(width)
+    h:int = int(height)
+    xpar:int = int(lutx) & 1
+    ypar:int = int(luty) & 1
+    xoff:int = 0
+    yoff:int = 0
+    rowlen:int = w
+    if not decodedirect: #index the display instead of the video-local shadow
+        xoff = int(lutx)
+        yoff = int(luty)
+        rowlen = int(displaywidth)
+    i:int = 0
+    x:int = 0
+    y:int = 0
+    index:int = 0
+    if vertical:
+        while x < w:
+            index = yoff*rowlen + x + xoff
+            if (x + xpar) & 1:
+                index += (h - 1)*rowlen
+                y = 0
+                while y < h:
+                    out[i] = index
+                    index -= rowlen
+                    i += 1
+                    y += 1
+            else:
+                y = 0
+                while y < h:
+                    out[i] = index
+                    index += rowlen
+                    i += 1
+                    y += 1
+            x += 1
+    else:
+        while y < h:
+            index = (y + yoff)*rowlen + xoff
+            if (y + ypar) & 1:
+                index += w - 1
+                x = 0
+                while x < w:
+                    out[i] = index
+                    index -= 1
+                    i += 1
+                    x += 1
+            else:
+                x = 0
+                while x < w:
+                    out[i] = index
+                    index += 1
+                    i += 1
+                    x += 1
+            y += 1
+
+
+def move(x, y): #reposition the video, also while it plays. The LUTs and scan order stay as they are
+    global xpos, ypos
+    xpos = min(max(x, 0), displaywidth - width)
+    ypos = min(max(y, 0), displayheight - height)
 
 
 @micropython.viper
@@ -107,7 +202,8 @@ def decodeiframe(framedata, scandir:int, runtype:int, bgcolour:int):
         index = ptr16(hIndexLUT)
     display = ptr16(framebuf)
     data = ptr8(framedata)
-    datapos = 0
+    datapos:int = int(framestart)
+    mask:int = int(ringmask)
     limit:int = int(width*height)
     colour:int = bgcolour
     num:int = 0
@@ -115,12 +211,12 @@ def decodeiframe(framedata, scandir:int, runtype:int, bgcolour:int):
     i:int = 0
     while i < limit:
         num = 0
-        nextbyte = data[datapos]
+        nextbyte = data[datapos & mask]
         datapos += 1
         while nextbyte & 128: #decode vlq number
             num += nextbyte & 127
             num <<= 7
-            nextbyte = data[datapos]
+            nextbyte = data[datapos & mask]
             datapos += 1
         num += nextbyte
         
@@ -143,7 +239,8 @@ def decodepframe(framedata, scandir:int, runtype:int):
         index = ptr16(hIndexLUT)
     display = ptr16(framebuf)
     data = ptr8(framedata)
-    datapos = 0
+    datapos:int = int(framestart)
+    mask:int = int(ringmask)
     limit:int = int(width*height)
     num:int = 0
     nextbyte:int = 0
@@ -151,12 +248,12 @@ def decodepframe(framedata, scandir:int, runtype:int):
     if runtype == 0: #pixel setting mode
         while i < limit:
             num = 0
-            nextbyte = data[datapos]
+            nextbyte = data[datapos & mask]
             datapos += 1
             while nextbyte & 128: #decode vlq number
                 num += nextbyte & 127
                 num <<= 7
-                nextbyte = data[datapos]
+                nextbyte = data[datapos & mask]
                 datapos += 1
             num += nextbyte
             
@@ -167,12 +264,12 @@ def decodepframe(framedata, scandir:int, runtype:int):
     else: #run setting mode
         while i < limit:
             num = 0
-            nextbyte = data[datapos]
+            nextbyte = data[datapos & mask]
             datapos += 1
             while nextbyte & 128: #decode vlq number
                 num += nextbyte & 127
                 num <<= 7
-                nextbyte = data[datapos]
+                nextbyte = data[datapos & mask]
                 datapos += 1
             num += nextbyte
             
@@ -180,12 +277,12 @@ def decodepframe(framedata, scandir:int, runtype:int):
             if i >= limit: break
             
             num = 0
-            nextbyte = data[datapos]
+            nextbyte = data[datapos & mask]
             datapos += 1
             while nextbyte & 128: #decode vlq number
                 num += nextbyte & 127
                 num <<= 7
-                nextbyte = data[datapos]
+                nextbyte = data[datapos & mask]
                 datapos += 1
             num += nextbyte
             
@@ -196,6 +293,266 @@ def decodepframe(framedata, scandir:int, runtype:int):
                 if i == limit: break 
 
 
+@micropython.viper
+def clearshadow():
+    sh = ptr8(shadow)
+    i:int = 0
+    limit:int = int(len(shadow))
+    while i < limit:
+        sh[i] = 0
+        i += 1
+
+
+@micropython.viper
+def decodeiframe_shadow(framedata, scandir:int, runtype:int, bgcolour:int):
+    if scandir:
+        index = ptr16(vIndexLUT)
+    else:
+        index = ptr16(hIndexLUT)
+    sh = ptr8(shadow)
+    data = ptr8(framedata)
+    datapos:int = int(framestart)
+    mask:int = int(ringmask)
+    limit:int = int(width*height)
+    colour:int = bgcolour
+    num:int = 0
+    nextbyte:int = 0
+    p:int = 0
+    i:int = 0
+    while i < limit:
+        num = 0
+        nextbyte = data[datapos & mask]
+        datapos += 1
+        while nextbyte & 128: #decode vlq number
+            num += nextbyte & 127
+            num <<= 7
+            nextbyte = data[datapos & mask]
+            datapos += 1
+        num += nextbyte
+        
+        while num > 0:
+            p = index[i]
+            if colour: sh[p >> 3] |= 1 << (p & 7) #set white
+            else: sh[p >> 3] &= 0xff ^ (1 << (p & 7)) #set black
+            if runtype == 0: colour = bgcolour #reset after 1 pixel for pixel setting mode
+            num -= 1
+            i += 1
+            if i == limit: break
+        
+        colour ^= 1
+
+
+@micropython.viper
+def decodepframe_shadow(framedata, scandir:int, runtype:int):
+    if scandir:
+        index = ptr16(vIndexLUT)
+    else:
+        index = ptr16(hIndexLUT)
+    sh = ptr8(shadow)
+    data = ptr8(framedata)
+    datapos:int = int(framestart)
+    mask:int = int(ringmask)
+    limit:int = int(width*height)
+    num:int = 0
+    nextbyte:int = 0
+    p:int = 0
+    i:int = 0
+    while i < limit:
+        num = 0
+        nextbyte = data[datapos & mask]
+        datapos += 1
+        while nextbyte & 128: #decode vlq number
+            num += nextbyte & 127
+            num <<= 7
+            nextbyte = data[datapos & mask]
+            datapos += 1
+        num += nextbyte
+        
+        i += num #go to pixel / start of run
+        if i >= limit: break
+        
+        if runtype == 0: #pixel setting mode, the next skip counts from this pixel
+            p = index[i]
+            sh[p >> 3] ^= 1 << (p & 7) #flip colour
+            continue
+        
+        num = 0 #run setting mode
+        nextbyte = data[datapos & mask]
+        datapos += 1
+        while nextbyte & 128:
+            num += nextbyte & 127
+            num <<= 7
+            nextbyte = data[datapos & mask]
+            datapos += 1
+        num += nextbyte
+        
+        while num > 0:
+            p = index[i]
+            sh[p >> 3] ^= 1 << (p & 7) #flip colour
+            num -= 1
+            i += 1
+            if i == limit: break
+
+
+#Offset P-frames (mvftool.py levels above 0, flagged by bit 7 of the scheme): the frame data starts
+#with two signed bytes dx, dy. The previous frame is moved by (dx, dy) first, repeating the edge pixels
+#into the uncovered area, then the rest of the data is applied like any other P-frame.
+#The original encoder's offset frames use another layout and are still rejected
+offsets = False
+@micropython.viper
+def shiftshadow(dx:int, dy:int):
+    sh = ptr8(shadow)
+    w:int = int(width)
+    h:int = int(height)
+    #walk away from the direction of motion so every source pixel is read before it's overwritten
+    ystep:int = 1
+    y:int = 0
+    if dy > 0:
+        ystep = -1
+        y = h - 1
+    xstep:int = 1
+    xstart:int = 0
+    if dx > 0:
+        xstep = -1
+        xstart = w - 1
+    x:int = 0
+    sx:int = 0
+    sy:int = 0
+    s:int = 0
+    d:int = 0
+    rows:int = 0
+    cols:int = 0
+    while rows < h:
+        sy = y - dy
+        if sy < 0: sy = 0
+        if sy >= h: sy = h - 1
+        x = xstart
+        cols = 0
+        while cols < w:
+            sx = x - dx
+            if sx < 0: sx = 0
+            if sx >= w: sx = w - 1
+            s = sy*w + sx
+            d = y*w + x
+            if sh[s >> 3] & (1 << (s & 7)): sh[d >> 3] |= 1 << (d & 7)
+            else: sh[d >> 3] &= 0xff ^ (1 << (d & 7))
+            x += xstep
+            cols += 1
+        y += ystep
+        rows += 1
+
+
+@micropython.viper
+def shiftframe(dx:int, dy:int): #shiftshadow() for the framebuf path
+    display = ptr16(framebuf)
+    w:int = int(width)
+    h:int = int(height)
+    xoff:int = int(lutx)
+    yoff:int = int(luty)
+    stride:int = int(displaywidth)
+    ystep:int = 1
+    y:int = 0
+    if dy > 0:
+        ystep = -1
+        y = h - 1
+    xstep:int = 1
+    xstart:int = 0
+    if dx > 0:
+        xstep = -1
+        xstart = w - 1
+    x:int = 0
+    sx:int = 0
+    sy:int = 0
+    srow:int = 0
+    drow:int = 0
+    rows:int = 0
+    cols:int = 0
+    while rows < h:
+        sy = y - dy
+        if sy < 0: sy = 0
+        if sy >= h: sy = h - 1
+        srow = (sy + yoff)*stride + xoff
+        drow = (y + yoff)*stride + xoff
+        x = xstart
+        cols = 0
+        while cols < w:
+            sx = x - dx
+            if sx < 0: sx = 0
+            if sx >= w: sx = w - 1
+            display[drow + x] = display[srow + sx]
+            x += xstep
+            cols += 1
+        y += ystep
+        rows += 1
+
+
+@micropython.viper
+def blitshadow(): #expand the shadow into the video area of the back buffer, one sequential pass
+    screen = ptr16(engine_draw.back_fb_data())
+    sh = ptr8(shadow)
+    w:int = int(width)
+    h:int = int(height)
+    dw:int = int(displaywidth)
+    x0:int = int(xpos)
+    y0:int = int(ypos)
+    bits:int = 0
+    p:int = 0
+    o:int = 0
+    end:int = 0
+    y:int = 0
+    while y < h:
+        o = (y + y0)*dw + x0
+        end = o + w
+        while o < end:
+            if (p & 7) == 0: bits = sh[p >> 3]
+            if bits & 1: screen[o] = 0xffff
+            else: screen[o] = 0
+            bits >>= 1
+            p += 1
+            o += 1
+        y += 1
+
+
+@micropython.viper
+def blitplanes(): #blitshadow() for palettized video: the bit planes make a palette index per pixel
+    screen = ptr16(engine_draw.back_fb_data())
+    sh = ptr8(planebuf)
+    pal = ptr16(palette)
+    n:int = int(planes)
+    size:int = int(len(planebuf)) // n #bytes per plane
+    w:int = int(width)
+    h:int = int(height)
+    dw:int = int(displaywidth)
+    x0:int = int(xpos)
+    y0:int = int(ypos)
+    b0:int = 0
+    b1:int = 0
+    b2:int = 0
+    b3:int = 0
+    p:int = 0
+    o:int = 0
+    end:int = 0
+    y:int = 0
+    while y < h:
+        o = (y + y0)*dw + x0
+        end = o + w
+        while o < end:
+            if (p & 7) == 0: #next byte of every plane
+                b0 = sh[p >> 3]
+                b1 = sh[size + (p >> 3)]
+                if n == 4:
+                    b2 = sh[2*size + (p >> 3)]
+                    b3 = sh[3*size + (p >> 3)]
+            screen[o] = pal[(b0 & 1) | ((b1 & 1) << 1) | ((b2 & 1) << 2) | ((b3 & 1) << 3)]
+            b0 >>= 1
+            b1 >>= 1
+            b2 >>= 1
+            b3 >>= 1
+            p += 1
+            o += 1
+        y += 1
+
+
 @micropython.viper
 def copyframe(): #DMA would be better, but won't work in the emulator as of writing. Decoding directly in the screen buffer is harder here than the original thumby
     screen = ptr32(engine_draw.back_fb_data())
@@ -208,44 +565,173 @@ def copyframe(): #DMA would be better, but won't work in the emulator as of writ
 
 
 @micropython.viper
-def copyframe_precise(): #only writes to the video area at the expense of speed
+def copyframe_precise(): #only writes to the video area, from where it was decoded to where it's shown
     screen = ptr16(engine_draw.back_fb_data())
     frame = ptr16(framebuf)
-    index = ptr16(hIndexLUT)
-    i:int = 0
-    limit:int = int(len(hIndexLUT))//2
-    while i < limit:
-        screen[index[i]] = frame[index[i]]
-        i += 1
+    w:int = int(width)
+    h:int = int(height)
+    dw:int = int(displaywidth)
+    src:int = int(luty)*dw + int(lutx)
+    dst:int = int(ypos)*dw + int(xpos)
+    x:int = 0
+    y:int = 0
+    while y < h:
+        x = 0
+        while x < w:
+            screen[dst + x] = frame[src + x]
+            x += 1
+        src += dw
+        dst += dw
+        y += 1
 
 
-def nextframe():
-    global curframe
-    if curframe >= framecount: return
-    if curframe == 0: clearscreen()
-    
-    if len(framequeue) == 0:
-        header = ord(data.read(1))
-        framequeue.append(((header&8)>>3, (header&4)>>2, (header&2)>>1, header&1)) #second frame
-        framequeue.append(((header&128)>>7, (header&64)>>6, (header&32)>>5, (header&16)>>4)) #first frame
+def fillchunk(): #read one chunk into the ring if there's room for it, returns True if it did
+    global ringfill, ringeof
+    if ringeof or ringfill - ringpos > RINGSIZE - CHUNK: return False
+    n = data.readinto(ringviews[(ringfill & ringmask) // CHUNK])
+    if not n:
+        ringeof = True
+        return False
+    if n < CHUNK: ringeof = True
+    ringfill += n
+    return True
+
+
+def need(n): #make sure the next n bytes are in the ring, returns False if they can't be
+    while ringfill - ringpos < n:
+        if not fillchunk(): return False
+    return True
+
+
+def ringvlq(): #decodes a VLQ at ringpos, returns an int
+    global ringpos
+    total = 0
+    nextbyte = ring[ringpos & ringmask]
+    ringpos += 1
+    while nextbyte >= 128:
+        total += nextbyte & 127
+        total <<= 7
+        nextbyte = ring[ringpos & ringmask]
+        ringpos += 1
+    total += nextbyte
+    return total
+
+
+def scanahead(): #count the stream frames (planes) that are completely buffered
+    global scanpos, scanleft, scannedframes
+    while scannedframes < streamframes:
+        pos = scanpos
+        left = scanleft
+        if left == 0:
+            if pos >= ringfill: return
+            pos += 1 #pair header
+            left = 2
+        num = 0
+        while True:
+            if pos >= ringfill: return
+            nextbyte = ring[pos & ringmask]
+            pos += 1
+            if nextbyte < 128: break
+            num = (num + (nextbyte & 127)) << 7
+        pos += num + nextbyte
+        if pos > ringfill: return
+        scanpos = pos
+        scanleft = left - 1
+        scannedframes += 1
+
+
+def prefetch(): #read ahead one chunk if fewer than readahead frames are buffered, returns True if it did
+    if scannedframes - curframe*planes >= readahead*planes: return False
+    if not fillchunk(): return False
+    scanahead()
+    return True
+
+
+def decodeplane(): #decode the next 1-bit frame of the stream into shadow (or framebuf), returns False on error
+    global pendingheader, pendingframes, ringpos, framestart
+    if pendingframes == 0:
+        need(1)
+        pendingheader = ring[ringpos & ringmask]
+        ringpos += 1
+        pendingframes = 2
     
-    f = framequeue.pop()
-    framelen = decodevlq(data)
-    framedata = bytearray(data.read(framelen))
+    #bit 3: iframe, bit 2: scan direction, bit 1: run type, bit 0: background colour (I) / has offset (P)
+    f = (pendingheader >> 4) if pendingframes == 2 else (pendingheader & 15)
+    pendingframes -= 1
+    need(4) #longest VLQ a frame length needs
+    framelen = ringvlq()
+    if not need(framelen):
+        print("[MVF] Truncated file or frame larger than the ring buffer")
+        return False
+    framestart = ringpos & ringmask
     
-    if f[0]: #iframe
-        decodeiframe(framedata, f[1], f[2], f[3])
+    if f & 8: #iframe
+        if decodedirect: decodeiframe_shadow(ring, (f >> 2) & 1, (f >> 1) & 1, f & 1)
+        else: decodeiframe(ring, (f >> 2) & 1, (f >> 1) & 1, f & 1)
     else: #pframe
-        if f[3]: #has offset
-            print("[MVF] Offset frames not supported. Remember to encode with scheme 1 and level 0")
-            curframe = framecount
-            return
-        decodepframe(framedata, f[1], f[2])
-    
-    #copyframe()
-    copyframe_precise()
+        if f & 1: #has offset
+            if not offsets:
+                print("[MVF] Offset frames not supported. Remember to encode with scheme 1 and level 0")
+                return False
+            dx = ring[framestart]
+            dy = ring[(framestart + 1) & ringmask]
+            if dx > 127: dx -= 256
+            if dy > 127: dy -= 256
+            framestart = (framestart + 2) & ringmask
+            if decodedirect: shiftshadow(dx, dy)
+            else: shiftframe(dx, dy)
+        if decodedirect: decodepframe_shadow(ring, (f >> 2) & 1, (f >> 1) & 1)
+        else: decodepframe(ring, (f >> 2) & 1, (f >> 1) & 1)
+    ringpos += framelen
+    return True
+
+
+def nextframe(show=True): #show=False only decodes, for seeking
+    global curframe, statframes, stattotal, statmax, statpeakram, shadow
+    if curframe >= framecount: return
+    t0 = time.ticks_us()
     
+    if planes == 1:
+        if curframe == 0:
+            if decodedirect: clearshadow()
+            else: clearscreen()
+        ok = decodeplane()
+    else: #one stream frame per bit plane, lowest bit first
+        plane = 0
+        ok = True
+        while ok and plane < planes:
+            shadow = shadows[plane]
+            if curframe == 0: clearshadow()
+            ok = decodeplane()
+            plane += 1
+    if not ok:
+        curframe = framecount
+        return
     curframe += 1
+    if not show: return
+    
+    if planes > 1:
+        blitplanes()
+    elif decodedirect:
+        blitshadow()
+    else:
+        #copyframe()
+        copyframe_precise()
+    
+    t = time.ticks_diff(time.ticks_us(), t0)
+    statframes += 1
+    stattotal += t
+    if t > statmax: statmax = t
+    used = gc.mem_alloc()
+    if used > statpeakram: statpeakram = used
+
+
+def printstats(): #frame time and RAM of the selected decode path, for comparing decodedirect on and off
+    mode = "direct (1-bit shadow)" if decodedirect else "framebuf + copy"
+    if statframes:
+        print(f"[MVF] {mode}: {statframes} frames, avg {stattotal//statframes} us, max {statmax} us per frame")
+    if statlate: print(f"[MVF] behind {statlate} times, {statdropped} frames dropped")
+    print(f"[MVF] frame buffers {len(framebuf) + len(planebuf)} bytes, LUTs {len(hIndexLUT) + len(vIndexLUT)} bytes, peak heap {statpeakram} bytes")
 
 
 def playing():
@@ -253,20 +739,123 @@ def playing():
     return curframe < framecount
 
 
-def stop(): #future feature - store the last frame to resume playback flawlessly
-    global stopped
+def stop(): #remembers the frame so resume() can pick up from it, even after another video was loaded
+    global stopped, resumeframe
     stopped = True
+    resumeframe = curframe
+
+
+def resume(frame=None): #seek to where stop() left off (or to frame), call play() afterwards
+    seek(resumeframe if frame == None else frame)
+
+
+def seekstream(pos): #restart the reader at stream offset pos, which must be a pair header
+    global ringfill, ringpos, ringeof, pendingframes, scanpos, scanleft
+    ringfill = pos & ~(CHUNK - 1) #keep the chunks aligned to the ring
+    data.seek(framezero + ringfill)
+    ringpos = scanpos = pos
+    ringeof = False
+    pendingframes = scanleft = 0
+
+
+def seekkey(entry): #position the reader at keyframe index entry, nextframe() then decodes that frame
+    global curframe, scannedframes, pendingheader, pendingframes, ringpos, scanpos, scanleft
+    key = keyframes[entry]
+    seekstream(keyoffsets[entry])
+    curframe = key
+    if key*planes & 1: #second frame of its pair, step over the first
+        need(1)
+        pendingheader = ring[ringpos & ringmask]
+        ringpos += 1
+        need(4)
+        framelen = ringvlq() #ringvlq() moves ringpos itself
+        ringpos += framelen
+        pendingframes = 1
+    scanpos = ringpos
+    scanleft = pendingframes
+    scannedframes = key*planes
+    while fillchunk(): pass
+    scanahead()
+
+
+def seek(frame): #make frame the next one shown, decoding forward from the nearest keyframe before it
+    if frame < 0: frame = 0
+    if frame > framecount: frame = framecount
+    lo = 0
+    hi = len(keyframes) - 1
+    while lo < hi: #last index entry at or before frame
+        mid = (lo + hi + 1) >> 1
+        if keyframes[mid] <= frame: lo = mid
+        else: hi = mid - 1
+    if not keyframes[lo] <= curframe <= frame: seekkey(lo) #otherwise carrying on from here is shorter
+    while curframe < frame: nextframe(False)
 
 
 def reset(): #seek to frame 0
-    global curframe, framequeue
-    curframe = 0
-    framequeue = []
+    seekkey(0)
+
+
+def buildindex(): #scan the frame headers once for I-frames (every plane an I-frame), see indexstep
+    global keyframes, keyoffsets, ringpos
+    keyframes = array("I", [0])
+    keyoffsets = array("I", [0])
+    seekstream(0)
+    n = 0 #stream frame
+    while n < streamframes:
+        pairpos = ringpos
+        if not need(1): break
+        header = ring[ringpos & ringmask]
+        ringpos += 1
+        for f in (header >> 4, header & 15):
+            if n == streamframes: break
+            if n % planes == 0: #first plane of a video frame
+                keypos = pairpos
+                allkey = True
+            allkey = allkey and f & 8
+            frame = n // planes
+            if allkey and n % planes == planes - 1 and frame - keyframes[-1] >= indexstep:
+                keyframes.append(frame)
+                keyoffsets.append(keypos)
+            need(4)
+            framelen = ringvlq() #ringvlq() moves ringpos itself
+            ringpos += framelen
+            n += 1
+
+
+def streamsize():
+    size = data.seek(0, 2) - framezero
     data.seek(framezero)
+    return size
+
 
+def loadindex(path): #read an index written by saveindex(), returns False if it's missing or for another video
+    global keyframes, keyoffsets
+    try:
+        with open(path, "rb") as f:
+            magic, frames, size, step, count = struct.unpack("<4sIIII", f.read(20))
+            if magic != INDEXMAGIC or frames != framecount or size != streamsize() or step != indexstep: return False
+            keyframes = array("I", [0]*count)
+            keyoffsets = array("I", [0]*count)
+            f.readinto(keyframes)
+            f.readinto(keyoffsets)
+    except OSError:
+        return False
+    return True
 
-def load(f=None): #takes a file-like object seeked to the start of an MVF file
-    global width, height, framerate, framecount, metadata, lastframe, curframe, framequeue, data, xpos, ypos, framezero
+
+def saveindex(path): #sidecar file so later loads don't have to scan the whole video
+    try:
+        with open(path, "wb") as f:
+            f.write(struct.pack("<4sIIII", INDEXMAGIC, framecount, streamsize(), indexstep, len(keyframes)))
+            f.write(keyframes)
+            f.write(keyoffsets)
+    except OSError:
+        print("[MVF] Couldn't write index " + path)
+
+
+def load(f=None, indexpath=None): #takes a file-like object seeked to the start of an MVF file, and optionally an index sidecar path
+    global width, height, framerate, framecount, metadata, lastframe, data, xpos, ypos, framezero
+    global planes, palette, streamframes, decodedirect, offsets
     if f == None: f = data
     else: data = f
     if data.read(4) != b"MVF\x00":
@@ -275,40 +864,98 @@ def load(f=None): #takes a file-like object seeked to the start of an MVF file
     
     metalen = struct.unpack("<H", data.read(2))[0]
     metadata = data.read(metalen)
-    oldwidth, oldheight = width, height
     width, height, framerate, framecount, scheme = struct.unpack("<HHBIB", data.read(10))
-    if scheme != 1:
+    offsets = scheme & 0x80 != 0
+    scheme &= 0x7f
+    if scheme == 1:
+        planes = 1
+    elif scheme == 2:
+        planes = data.read(1)[0]
+        if planes != 2 and planes != 4:
+            print("[MVF] Unsupported bit depth")
+            return
+        palette = array("H", struct.unpack(f"<{1 << planes}H", data.read(2 << planes)))
+        if not decodedirect:
+            print("[MVF] Palettized video is decoded directly")
+            decodedirect = True
+    else:
         print("[MVF] Unsupported compression scheme. Remember to encode with scheme 1 and level 0")
         return
+    streamframes = framecount*planes
     
-    curframe = 0
-    framequeue = []
     xpos = int(displaywidth/2 - width/2)
     ypos = int(displayheight/2 - height/2)
     framezero = data.tell()
     
-    print(f"[MVF] Loaded video - {width}x{height}, {framecount} frames at {framerate} FPS")
-    if oldwidth != width or oldheight != height: makeluts()
+    print(f"[MVF] Loaded video - {width}x{height}, {1 << planes} colours, {framecount} frames at {framerate} FPS")
+    makeluts() #reuses cached LUTs for the same size, position and decode path
+    allocbuffers()
+    if not (indexpath and loadindex(indexpath)):
+        buildindex()
+        if indexpath: saveindex(indexpath)
+    reset()
+
+
+def allocbuffers(): #only the buffer for the selected decode path is kept
+    global framebuf, shadow, planebuf, shadows, ring, ringviews, ringmask
+    if len(ring) != RINGSIZE:
+        ring = bytearray(RINGSIZE)
+        ringmask = RINGSIZE - 1
+        view = memoryview(ring)
+        ringviews = [view[i:i + CHUNK] for i in range(0, RINGSIZE, CHUNK)]
+    if decodedirect:
+        framebuf = bytearray(0)
+        size = (width*height + 7)//8
+        if len(planebuf) != planes*size or len(shadows) != planes:
+            planebuf = shadows = shadow = None
+            planebuf = bytearray(planes*size)
+            if planes == 1: shadows = [planebuf]
+            else: shadows = [memoryview(planebuf)[i*size:(i + 1)*size] for i in range(planes)]
+        shadow = shadows[0]
+    else:
+        planebuf = shadow = bytearray(0)
+        shadows = []
+        if len(framebuf) != displaywidth*displayheight*2: framebuf = bytearray(displaywidth*displayheight*2)
+    gc.collect()
 
 capframerate = True
-def play(callback=None, usegc=True):
-    global stopped
+def play(callback=None, usegc=False, clock=None, clockrate=0): #the ring buffer reader doesn't allocate, so no per-frame gc.collect() by default
+    #clock: audio.bufstate (current sample at [3], total at [4], output thread running at [25]) and its sample rate, to follow the audio instead of the timer
+    global stopped, statframes, stattotal, statmax, statpeakram, statdropped, statlate
     stopped = False
+    statframes = stattotal = statmax = statpeakram = statdropped = statlate = 0
     oldframerate = engine.fps_limit()
     engine.disable_fps_limit() #use our own frame limiter for this
     starttime = time.ticks_ms()
+    startframe = curframe #playback may start mid-video after seek() or resume()
+    serviced = False #callback already ran since the last engine.tick(), button presses only update there
     
     while playing():
-        #nexttime += 1000.0/framerate #can't use this with audio - cumulative error causes desync
-        nexttime = starttime + (1000*curframe)/framerate #breaks pausing but that won't work with audio anyway
+        if clock and (clock[3] >= clock[4] or not clock[25]): #the audio ended first or never started, carry on with the timer
+            clock = None
+            starttime = time.ticks_ms()
+            startframe = curframe
+        #frame that should be on screen now - computed from the start every time, so errors don't accumulate
+        if not capframerate: due = curframe
+        elif clock: due = clock[3]*framerate//clockrate
+        else: due = startframe + time.ticks_diff(time.ticks_ms(), starttime)*framerate//1000
+        
+        if due < curframe: #early - read ahead, or sleep if there's nothing to read
+            if not prefetch(): time.sleep_ms(1)
+            if callback and not serviced: #keep input and the audio buffers serviced while waiting
+                callback()
+                serviced = True
+            continue
+        
+        if due > curframe: #late - decode the frames in between without showing them
+            statlate += 1
+            while curframe < due and curframe + 1 < framecount:
+                nextframe(False)
+                statdropped += 1
         if usegc: gc.collect()
         nextframe()
-        if callback: callback()
+        if callback and not serviced: callback()
         engine.tick()
-        delayed = False
-        if capframerate:
-            while time.ticks_ms() < nexttime:
-                delayed = True
-            #if not delayed: print("Frame delay not necessary - May be overloaded, or timer too imprecise")
+        serviced = False
     
     engine.fps_limit(oldframerate)
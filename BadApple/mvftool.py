@@ -0,0 +1,670 @@
+"""
+mvftool.py - Offline MVF encoder, validator and reference decoder (run with CPython).
+
+    python3 mvftool.py encode SOURCE OUT.mvf [--fps N] [--level N] [--keyint N]
+                                             [--cost X] [--meta TEXT]
+                                             [--bits 1|2|4] [--palette RRGGBB,...]
+    python3 mvftool.py validate FILE.mvf [--verbose]
+    python3 mvftool.py decode FILE.mvf OUTDIR
+
+SOURCE is a directory of frames in name order (PBM/PGM natively, plain
+P1/P2 or binary P4/P5, anything else through Pillow if it's installed) or
+an existing .mvf to re-encode.
+Pixels brighter than half scale are white. With --bits 2 or 4 the video
+is palettized (scheme 2): brightness is split into 4 or 16 levels, shown
+as a grey ramp unless --palette gives a colour for each level.
+
+For every frame the encoder tries an I-frame in both scan directions, both
+run types and both background colours, and a P-frame in both scan
+directions and run types. Level 1 and up also tries offset P-frames, moved
+by up to 2 * level pixels each way. The variant with the lowest
+bytes + cost * decode operations wins. A decode operation is one pixel
+written or flipped or one byte of VLQ parsed, which is roughly what the
+viper loops in mvf.py spend their time on. --keyint forces an I-frame at
+least that often, so mvf.seek() never has to decode far.
+
+validate walks a file with the reference decoder. It checks the header,
+the pair-header nibbles and that every frame uses exactly its own bytes
+and fits mvf.py's ring buffer, then prints bytes and estimated decode
+operations per frame. decode writes the frames as PBM images, or PPM
+for palettized video.
+
+The bitstream is the one mvf.py reads: "MVF\\0", u16 metadata length,
+metadata, then <HHBIB width, height, framerate, framecount, scheme (1).
+One header byte per two frames follows (high nibble first). Each nibble is
+8 = I-frame, 4 = vertical scan, 2 = run mode, 1 = background colour on
+I-frames or offset on P-frames. Then comes each frame's VLQ length and
+data. Scans snake by the parity of the video's position, centred on the
+128x128 screen. Scheme 2 adds a plane count (2 or 4) and a palette of
+2^planes RGB565 colours after those fields. Each video frame is then that
+many 1-bit frames in the stream, one per bit of the palette index, lowest
+bit first.
+
+Offset P-frames are this tool's own layout: the frame data starts with two
+signed bytes dx, dy, and the previous frame is moved by that much, edges
+repeated, before the rest is applied. Files that use them set bit 7 (0x80)
+of the scheme byte. mvf.py only plays offset frames from files with that
+flag and rejects the ones written by other encoders at levels above 0.
+"""
+
+import argparse
+import os
+import re
+import struct
+import sys
+from operator import itemgetter
+
+DISPLAY = 128
+SCHEME = 1
+SCHEME_PALETTE = 2
+OFFSETS = 0x80  # scheme flag: offset P-frames use this tool's dx, dy layout
+MAX_FRAME = 8192 - 512  # mvf.RINGSIZE - mvf.CHUNK: the largest frame the ring reader can hold
+
+I_FRAME = 8
+VERTICAL = 4
+RUN_MODE = 2
+BG_OR_OFFSET = 1
+
+FLIP = bytes([1, 0]) + bytes(254)
+RUNS = re.compile(b"\x00+|\x01+")
+
+
+class MVFError(Exception):
+    pass
+
+
+# Scan order and VLQs
+
+def scan_orders(width, height):
+    """Pixel indices in horizontal and vertical scan order, snaking like mvf.filllut()."""
+    xpos = int(DISPLAY / 2 - width / 2)
+    ypos = int(DISPLAY / 2 - height / 2)
+    horizontal = []
+    for y in range(height):
+        xs = range(width - 1, -1, -1) if (y + ypos) & 1 else range(width)
+        horizontal.extend(y * width + x for x in xs)
+    vertical = []
+    for x in range(width):
+        ys = range(height - 1, -1, -1) if (x + xpos) & 1 else range(height)
+        vertical.extend(y * width + x for y in ys)
+    return horizontal, vertical
+
+
+def _inverse(order):
+    inv = [0] * len(order)
+    for i, p in enumerate(order):
+        inv[p] = i
+    return inv
+
+
+def vlq(n):
+    out = [n & 127]
+    n >>= 7
+    while n:
+        out.append((n & 127) | 128)
+        n >>= 7
+    return bytes(reversed(out))
+
+
+def read_vlq(buf, pos):
+    total = 0
+    while True:
+        if pos >= len(buf):
+            raise MVFError("frame data ends inside a VLQ")
+        b = buf[pos]
+        pos += 1
+        if b < 128:
+            return total + b, pos
+        total = (total + (b & 127)) << 7
+
+
+def shift(frame, width, height, dx, dy):
+    """Move a frame by (dx, dy), repeating edge pixels, like mvf.shiftshadow()."""
+    rows = []
+    for y in range(height):
+        sy = min(max(y - dy, 0), height - 1)
+        row = frame[sy * width:(sy + 1) * width]
+        if dx > 0:
+            row = row[:1] * min(dx, width) + row[:max(width - dx, 0)]
+        elif dx < 0:
+            row = row[min(-dx, width):] + row[-1:] * min(-dx, width)
+        rows.append(row)
+    return b"".join(rows)
+
+
+class Video:
+    """Frame geometry shared by the encoder and the decoder."""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.limit = width * height
+        orders = scan_orders(width, height)
+        self.scan = [itemgetter(*order) for order in orders]
+        self.unscan = [itemgetter(*_inverse(order)) for order in orders]
+
+    def to_scan(self, frame, vertical):
+        return bytes(self.scan[vertical](frame))
+
+    def from_scan(self, seq, vertical):
+        return bytes(self.unscan[vertical](seq))
+
+
+# Reference decoder
+
+def decode_frame(video, prev, flags, payload):
+    """Decode one frame the way mvf.py does. Returns (frame, bytes used, decode ops)."""
+    limit = video.limit
+    vertical = (flags >> 2) & 1
+    runmode = (flags >> 1) & 1
+    pos = 0
+    ops = 0
+    if flags & I_FRAME:
+        bg = flags & 1
+        colour = bg
+        seq = bytearray()
+        while len(seq) < limit:
+            num, pos = read_vlq(payload, pos)
+            if runmode:
+                seq += bytes([colour]) * num
+            elif num:
+                seq.append(colour)
+                seq += bytes([bg]) * (num - 1)
+                colour = bg
+            colour ^= 1
+        del seq[limit:]
+        ops += limit
+    else:
+        if flags & 1:
+            if len(payload) < 2:
+                raise MVFError("offset frame without an offset")
+            dx, dy = struct.unpack("<bb", payload[:2])
+            if abs(dx) >= video.width or abs(dy) >= video.height:
+                raise MVFError("offset (%d, %d) is larger than the video" % (dx, dy))
+            prev = shift(prev, video.width, video.height, dx, dy)
+            pos = 2
+            ops += limit
+        seq = bytearray(video.to_scan(prev, vertical))
+        i = 0
+        while i < limit:
+            skip, pos = read_vlq(payload, pos)
+            i += skip
+            if i >= limit:
+                break
+            if not runmode:
+                seq[i] ^= 1
+                ops += 1
+                continue
+            num, pos = read_vlq(payload, pos)
+            end = min(i + num, limit)
+            seq[i:end] = seq[i:end].translate(FLIP)
+            ops += end - i
+            i = end
+    ops += pos
+    return video.from_scan(seq, vertical), pos, ops
+
+
+def read_header(f):
+    if f.read(4) != b"MVF\x00":
+        raise MVFError("not an MVF file")
+    metalen = struct.unpack("<H", f.read(2))[0]
+    metadata = f.read(metalen)
+    fields = f.read(10)
+    if len(metadata) != metalen or len(fields) != 10:
+        raise MVFError("truncated header")
+    width, height, framerate, framecount, scheme = struct.unpack("<HHBIB", fields)
+    offsets = bool(scheme & OFFSETS)
+    scheme &= ~OFFSETS
+    if scheme == SCHEME:
+        planes, palette = 1, None
+    elif scheme == SCHEME_PALETTE:
+        planes = f.read(1)[0]
+        if planes not in (2, 4):
+            raise MVFError("unsupported bit depth %d" % planes)
+        palette = list(struct.unpack("<%dH" % (1 << planes), f.read(2 << planes)))
+    else:
+        raise MVFError("unsupported compression scheme %d" % scheme)
+    if not 0 < width <= DISPLAY or not 0 < height <= DISPLAY:
+        raise MVFError("%dx%d doesn't fit the %dx%d screen" % (width, height, DISPLAY, DISPLAY))
+    return metadata, width, height, framerate, framecount, planes, palette, offsets
+
+
+def iter_frames(path, problems=None):
+    """Yield (frame number, flags per plane, bytes, decoded frame, decode ops) for every frame.
+
+    Decoded frames hold one palette index (0/1 for 1-bit video) per pixel.
+    Format problems that mvf.py would survive are appended to problems;
+    anything it couldn't play raises MVFError.
+    """
+    with open(path, "rb") as f:
+        metadata, width, height, framerate, framecount, planes, palette, offsets = read_header(f)
+        stream = f.read()
+    video = Video(width, height)
+    bits = [bytes(video.limit)] * planes
+    streamframes = framecount * planes
+    pos = 0
+    header = 0
+    for n in range(framecount):
+        flags_list = []
+        size = 0
+        ops = 0
+        for plane in range(planes):
+            s = n * planes + plane
+            if s & 1 == 0:
+                if pos >= len(stream):
+                    raise MVFError("frame %d: file ends before its pair header" % n)
+                header = stream[pos]
+                pos += 1
+                if s + 1 == streamframes and header & 15 and problems is not None:
+                    problems.append("last pair header has a second frame nibble but there is no second frame")
+            flags = header >> 4 if s & 1 == 0 else header & 15
+            framelen, pos = read_vlq(stream, pos)
+            payload = stream[pos:pos + framelen]
+            if len(payload) < framelen:
+                raise MVFError("frame %d: file ends inside the frame" % n)
+            if framelen > MAX_FRAME:
+                raise MVFError("frame %d: %d bytes doesn't fit mvf.py's ring buffer" % (n, framelen))
+            if flags & (I_FRAME | BG_OR_OFFSET) == BG_OR_OFFSET and not offsets:
+                raise MVFError("frame %d: offset P-frame in a file without the offset flag. "
+                               "Offset frames from other encoders aren't supported" % n)
+            try:
+                bits[plane], used, plane_ops = decode_frame(video, bits[plane], flags, payload)
+            except MVFError as e:
+                raise MVFError("frame %d: %s" % (n, e))
+            if used != framelen and problems is not None:
+                problems.append("frame %d: %d of %d bytes used" % (n, used, framelen))
+            pos += framelen
+            flags_list.append(flags)
+            size += framelen
+            ops += plane_ops
+        if planes == 1:
+            frame = bits[0]
+        else:
+            frame = bytes(sum(bits[p][i] << p for p in range(planes)) for i in range(video.limit))
+            ops += video.limit  # blitplanes() looks up the palette per pixel
+        yield n, flags_list, size, frame, ops
+    if pos != len(stream) and problems is not None:
+        problems.append("%d bytes after the last frame" % (len(stream) - pos))
+
+
+def video_info(path):
+    with open(path, "rb") as f:
+        return read_header(f)
+
+
+# Encoder
+
+_vlqs = {}
+
+
+def _vlq_join(values):
+    out = []
+    for v in values:
+        b = _vlqs.get(v)
+        if b is None:
+            b = _vlqs[v] = vlq(v)
+        out.append(b)
+    return b"".join(out)
+
+
+def encode_iframe(seq, limit, runmode, bg):
+    if runmode:
+        runs = [m.end() - m.start() for m in RUNS.finditer(seq)]
+        if seq[0] != bg:
+            runs.insert(0, 0)
+        return _vlq_join(runs)
+    marks = [m.start() for m in re.finditer(b"\x00" if bg else b"\x01", seq)]
+    if not marks:
+        return _vlq_join([limit])
+    values = [marks[0]]
+    values.extend(b - a for a, b in zip(marks, marks[1:]))
+    values.append(limit - marks[-1])
+    return _vlq_join(values)
+
+
+def encode_pframe(diff, limit, runmode):
+    """diff holds 1 where the scanned pixel flips."""
+    values = []
+    i = 0
+    if runmode:
+        for m in re.finditer(b"\x01+", diff):
+            values.append(m.start() - i)
+            values.append(m.end() - m.start())
+            i = m.end()
+        if i < limit:
+            values.append(limit - i)
+        return _vlq_join(values)
+    for m in re.finditer(b"\x01", diff):
+        values.append(m.start() - i)
+        i = m.start()
+    values.append(limit - i)
+    return _vlq_join(values)
+
+
+def _xor(a, b):
+    return (int.from_bytes(a, "little") ^ int.from_bytes(b, "little")).to_bytes(len(a), "little")
+
+
+def _popcount(b):
+    return bin(int.from_bytes(b, "little")).count("1")
+
+
+class Encoder:
+    """Encodes one 1-bit plane."""
+
+    def __init__(self, width, height, level=0, cost=0.005, counts=None):
+        self.video = Video(width, height)
+        self.radius = 2 * level
+        self.cost = cost
+        self.prev = bytes(self.video.limit)  # mvf.py clears the screen before frame 0
+        self.counts = counts if counts is not None else {"I": 0, "P": 0, "offset": 0}
+
+    def _best_offset(self):
+        """Offset with the fewest changed pixels against the current frame."""
+        video = self.video
+        best = (_popcount(_xor(self.prev, self.cur)), 0, 0)
+        if best[0] < 64:  # not worth the full-frame shift
+            return 0, 0
+        for dy in range(-self.radius, self.radius + 1):
+            for dx in range(-self.radius, self.radius + 1):
+                if dx or dy:
+                    moved = shift(self.prev, video.width, video.height, dx, dy)
+                    changed = _popcount(_xor(moved, self.cur))
+                    if changed < best[0]:
+                        best = (changed, dx, dy)
+        return best[1], best[2]
+
+    def encode(self, frame, key=False):
+        """Returns (flags, frame bytes) for the next frame, an I-frame if key is set."""
+        video = self.video
+        limit = video.limit
+        self.cur = frame
+        candidates = []  # (cost, flags, payload)
+        scans = [video.to_scan(frame, v) for v in (0, 1)]
+        for vertical in (0, 1):
+            for runmode in (0, 1):
+                for bg in (0, 1):
+                    payload = encode_iframe(scans[vertical], limit, runmode, bg)
+                    flags = I_FRAME | vertical << 2 | runmode << 1 | bg
+                    candidates.append((len(payload) + self.cost * (limit + len(payload)), flags, payload))
+        if not key:
+            offsets = [(0, 0)]
+            if self.radius:
+                offset = self._best_offset()
+                if offset != (0, 0):
+                    offsets.append(offset)
+            for dx, dy in offsets:
+                base = shift(self.prev, video.width, video.height, dx, dy) if dx or dy else self.prev
+                prefix = struct.pack("<bb", dx, dy) if dx or dy else b""
+                ops = (limit if prefix else 0) + _popcount(_xor(base, frame))
+                for vertical in (0, 1):
+                    diff = _xor(video.to_scan(base, vertical), scans[vertical])
+                    for runmode in (0, 1):
+                        payload = prefix + encode_pframe(diff, limit, runmode)
+                        flags = vertical << 2 | runmode << 1 | (1 if prefix else 0)
+                        candidates.append((len(payload) + self.cost * (ops + len(payload)), flags, payload))
+        candidates = [c for c in candidates if len(c[2]) <= MAX_FRAME]
+        if not candidates:
+            raise MVFError("frame too complex for the %d byte frame limit" % MAX_FRAME)
+        _, flags, payload = min(candidates, key=lambda c: c[0])
+        if flags & I_FRAME:
+            self.counts["I"] += 1
+        else:
+            self.counts["offset" if flags & 1 else "P"] += 1
+        self.prev = frame
+        return flags, payload
+
+
+def write_mvf(path, frames, width, height, framerate, metadata=b"", planes=1, palette=None,
+              level=0, keyint=0, cost=0.005):
+    """Encode an iterable of frames (one palette index per pixel, row-major) and write the file.
+
+    The frame count goes in the header, so frames are buffered in memory as
+    encoded data, which is small.
+    """
+    counts = {"I": 0, "P": 0, "offset": 0}
+    encoders = [Encoder(width, height, level, cost, counts) for _ in range(planes)]
+    masks = [bytes((v >> p) & 1 for v in range(256)) for p in range(planes)]
+    encoded = []  # one (flags, payload) per plane per frame
+    frames_done = 0
+    since_key = 0
+    for frame in frames:
+        if len(frame) != width * height:
+            raise MVFError("frame %d is not %dx%d" % (frames_done, width, height))
+        key = bool(keyint) and since_key + 1 >= keyint
+        planes_out = [encoders[p].encode(frame.translate(masks[p]), key) for p in range(planes)]
+        since_key = 0 if all(flags & I_FRAME for flags, _ in planes_out) else since_key + 1
+        encoded.extend(planes_out)
+        frames_done += 1
+    flag = OFFSETS if counts["offset"] else 0
+    with open(path, "wb") as f:
+        f.write(b"MVF\x00" + struct.pack("<H", len(metadata)) + metadata)
+        if planes == 1:
+            f.write(struct.pack("<HHBIB", width, height, framerate, frames_done, SCHEME | flag))
+        else:
+            f.write(struct.pack("<HHBIBB", width, height, framerate, frames_done, SCHEME_PALETTE | flag, planes))
+            f.write(struct.pack("<%dH" % (1 << planes), *palette))
+        for n in range(0, len(encoded), 2):
+            pair = encoded[n:n + 2]
+            header = pair[0][0] << 4
+            if len(pair) > 1:
+                header |= pair[1][0]
+            f.write(bytes([header]))
+            for _, payload in pair:
+                f.write(vlq(len(payload)) + payload)
+    return counts, frames_done
+
+
+def rgb565(r, g, b):
+    return (r >> 3) << 11 | (g >> 2) << 5 | b >> 3
+
+
+def grey_palette(planes):
+    levels = (1 << planes) - 1
+    return [rgb565(*[255 * i // levels] * 3) for i in range(levels + 1)]
+
+
+# Frame sources
+
+def _read_netpbm(path):
+    """PBM (P1/P4) or PGM (P2/P5) as (width, height, 0-255 grey pixels), or None for other files."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    magic = raw[:2]
+    if magic not in (b"P1", b"P2", b"P4", b"P5"):
+        return None
+    fields = []
+    pos = 2
+    wanted = 2 if magic in (b"P1", b"P4") else 3
+    while len(fields) < wanted:
+        m = re.compile(rb"\s*(#[^\n]*\n\s*)*(\d+)").match(raw, pos)
+        fields.append(int(m.group(2)))
+        pos = m.end()
+    width, height = fields[:2]
+    if magic in (b"P1", b"P2"):
+        # plain formats, the raster is ASCII too and may hold comments
+        text = re.sub(rb"#[^\n]*", b"", raw[pos:])
+        if magic == b"P1":  # the digits need no whitespace between them
+            bits = re.findall(rb"[01]", text)[:width * height]
+            return width, height, bytes(0 if b == b"1" else 255 for b in bits)
+        samples = [int(v) for v in text.split()[:width * height]]
+        return width, height, bytes(v * 255 // fields[2] for v in samples)
+    pos += 1  # single whitespace before the raster
+    if magic == b"P4":
+        stride = (width + 7) // 8
+        pixels = bytearray(width * height)
+        for y in range(height):
+            row = raw[pos + y * stride:pos + (y + 1) * stride]
+            for x in range(width):
+                pixels[y * width + x] = 0 if row[x >> 3] & (0x80 >> (x & 7)) else 255  # 1 is black in PBM
+        return width, height, bytes(pixels)
+    maxval = fields[2]
+    step = 2 if maxval > 255 else 1
+    samples = raw[pos:pos + width * height * step:step]
+    top = maxval >> (8 if step == 2 else 0)
+    return width, height, bytes(s * 255 // top for s in samples)
+
+
+def _read_image(path):
+    frame = _read_netpbm(path)
+    if frame is not None:
+        return frame
+    try:
+        from PIL import Image
+    except ImportError:
+        raise MVFError("%s: only PBM/PGM frames can be read without Pillow" % path)
+    with Image.open(path) as img:
+        grey = img.convert("L")
+        return grey.width, grey.height, bytes(grey.getdata())
+
+
+def load_source(source):
+    """Returns (width, height, framerate or None, planes and palette or None, frame iterator).
+
+    Frames from an MVF file hold palette indices, frames from images hold
+    0-255 grey levels.
+    """
+    if os.path.isfile(source):
+        metadata, width, height, framerate, framecount, planes, palette, _ = video_info(source)
+        return width, height, framerate, (planes, palette), (frame for _, _, _, frame, _ in iter_frames(source))
+    names = sorted(n for n in os.listdir(source) if not n.startswith("."))
+    if not names:
+        raise MVFError("no frames in " + source)
+    width, height, first = _read_image(os.path.join(source, names[0]))
+
+    def frames():
+        yield first
+        for name in names[1:]:
+            w, h, frame = _read_image(os.path.join(source, name))
+            if (w, h) != (width, height):
+                raise MVFError("%s is %dx%d, expected %dx%d" % (name, w, h, width, height))
+            yield frame
+    return width, height, None, None, frames()
+
+
+def write_ppm(path, width, height, frame, palette):
+    colours = [bytes(((c >> 11) * 255 // 31, ((c >> 5) & 63) * 255 // 63, (c & 31) * 255 // 31)) for c in palette]
+    with open(path, "wb") as f:
+        f.write(b"P6\n%d %d\n255\n" % (width, height) + b"".join(colours[p] for p in frame))
+
+
+def write_pbm(path, width, height, frame):
+    stride = (width + 7) // 8
+    raster = bytearray(stride * height)
+    for i, p in enumerate(frame):
+        if not p:
+            y, x = divmod(i, width)
+            raster[y * stride + (x >> 3)] |= 0x80 >> (x & 7)
+    with open(path, "wb") as f:
+        f.write(b"P4\n%d %d\n" % (width, height) + raster)
+
+
+# Commands
+
+def _kind(flags):
+    if flags & I_FRAME:
+        return "I"
+    return "P+offset" if flags & 1 else "P"
+
+
+def _flag_name(flags):
+    return "%s %s %s" % (_kind(flags), "vert" if flags & VERTICAL else "horiz", "run" if flags & RUN_MODE else "pixel")
+
+
+def cmd_validate(args):
+    problems = []
+    metadata, width, height, framerate, framecount, planes, palette, offsets = video_info(args.file)
+    print("%s: %dx%d, %d colours, %d frames at %d FPS, scheme %d%s, metadata %r"
+          % (args.file, width, height, 1 << planes, framecount, framerate, SCHEME if planes == 1 else SCHEME_PALETTE,
+             " with offset frames" if offsets else "",
+             metadata.decode("utf-8", "replace")))
+    sizes = []
+    costs = []
+    kinds = {}
+    for n, flags_list, size, _, ops in iter_frames(args.file, problems):
+        sizes.append(size)
+        costs.append(ops)
+        for flags in flags_list:
+            kinds[_kind(flags)] = kinds.get(_kind(flags), 0) + 1
+        if args.verbose:
+            print("frame %5d  %-22s %5d bytes %6d ops" % (n, " | ".join(map(_flag_name, flags_list)), size, ops))
+    if sizes:
+        print("bytes/frame avg %.1f max %d, decode ops/frame avg %.0f max %d"
+              % (sum(sizes) / len(sizes), max(sizes), sum(costs) / len(costs), max(costs)))
+        print(("frames: " if planes == 1 else "planes: ") + ", ".join("%s %d" % kv for kv in sorted(kinds.items())))
+    for p in problems:
+        print("warning: " + p)
+    print("ok" if not problems else "%d warnings" % len(problems))
+
+
+def cmd_decode(args):
+    metadata, width, height, framerate, framecount, planes, palette, _ = video_info(args.file)
+    os.makedirs(args.outdir, exist_ok=True)
+    for n, _, _, frame, _ in iter_frames(args.file):
+        if planes == 1:
+            write_pbm(os.path.join(args.outdir, "frame%05d.pbm" % n), width, height, frame)
+        else:
+            write_ppm(os.path.join(args.outdir, "frame%05d.ppm" % n), width, height, frame, palette)
+    print("%d frames written to %s" % (framecount, args.outdir))
+
+
+def cmd_encode(args):
+    width, height, framerate, indexed, frames = load_source(args.source)
+    framerate = args.fps or framerate or 30
+    planes = args.bits
+    if indexed:  # re-encoding an MVF file keeps its palette
+        if args.bits != indexed[0]:
+            raise MVFError("the source has %d bit planes, re-encode it with --bits %d" % (indexed[0], indexed[0]))
+        palette = indexed[1]
+    else:
+        palette = grey_palette(planes) if planes > 1 else None
+        levels = bytes(v * (1 << planes) // 256 for v in range(256))  # grey to palette index
+        frames = (f.translate(levels) for f in frames)
+    if args.palette:
+        if planes == 1:
+            raise MVFError("--palette needs --bits 2 or 4")
+        colours = args.palette.split(",")
+        if len(colours) != 1 << planes:
+            raise MVFError("--palette needs %d colours" % (1 << planes))
+        palette = [rgb565(*bytes.fromhex(c.strip().lstrip("#"))) for c in colours]
+    check = []
+    counts, total = write_mvf(args.out, (check.append(f) or f for f in frames), width, height, framerate,
+                              args.meta.encode(), planes, palette, level=args.level, keyint=args.keyint,
+                              cost=args.cost)
+    # the encoder is lossless, so the reference decoder has to give back every frame
+    for n, _, _, frame, _ in iter_frames(args.out):
+        if frame != check[n]:
+            raise MVFError("frame %d doesn't decode to its source" % n)
+    size = os.path.getsize(args.out)
+    print("%s: %dx%d, %d colours, %d frames, %d bytes (%.1f per frame), I %d, P %d, offset P %d"
+          % (args.out, width, height, 1 << planes, total, size, size / max(total, 1),
+             counts["I"], counts["P"], counts["offset"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="encode, check and decode MVF video")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("encode", help="encode a frame directory or re-encode an MVF file")
+    p.add_argument("source")
+    p.add_argument("out")
+    p.add_argument("--fps", type=int, help="frame rate (default: the source's, or 30)")
+    p.add_argument("--level", type=int, default=0, help="0: no offset frames, n: offsets up to 2n pixels")
+    p.add_argument("--keyint", type=int, default=0, help="force an I-frame at least every N frames")
+    p.add_argument("--cost", type=float, default=0.005, help="bytes one decode operation is worth")
+    p.add_argument("--meta", default="", help="embedded text")
+    p.add_argument("--bits", type=int, choices=(1, 2, 4), default=1, help="bits per pixel, 2 and 4 are palettized")
+    p.add_argument("--palette", help="comma separated RRGGBB colours, one per brightness level")
+    p.set_defaults(run=cmd_encode)
+    p = sub.add_parser("validate", help="check a file and print bytes and decode cost per frame")
+    p.add_argument("file")
+    p.add_argument("--verbose", action="store_true", help="one line per frame")
+    p.set_defaults(run=cmd_validate)
+    p = sub.add_parser("decode", help="write every frame as a PBM image")
+    p.add_argument("file")
+    p.add_argument("outdir")
+    p.set_defaults(run=cmd_decode)
+    args = parser.parse_args()
+    try:
+        args.run(args)
+    except MVFError as e:
+        sys.exit("error: %s" % e)
@@ -0,0 +1,211 @@
+"""
+chessbench.py - Desktop benchmark for the Chess AI board (run with CPython).
+
+    python3 chessbench.py [max_depth] [think_ms]
+
+Runs perft on a few standard positions to check move generation, then
+fixed-depth minimax searches on both MailboxBoard and main.py's original
+SimulatedChessBoard, printing node counts, nodes/sec for each board and
+the speedup, then time-budgeted Searcher.think() calls showing the depth
+reached. A node is one minimax() call on either board.
+Note that the game only ever promotes to a queen, so perft counts for
+positions with promotions will be lower than the published numbers.
+"""
+
+import ast
+import os
+import sys
+import time
+
+import chessengine
+import chessmailbox
+from chessmailbox import MailboxBoard, Searcher, minimax, perft, grid_of, move_from, move_to, INF
+
+STARTPOS = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# (name, fen, expected perft counts from depth 1)
+PERFT_SUITE = (
+    ("startpos", STARTPOS, (20, 400, 8902, 197281)),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", (48, 2039, 97862)),
+    ("endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", (14, 191, 2812, 43238)),
+)
+
+SEARCH_SUITE = (
+    ("startpos", STARTPOS),
+    ("italian", "r1bqk1nr/pppp1ppp/2n5/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4"),
+    ("middlegame", "r2q1rk1/pp2bppp/2n1pn2/3p4/3P4/2NBPN2/PP3PPP/R2Q1RK1 w - - 0 10"),
+)
+
+
+def square_name(sq):
+    col, row = grid_of(sq)
+    return chr(ord('a') + col) + str(8 - row)
+
+
+def run_perft():
+    ok = True
+    for name, fen, expected in PERFT_SUITE:
+        board = MailboxBoard.from_fen(fen)
+        for depth, want in enumerate(expected, 1):
+            start = time.time()
+            nodes = perft(board, depth)
+            elapsed = max(time.time() - start, 1e-6)
+            status = "ok" if nodes == want else "MISMATCH (want %d)" % want
+            ok = ok and nodes == want
+            print("perft %-10s d%d %9d nodes %8.0f nps  %s" % (name, depth, nodes, nodes / elapsed, status))
+    return ok
+
+
+# The original board: main.py's piece classes and SimulatedChessBoard, lifted out of the
+# file because main.py itself needs the engine modules, and the search it ran before
+# MailboxBoard. Only used to measure the speedup.
+LEGACY_DEFS = ("ChessPiece", "King", "Queen", "Rook", "Bishop", "Knight", "Pawn", "SimulatedChessBoard", "get_piece_char")
+
+
+def load_legacy():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    tree.body = [node for node in tree.body
+                 if isinstance(node, (ast.ClassDef, ast.FunctionDef)) and node.name in LEGACY_DEFS]
+    legacy = dict(vars(chessengine))
+    exec(compile(tree, path, "exec"), legacy)
+    return legacy
+
+
+LEGACY = load_legacy()
+CHECKMATE_SCORE = 60000
+STALEMATE_SCORE = 0
+
+
+def legacy_board(fen):
+    """SimulatedChessBoard for a FEN, with has_moved set from the castling rights and pawn rows."""
+    kinds = {"k": "King", "q": "Queen", "r": "Rook", "b": "Bishop", "n": "Knight", "p": "Pawn"}
+    fields = fen.split()
+    rights = fields[2] if len(fields) > 2 else "-"
+    board = LEGACY["SimulatedChessBoard"]()
+    for row, rank in enumerate(fields[0].split("/")):
+        col = 0
+        for ch in rank:
+            if ch.isdigit():
+                col += int(ch)
+                continue
+            is_white = ch.isupper()
+            piece = LEGACY[kinds[ch.lower()]]((col, row), is_white)
+            home = 7 if is_white else 0
+            if ch in "Pp":
+                piece.has_moved = row != (6 if is_white else 1)
+            elif ch in "Kk":
+                piece.has_moved = row != home or not any(r in rights for r in ("KQ" if is_white else "kq"))
+            elif ch in "Rr":
+                right = {0: "Q", 7: "K"}.get(col, "")
+                piece.has_moved = row != home or not right or (right if is_white else right.lower()) not in rights
+            board.add_piece(piece)
+            col += 1
+    return board
+
+
+def legacy_minimax(board, depth, is_white, alpha, beta):
+    """main.py's alpha-beta over SimulatedChessBoard, before MailboxBoard replaced it."""
+    if depth == 0:
+        return sum(board.piece_scores.values()), None
+
+    best_move = None
+    all_moves = board.get_all_safe_moves(is_white, sort=True)
+
+    if not all_moves:
+        eval_score = sum(board.piece_scores.values())
+        if abs(eval_score) >= CHECKMATE_SCORE:
+            return eval_score, None
+        return STALEMATE_SCORE, None
+
+    best = float('-inf') if is_white else float('inf')
+    for piece, move in all_moves:
+        from_pos = piece.grid_position
+        if isinstance(piece, LEGACY["King"]) and abs(from_pos[0] - move[0]) > 1:
+            if board.is_in_check(is_white):
+                continue
+        board.make_move(from_pos, move)
+        score, _ = legacy_minimax(board, depth - 1, not is_white, alpha, beta)
+        board.undo_move()
+        if is_white:
+            if score > best:
+                best = score
+                best_move = (piece, move)
+            alpha = max(alpha, score)
+        else:
+            if score < best:
+                best = score
+                best_move = (piece, move)
+            beta = min(beta, score)
+        if beta <= alpha:
+            break
+    return best, best_move
+
+
+def count_calls(module, name, call):
+    """Run call() with module.name wrapped to count its calls, so recursion is counted too."""
+    original = getattr(module, name)
+    calls = [0]
+
+    def counted(*args):
+        calls[0] += 1
+        return original(*args)
+
+    setattr(module, name, counted)
+    try:
+        call()
+    finally:
+        setattr(module, name, original)
+    return calls[0]
+
+
+def timed(call):
+    start = time.time()
+    result = call()
+    return result, max(time.time() - start, 1e-6)
+
+
+def run_search(max_depth):
+    bench = sys.modules[__name__]
+    for name, fen in SEARCH_SUITE:
+        for depth in range(1, max_depth + 1):
+            is_white = fen.split()[1] == "w"
+            board = MailboxBoard.from_fen(fen)
+            (score, move), elapsed = timed(lambda: minimax(board, depth, is_white, -INF, INF))
+            nodes = count_calls(chessmailbox, "minimax", lambda: chessmailbox.minimax(
+                MailboxBoard.from_fen(fen), depth, is_white, -INF, INF))
+            old = legacy_board(fen)
+            (old_score, _), old_elapsed = timed(lambda: legacy_minimax(old, depth, is_white, -INF, INF))
+            old_nodes = count_calls(bench, "legacy_minimax", lambda: legacy_minimax(
+                legacy_board(fen), depth, is_white, -INF, INF))
+            nps = nodes / elapsed
+            old_nps = old_nodes / old_elapsed
+            best = square_name(move_from(move)) + square_name(move_to(move)) if move is not None else "-"
+            print("search %-10s d%d  old %8d nodes %8.0f nps %7.3fs  new %8d nodes %8.0f nps %7.3fs  %5.1fx  "
+                  "score %6d (old %6d)  best %s"
+                  % (name, depth, old_nodes, old_nps, old_elapsed, nodes, nps, elapsed, nps / old_nps,
+                     score, old_score, best))
+
+
+def run_think(think_ms):
+    for name, fen in SEARCH_SUITE:
+        board = MailboxBoard.from_fen(fen)
+        searcher = Searcher()
+        start = time.time()
+        score, move = searcher.think(board, think_ms)
+        elapsed = max(time.time() - start, 1e-6)
+        best = square_name(move_from(move)) + square_name(move_to(move)) if move is not None else "-"
+        print("think  %-10s %5dms depth %2d %8d nodes %8.0f nps  tt hits %6d  score %6d  best %s"
+              % (name, think_ms, searcher.depth, board.nodes, board.nodes / elapsed,
+                 searcher.tt_hits, score, best))
+
+
+if __name__ == "__main__":
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    think_ms = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    passed = run_perft()
+    run_search(depth)
+    run_think(think_ms)
+    if not passed:
+        sys.exit(1)
@@ -0,0 +1,194 @@
+"""
+chessbook.py - Precompiled opening book for the Chess AI.
+
+The openings dict in chessengine.py is compiled once into openings.bin:
+
+    python3 chessbook.py            (rewrites openings.bin, run after editing openings)
+
+Every position reached by a book line is stored in an open addressed hash
+table keyed by its MailboxBoard Zobrist key, so lines that transpose into
+each other share entries and a lookup is a single probe per ply. Moves are
+stored as pre-resolved from/to squares, no SAN is parsed on the device.
+
+File layout (little endian):
+    header  "CBK1", u16 slot count (power of two), u16 move count, u16 name count
+    slots   u32 key (0 = empty), u16 first move, u8 move count, u8 name index
+    moves   u16 from64 | to64 << 6, u8 weight (lines through the move), u8 pad
+    names   u8 length + utf-8 bytes, one per line
+"""
+
+import struct
+import random
+
+from chessmailbox import MailboxBoard, SQ64, grid_of, move_from, move_to, move_flag, \
+    FLAG_CASTLE, PIECE_CHARS, WHITE_SIDE
+
+BOOK_FILE = "openings.bin"
+MAGIC = b"CBK1"
+HEADER_SIZE = 10
+SLOT_SIZE = 8
+MOVE_SIZE = 4
+
+
+class OpeningBook:
+    def __init__(self, path=BOOK_FILE):
+        with open(path, "rb") as f:
+            self.data = f.read()
+        if self.data[:4] != MAGIC:
+            raise ValueError("Not an opening book: " + path)
+        nslots, nmoves, nnames = struct.unpack_from("<HHH", self.data, 4)
+        self.mask = nslots - 1
+        self.moves_off = HEADER_SIZE + nslots * SLOT_SIZE
+        self.names = []
+        off = self.moves_off + nmoves * MOVE_SIZE
+        for _ in range(nnames):
+            n = self.data[off]
+            self.names.append(self.data[off + 1:off + 1 + n].decode())
+            off += 1 + n
+
+    def _find(self, key):
+        data = self.data
+        i = key & self.mask
+        while True:
+            off = HEADER_SIZE + i * SLOT_SIZE
+            k = struct.unpack_from("<I", data, off)[0]
+            if k == key:
+                return off
+            if k == 0:
+                return -1
+            i = (i + 1) & self.mask
+
+    def moves(self, key):
+        """List of (from_pos, to_pos, weight) for the position, grid positions as in main.py."""
+        off = self._find(key)
+        if off < 0:
+            return []
+        first, count = struct.unpack_from("<HB", self.data, off + 4)
+        out = []
+        for i in range(first, first + count):
+            packed, weight = struct.unpack_from("<HB", self.data, self.moves_off + i * MOVE_SIZE)
+            fr = packed & 63
+            to = packed >> 6
+            out.append(((fr & 7, fr >> 3), (to & 7, to >> 3), weight))
+        return out
+
+    def pick(self, key):
+        """Random book move weighted by the number of lines playing it, or None."""
+        moves = self.moves(key)
+        if not moves:
+            return None
+        total = 0
+        for m in moves:
+            total += m[2]
+        r = random.randrange(total)
+        for from_pos, to_pos, weight in moves:
+            if r < weight:
+                return from_pos, to_pos
+            r -= weight
+        return None
+
+    def name(self, key):
+        """Name of the first book line through the position, or None."""
+        off = self._find(key)
+        if off < 0:
+            return None
+        return self.names[self.data[off + 7]]
+
+
+# ===============================================================
+# Build step (desktop)
+# ===============================================================
+
+def _square_name(sq):
+    col, row = grid_of(sq)
+    return chr(ord('a') + col) + str(8 - row)
+
+
+def resolve_san(board, san):
+    """Return the legal move int matching a SAN string, or None."""
+    san = san.rstrip("+#")
+    moves = board.get_all_safe_moves(board.side == WHITE_SIDE)
+    if san in ("O-O", "O-O-O"):
+        for m in moves:
+            if move_flag(m) == FLAG_CASTLE and (move_to(m) > move_from(m)) == (san == "O-O"):
+                return m
+        return None
+    piece = 1
+    if san[0] in "NBRQK":
+        piece = PIECE_CHARS.find(san[0])
+        san = san[1:]
+    if "=" in san:
+        san = san[:san.index("=")]
+    dest = san[-2:]
+    hint = san[:-2].replace("x", "")
+    found = []
+    for m in moves:
+        fr = move_from(m)
+        if board.sq[fr] & 7 != piece or _square_name(move_to(m)) != dest:
+            continue
+        from_name = _square_name(fr)
+        if all(ch in from_name for ch in hint):
+            found.append(m)
+    return found[0] if len(found) == 1 else None
+
+
+def build(openings, path=BOOK_FILE):
+    entries = {}          # key -> [name index, {packed move: weight}]
+    names = list(openings)
+    for name_idx, name in enumerate(names):
+        board = MailboxBoard.from_fen("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
+        for ply, san in enumerate(openings[name]):
+            m = resolve_san(board, san)
+            entry = entries.setdefault(board.key, [name_idx, {}])
+            if m is None:
+                print("%s: skipping from ply %d, %s is not legal here" % (name, ply + 1, san))
+                break
+            packed = SQ64[move_from(m)] | (SQ64[move_to(m)] << 6)
+            entry[1][packed] = entry[1].get(packed, 0) + 1
+            board.make_move(m)
+        else:
+            entries.setdefault(board.key, [name_idx, {}])
+
+    nslots = 1
+    while nslots < len(entries) * 2:
+        nslots <<= 1
+    slots = [None] * nslots
+    for key in entries:
+        if key == 0:
+            raise ValueError("Zobrist key 0 is reserved for empty slots")
+        i = key & (nslots - 1)
+        while slots[i] is not None:
+            i = (i + 1) & (nslots - 1)
+        slots[i] = key
+
+    slot_data = bytearray()
+    move_data = bytearray()
+    nmoves = 0
+    for key in slots:
+        if key is None:
+            slot_data += struct.pack("<IHBB", 0, 0, 0, 0)
+            continue
+        name_idx, book_moves = entries[key]
+        slot_data += struct.pack("<IHBB", key, nmoves, len(book_moves), name_idx)
+        for packed, weight in sorted(book_moves.items()):
+            move_data += struct.pack("<HBB", packed, min(weight, 255), 0)
+            nmoves += 1
+
+    name_data = bytearray()
+    for name in names:
+        raw = name.encode()
+        name_data += bytes((len(raw),)) + raw
+
+    with open(path, "wb") as f:
+        f.write(MAGIC + struct.pack("<HHH", nslots, nmoves, len(names)))
+        f.write(slot_data)
+        f.write(move_data)
+        f.write(name_data)
+    print("%s: %d positions, %d moves, %d slots, %d bytes"
+          % (path, len(entries), nmoves, nslots,
+             HEADER_SIZE + len(slot_data) + len(move_data) + len(name_data)))
+
+
+if __name__ == "__main__":
+    from chessengine import openings
+    build(openings)
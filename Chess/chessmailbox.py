@@ -0,0 +1,831 @@
+"""
+chessmailbox.py - Compact board backend used by the Chess AI search.
+
+The game keeps its own object based SimulatedChessBoard for rendering and
+rules checks; before the AI thinks it is converted into a MailboxBoard:
+
+    board = MailboxBoard.from_simulated(sim_board, is_white)
+    score, move = searcher.think(board, time_ms)      # or minimax(board, depth, is_white, -INF, INF)
+    from_pos, to_pos = grid_of(move_from(move)), grid_of(move_to(move))
+
+Layout:
+    sq        bytearray(120) 10x12 mailbox, OFFBOARD sentinels around 8x8
+    plist     per-side lists of occupied squares (king included)
+    pindex    bytearray(120) square -> slot in its side's plist
+    key       Zobrist key, updated incrementally by make_move/undo_move
+    score     material + pstable score (white positive), same units as
+              evaluate_board() in main.py, updated incrementally
+
+Grid positions follow main.py: (col, row) with row 0 = rank 8.
+Moves are ints: from | to << 7 | flag << 14 (squares are mailbox indices).
+"""
+
+from array import array
+
+try:
+    from time import ticks_ms, ticks_diff
+except ImportError:
+    # CPython (chessbench.py)
+    from time import time as _time
+    def ticks_ms(): return int(_time() * 1000)
+    def ticks_diff(a, b): return a - b
+
+from chessengine import piece_values, pstable
+
+EMPTY    = 0
+PAWN     = 1
+KNIGHT   = 2
+BISHOP   = 3
+ROOK     = 4
+QUEEN    = 5
+KING     = 6
+BLACK    = 8          # colour bit, black piece = BLACK | type
+OFFBOARD = 16
+
+WHITE_SIDE = 0
+BLACK_SIDE = 1
+
+# Move flags
+FLAG_NONE   = 0
+FLAG_DOUBLE = 1
+FLAG_EP     = 2
+FLAG_CASTLE = 3
+FLAG_PROMO  = 4
+
+INF = 1000000
+CHECKMATE_SCORE = 60000
+STALEMATE_SCORE = 0
+
+MAX_PLY = 128
+
+PIECE_CHARS = ".PNBRQK"
+
+KNIGHT_STEPS = (-21, -19, -12, -8, 8, 12, 19, 21)
+KING_STEPS   = (-11, -10, -9, -1, 1, 9, 10, 11)
+BISHOP_STEPS = (-11, -9, 9, 11)
+ROOK_STEPS   = (-10, -1, 1, 10)
+
+# Transposition table flags
+TT_EXACT = 0
+TT_LOWER = 1
+TT_UPPER = 2
+
+# Move ordering bands, kept below 2**30 so they stay small ints
+ORDER_TT      = 1 << 28
+ORDER_CAPTURE = 1 << 26
+ORDER_KILLER  = 1 << 24
+HISTORY_MAX   = 1 << 20
+
+# Most valuable victim / least valuable attacker ordering weights
+MVV_LVA_VALUE = (0, 1, 3, 3, 5, 9, 20)
+
+
+def move_from(m): return m & 0x7F
+def move_to(m):   return (m >> 7) & 0x7F
+def move_flag(m): return m >> 14
+def _enc(fr, to, fl): return fr | (to << 7) | (fl << 14)
+
+
+def square_of(grid_position):
+    return 21 + grid_position[1] * 10 + grid_position[0]
+
+
+def grid_of(sq):
+    s = sq - 21
+    return (s % 10, s // 10)
+
+
+# ===============================================================
+# Tables
+# ===============================================================
+
+# Score of piece code p on mailbox square s lives at psq[p * 120 + s]
+psq = array('l', [0] * (16 * 120))
+
+# Zobrist keys are kept to 30 bits so they stay small ints on MicroPython
+zob_piece  = array('l', [0] * (16 * 120))
+zob_castle = array('l', [0] * 16)
+zob_ep     = array('l', [0] * 120)
+zob_side   = 0
+
+# Mailbox square -> 0..63, used to index the history table
+SQ64 = bytearray(120)
+
+# Castling rights: 1 = white O-O, 2 = white O-O-O, 4 = black O-O, 8 = black O-O-O
+castle_mask = bytearray(b'\x0f' * 120)
+
+WHITE_KING_HOME = 95
+BLACK_KING_HOME = 25
+
+_rand_state = 0x2545F491
+
+
+def _rand30():
+    # xorshift32, fixed seed so keys (and anything stored by key) are stable
+    global _rand_state
+    s = _rand_state
+    s ^= (s << 13) & 0xFFFFFFFF
+    s ^= s >> 17
+    s ^= (s << 5) & 0xFFFFFFFF
+    _rand_state = s
+    return s & 0x3FFFFFFF
+
+
+def _init_tables():
+    global zob_side
+    for row in range(8):
+        for col in range(8):
+            s = 21 + row * 10 + col
+            SQ64[s] = row * 8 + col
+            for t in range(PAWN, KING + 1):
+                ch = PIECE_CHARS[t]
+                value = piece_values[ch]
+                psq[t * 120 + s] = value + pstable[ch][row * 8 + col]
+                psq[(BLACK | t) * 120 + s] = -(value + pstable[ch][(7 - row) * 8 + (7 - col)])
+    for p in range(16):
+        for s in range(120):
+            zob_piece[p * 120 + s] = _rand30()
+    for i in range(16):
+        zob_castle[i] = _rand30()
+    for s in range(120):
+        zob_ep[s] = _rand30()
+    zob_side = _rand30()
+
+    castle_mask[WHITE_KING_HOME] = 15 & ~3
+    castle_mask[98] = 15 & ~1
+    castle_mask[91] = 15 & ~2
+    castle_mask[BLACK_KING_HOME] = 15 & ~12
+    castle_mask[28] = 15 & ~4
+    castle_mask[21] = 15 & ~8
+
+
+_init_tables()
+
+_TYPE_BY_NAME = {"Pawn": PAWN, "Knight": KNIGHT, "Bishop": BISHOP,
+                 "Rook": ROOK, "Queen": QUEEN, "King": KING}
+
+
+# ===============================================================
+# Board
+# ===============================================================
+
+class MailboxBoard:
+    def __init__(self):
+        self.sq = bytearray(120)
+        for s in range(120):
+            self.sq[s] = OFFBOARD
+        for row in range(8):
+            for col in range(8):
+                self.sq[21 + row * 10 + col] = EMPTY
+        self.plist = ([], [])
+        self.pindex = bytearray(120)
+        self.king = [0, 0]
+        self.side = WHITE_SIDE
+        self.castle = 0
+        self.ep = 0
+        self.key = 0
+        self.score = 0
+        self.ply = 0
+        self.nodes = 0
+
+        # Undo stacks, indexed by ply
+        self.h_move   = array('l', [0] * MAX_PLY)
+        self.h_capt   = bytearray(MAX_PLY)
+        self.h_slot   = bytearray(MAX_PLY)
+        self.h_castle = bytearray(MAX_PLY)
+        self.h_ep     = bytearray(MAX_PLY)
+        self.h_key    = array('l', [0] * MAX_PLY)
+        self.h_score  = array('l', [0] * MAX_PLY)
+
+    # ---- Setup ----
+
+    def put(self, s, p):
+        c = p >> 3
+        self.sq[s] = p
+        self.pindex[s] = len(self.plist[c])
+        self.plist[c].append(s)
+        if p & 7 == KING:
+            self.king[c] = s
+
+    def _refresh(self):
+        # Recompute key and score from scratch, used after setup only
+        key = 0
+        score = 0
+        for c in (WHITE_SIDE, BLACK_SIDE):
+            for s in self.plist[c]:
+                p = self.sq[s]
+                key ^= zob_piece[p * 120 + s]
+                score += psq[p * 120 + s]
+        key ^= zob_castle[self.castle]
+        if self.ep:
+            key ^= zob_ep[self.ep]
+        if self.side == BLACK_SIDE:
+            key ^= zob_side
+        self.key = key
+        self.score = score
+
+    def _ep_capturable(self, ep, c):
+        # Only record an en passant square if side c has a pawn to use it,
+        # so transpositions hash the same whichever way they were reached.
+        pawn = PAWN | (BLACK if c else 0)
+        s = ep + (10 if c == WHITE_SIDE else -10)
+        return self.sq[s - 1] == pawn or self.sq[s + 1] == pawn
+
+    @classmethod
+    def from_simulated(cls, board, is_white):
+        """Build from main.py's SimulatedChessBoard, is_white = side to move."""
+        b = cls()
+        for piece in board.pieces:
+            t = _TYPE_BY_NAME[type(piece).__name__]
+            b.put(square_of(piece.grid_position), t if piece.is_white else (BLACK | t))
+        castle = 0
+        for home, row, ks, qs in ((WHITE_KING_HOME, 7, 1, 2), (BLACK_KING_HOME, 0, 4, 8)):
+            king = board.piece_positions.get((4, row))
+            if king is None or type(king).__name__ != "King" or king.has_moved:
+                continue
+            for col, bit in ((7, ks), (0, qs)):
+                rook = board.piece_positions.get((col, row))
+                if rook is not None and type(rook).__name__ == "Rook" \
+                        and rook.is_white == king.is_white and not rook.has_moved:
+                    castle |= bit
+        b.castle = castle
+        b.side = WHITE_SIDE if is_white else BLACK_SIDE
+        for piece in board.pieces:
+            if type(piece).__name__ == "Pawn" and piece.en_passant_target \
+                    and piece.is_white != is_white:
+                ep = square_of(piece.grid_position) + (10 if piece.is_white else -10)
+                if b._ep_capturable(ep, b.side):
+                    b.ep = ep
+        b._refresh()
+        return b
+
+    @classmethod
+    def from_fen(cls, fen):
+        b = cls()
+        fields = fen.split()
+        row = 0
+        col = 0
+        for ch in fields[0]:
+            if ch == '/':
+                row += 1
+                col = 0
+            elif '1' <= ch <= '8':
+                col += ord(ch) - ord('0')
+            else:
+                t = PIECE_CHARS.find(ch.upper())
+                b.put(21 + row * 10 + col, t if ch.isupper() else (BLACK | t))
+                col += 1
+        b.side = WHITE_SIDE if len(fields) < 2 or fields[1] == 'w' else BLACK_SIDE
+        castle = 0
+        if len(fields) > 2:
+            for ch in fields[2]:
+                castle |= {'K': 1, 'Q': 2, 'k': 4, 'q': 8}.get(ch, 0)
+        b.castle = castle
+        if len(fields) > 3 and fields[3] != '-':
+            ep = 21 + (8 - int(fields[3][1])) * 10 + ord(fields[3][0]) - ord('a')
+            if b._ep_capturable(ep, b.side):
+                b.ep = ep
+        b._refresh()
+        return b
+
+    # ---- Make / undo ----
+
+    def _remove(self, c, s):
+        lst = self.plist[c]
+        idx = self.pindex[s]
+        last = lst.pop()
+        if last != s:
+            lst[idx] = last
+            self.pindex[last] = idx
+        return idx
+
+    def _restore(self, c, s, idx):
+        lst = self.plist[c]
+        if idx == len(lst):
+            lst.append(s)
+        else:
+            other = lst[idx]
+            self.pindex[other] = len(lst)
+            lst.append(other)
+            lst[idx] = s
+        self.pindex[s] = idx
+
+    def _move_piece(self, c, fr, to):
+        idx = self.pindex[fr]
+        self.plist[c][idx] = to
+        self.pindex[to] = idx
+
+    def make_move(self, m):
+        sq = self.sq
+        fr = m & 0x7F
+        to = (m >> 7) & 0x7F
+        fl = m >> 14
+        p = sq[fr]
+        c = p >> 3
+        ply = self.ply
+        key = self.key
+        score = self.score
+
+        self.h_move[ply] = m
+        self.h_castle[ply] = self.castle
+        self.h_ep[ply] = self.ep
+        self.h_key[ply] = key
+        self.h_score[ply] = score
+
+        capsq = to
+        if fl == FLAG_EP:
+            capsq = to + (10 if c == WHITE_SIDE else -10)
+        cap = sq[capsq]
+        self.h_capt[ply] = cap
+        if cap:
+            self.h_slot[ply] = self._remove(c ^ 1, capsq)
+            sq[capsq] = EMPTY
+            key ^= zob_piece[cap * 120 + capsq]
+            score -= psq[cap * 120 + capsq]
+
+        np = (p & BLACK) | QUEEN if fl == FLAG_PROMO else p
+        sq[fr] = EMPTY
+        sq[to] = np
+        self._move_piece(c, fr, to)
+        key ^= zob_piece[p * 120 + fr] ^ zob_piece[np * 120 + to]
+        score += psq[np * 120 + to] - psq[p * 120 + fr]
+
+        if p & 7 == KING:
+            self.king[c] = to
+            if fl == FLAG_CASTLE:
+                if to > fr:
+                    rf = fr + 3
+                    rt = fr + 1
+                else:
+                    rf = fr - 4
+                    rt = fr - 1
+                r = sq[rf]
+                sq[rf] = EMPTY
+                sq[rt] = r
+                self._move_piece(c, rf, rt)
+                key ^= zob_piece[r * 120 + rf] ^ zob_piece[r * 120 + rt]
+                score += psq[r * 120 + rt] - psq[r * 120 + rf]
+
+        castle = self.castle
+        new_castle = castle & castle_mask[fr] & castle_mask[to]
+        if new_castle != castle:
+            key ^= zob_castle[castle] ^ zob_castle[new_castle]
+            self.castle = new_castle
+
+        if self.ep:
+            key ^= zob_ep[self.ep]
+        self.ep = 0
+        if fl == FLAG_DOUBLE:
+            ep = (fr + to) >> 1
+            if self._ep_capturable(ep, c ^ 1):
+                self.ep = ep
+                key ^= zob_ep[ep]
+
+        self.key = key ^ zob_side
+        self.score = score
+        self.side = c ^ 1
+        self.ply = ply + 1
+        self.nodes += 1
+
+    def undo_move(self):
+        sq = self.sq
+        ply = self.ply - 1
+        self.ply = ply
+        m = self.h_move[ply]
+        fr = m & 0x7F
+        to = (m >> 7) & 0x7F
+        fl = m >> 14
+        p = sq[to]
+        c = p >> 3
+        if fl == FLAG_PROMO:
+            p = (p & BLACK) | PAWN
+
+        sq[to] = EMPTY
+        sq[fr] = p
+        self._move_piece(c, to, fr)
+
+        if p & 7 == KING:
+            self.king[c] = fr
+            if fl == FLAG_CASTLE:
+                if to > fr:
+                    rf = fr + 3
+                    rt = fr + 1
+                else:
+                    rf = fr - 4
+                    rt = fr - 1
+                sq[rf] = sq[rt]
+                sq[rt] = EMPTY
+                self._move_piece(c, rt, rf)
+
+        cap = self.h_capt[ply]
+        if cap:
+            capsq = to
+            if fl == FLAG_EP:
+                capsq = to + (10 if c == WHITE_SIDE else -10)
+            sq[capsq] = cap
+            self._restore(c ^ 1, capsq, self.h_slot[ply])
+
+        self.castle = self.h_castle[ply]
+        self.ep = self.h_ep[ply]
+        self.key = self.h_key[ply]
+        self.score = self.h_score[ply]
+        self.side = c
+
+    # ---- Attacks ----
+
+    def is_attacked(self, s, by):
+        sq = self.sq
+        colour = BLACK if by else 0
+        if by == WHITE_SIDE:
+            if sq[s + 9] == PAWN or sq[s + 11] == PAWN:
+                return True
+        else:
+            if sq[s - 9] == BLACK | PAWN or sq[s - 11] == BLACK | PAWN:
+                return True
+        knight = colour | KNIGHT
+        for d in KNIGHT_STEPS:
+            if sq[s + d] == knight:
+                return True
+        king = colour | KING
+        for d in KING_STEPS:
+            if sq[s + d] == king:
+                return True
+        queen = colour | QUEEN
+        bishop = colour | BISHOP
+        for d in BISHOP_STEPS:
+            t = s + d
+            p = sq[t]
+            while p == EMPTY:
+                t += d
+                p = sq[t]
+            if p == bishop or p == queen:
+                return True
+        rook = colour | ROOK
+        for d in ROOK_STEPS:
+            t = s + d
+            p = sq[t]
+            while p == EMPTY:
+                t += d
+                p = sq[t]
+            if p == rook or p == queen:
+                return True
+        return False
+
+    def is_in_check(self, is_white):
+        c = WHITE_SIDE if is_white else BLACK_SIDE
+        return self.is_attacked(self.king[c], c ^ 1)
+
+    # ---- Move generation ----
+
+    def generate_moves(self, c):
+        """Pseudo-legal moves for side c; the king may be left in check."""
+        sq = self.sq
+        moves = []
+        append = moves.append
+        enemy = BLACK if c == WHITE_SIDE else 0
+        for s in self.plist[c]:
+            t = sq[s] & 7
+            if t == PAWN:
+                fwd = -10 if c == WHITE_SIDE else 10
+                to = s + fwd
+                last_row = (to - 21) // 10 in (0, 7)
+                if sq[to] == EMPTY:
+                    if last_row:
+                        append(s | (to << 7) | (FLAG_PROMO << 14))
+                    else:
+                        append(s | (to << 7))
+                        start = 81 <= s <= 88 if c == WHITE_SIDE else 31 <= s <= 38
+                        if start and sq[to + fwd] == EMPTY:
+                            append(s | ((to + fwd) << 7) | (FLAG_DOUBLE << 14))
+                for to in (s + fwd - 1, s + fwd + 1):
+                    p = sq[to]
+                    if p and p != OFFBOARD and (p & BLACK) == enemy:
+                        append(s | (to << 7) | ((FLAG_PROMO if last_row else FLAG_NONE) << 14))
+                    elif to == self.ep and self.ep:
+                        append(s | (to << 7) | (FLAG_EP << 14))
+            elif t == KNIGHT or t == KING:
+                for d in (KNIGHT_STEPS if t == KNIGHT else KING_STEPS):
+                    to = s + d
+                    p = sq[to]
+                    if p == EMPTY or (p != OFFBOARD and (p & BLACK) == enemy):
+                        append(s | (to << 7))
+            else:
+                if t == BISHOP:
+                    steps = BISHOP_STEPS
+                elif t == ROOK:
+                    steps = ROOK_STEPS
+                else:
+                    steps = KING_STEPS
+                for d in steps:
+                    to = s + d
+                    p = sq[to]
+                    while p == EMPTY:
+                        append(s | (to << 7))
+                        to += d
+                        p = sq[to]
+                    if p != OFFBOARD and (p & BLACK) == enemy:
+                        append(s | (to << 7))
+
+        # Castling: king and rook unmoved, path empty, king not passing through check
+        castle = self.castle >> (2 * c)
+        if castle & 3:
+            home = WHITE_KING_HOME if c == WHITE_SIDE else BLACK_KING_HOME
+            rook = (BLACK if c else 0) | ROOK
+            if castle & 1 and sq[home + 1] == EMPTY and sq[home + 2] == EMPTY \
+                    and sq[home + 3] == rook \
+                    and not self.is_attacked(home, c ^ 1) \
+                    and not self.is_attacked(home + 1, c ^ 1):
+                append(home | ((home + 2) << 7) | (FLAG_CASTLE << 14))
+            if castle & 2 and sq[home - 1] == EMPTY and sq[home - 2] == EMPTY \
+                    and sq[home - 3] == EMPTY and sq[home - 4] == rook \
+                    and not self.is_attacked(home, c ^ 1) \
+                    and not self.is_attacked(home - 1, c ^ 1):
+                append(home | ((home - 2) << 7) | (FLAG_CASTLE << 14))
+        return moves
+
+    def order_moves(self, moves):
+        # Captures first, most valuable victim / least valuable attacker
+        sq = self.sq
+        moves.sort(key=lambda m: -(MVV_LVA_VALUE[sq[(m >> 7) & 0x7F] & 7] * 32
+                                   - MVV_LVA_VALUE[sq[m & 0x7F] & 7]
+                                   if sq[(m >> 7) & 0x7F] else 0))
+
+    def get_all_safe_moves(self, is_white, sort=False):
+        c = WHITE_SIDE if is_white else BLACK_SIDE
+        safe_moves = []
+        for m in self.generate_moves(c):
+            self.make_move(m)
+            if not self.is_attacked(self.king[c], c ^ 1):
+                safe_moves.append(m)
+            self.undo_move()
+        if sort:
+            self.order_moves(safe_moves)
+        return safe_moves
+
+    def evaluate(self):
+        return self.score
+
+
+# ===============================================================
+# Search
+# ===============================================================
+
+def minimax(board, depth, is_white, alpha, beta):
+    """Alpha-beta over a MailboxBoard. Returns (score, move), white positive."""
+    if depth == 0:
+        return board.score, None
+
+    c = WHITE_SIDE if is_white else BLACK_SIDE
+    king = board.king
+    moves = board.generate_moves(c)
+    board.order_moves(moves)
+    best_move = None
+    best = -INF if is_white else INF
+    for m in moves:
+        board.make_move(m)
+        if board.is_attacked(king[c], c ^ 1):
+            board.undo_move()
+            continue
+        score, _ = minimax(board, depth - 1, not is_white, alpha, beta)
+        board.undo_move()
+        if is_white:
+            if score > best:
+                best = score
+                best_move = m
+            if score > alpha:
+                alpha = score
+        else:
+            if score < best:
+                best = score
+                best_move = m
+            if score < beta:
+                beta = score
+        if beta <= alpha:
+            break
+
+    if best_move is None:
+        # No legal move: mate is scored so that nearer mates are preferred
+        if board.is_attacked(king[c], c ^ 1):
+            return (-CHECKMATE_SCORE - depth if is_white else CHECKMATE_SCORE + depth), None
+        return STALEMATE_SCORE, None
+    return best, best_move
+
+
+def perft(board, depth):
+    if depth == 0:
+        return 1
+    c = board.side
+    king = board.king
+    nodes = 0
+    for m in board.generate_moves(c):
+        board.make_move(m)
+        if not board.is_attacked(king[c], c ^ 1):
+            nodes += perft(board, depth - 1)
+        board.undo_move()
+    return nodes
+
+
+class Searcher:
+    """
+    Iterative deepening alpha-beta (negamax) with a wall-clock budget.
+
+    Keeps a fixed size transposition table keyed by the board's Zobrist
+    key, plus killer and history tables for quiet move ordering. One
+    Searcher is reused across moves so the table carries over.
+    """
+
+    def __init__(self, tt_bits=12):
+        size = 1 << tt_bits
+        self.tt_mask  = size - 1
+        self.tt_key   = array('l', [0] * size)
+        self.tt_move  = array('l', [0] * size)
+        self.tt_score = array('l', [0] * size)
+        self.tt_info  = bytearray(size)        # depth << 2 | flag
+        self.killers  = array('l', [0] * (MAX_PLY * 2))
+        self.history  = array('l', [0] * (64 * 64))
+        self.start_ms = 0
+        self.time_ms  = 0
+        self.stopped  = False
+        self.depth    = 0
+        self.tt_hits  = 0
+
+    def clear(self):
+        for i in range(self.tt_mask + 1):
+            self.tt_key[i] = 0
+            self.tt_move[i] = 0
+            self.tt_info[i] = 0
+        for i in range(64 * 64):
+            self.history[i] = 0
+
+    def think(self, board, time_ms, max_depth=32):
+        """
+        Search until time_ms runs out or max_depth is done. Returns
+        (score, move) like minimax(): score is white positive, move is
+        None when the side to move has no legal move.
+        """
+        self.start_ms = ticks_ms()
+        self.time_ms = time_ms
+        self.stopped = False
+        self.depth = 0
+        self.tt_hits = 0
+        for i in range(MAX_PLY * 2):
+            self.killers[i] = 0
+        history = self.history
+        for i in range(64 * 64):
+            history[i] >>= 1
+
+        best_move = None
+        best_score = 0
+        for depth in range(1, max_depth + 1):
+            score, move = self._root(board, depth, best_move)
+            if self.stopped:
+                break
+            best_move = move
+            best_score = score
+            self.depth = depth
+            if move is None or abs(score) >= CHECKMATE_SCORE - MAX_PLY:
+                break
+            # The next iteration costs several times this one, don't start it
+            # unless at least half the budget is left
+            if ticks_diff(ticks_ms(), self.start_ms) * 2 >= time_ms:
+                break
+        return (best_score if board.side == WHITE_SIDE else -best_score), best_move
+
+    def _order(self, board, moves, tt_move, ply):
+        sq = board.sq
+        k1 = self.killers[ply * 2]
+        k2 = self.killers[ply * 2 + 1]
+        history = self.history
+
+        def order_key(m):
+            if m == tt_move:
+                return ORDER_TT
+            victim = sq[(m >> 7) & 0x7F]
+            if victim:
+                return ORDER_CAPTURE + MVV_LVA_VALUE[victim & 7] * 32 - MVV_LVA_VALUE[sq[m & 0x7F] & 7]
+            if m >> 14 == FLAG_PROMO:
+                return ORDER_CAPTURE
+            if m == k1:
+                return ORDER_KILLER + 1
+            if m == k2:
+                return ORDER_KILLER
+            return history[SQ64[m & 0x7F] * 64 + SQ64[(m >> 7) & 0x7F]]
+
+        moves.sort(key=order_key, reverse=True)
+
+    def _root(self, board, depth, prev_best):
+        c = board.side
+        king = board.king
+        moves = board.generate_moves(c)
+        self._order(board, moves, prev_best or 0, 0)
+        alpha = -INF
+        best_move = None
+        for m in moves:
+            board.make_move(m)
+            if board.is_attacked(king[c], c ^ 1):
+                board.undo_move()
+                continue
+            score = -self._negamax(board, depth - 1, -INF, -alpha, 1)
+            board.undo_move()
+            if self.stopped:
+                break
+            if score > alpha or best_move is None:
+                alpha = score
+                best_move = m
+        if self.stopped:
+            return alpha, best_move
+        if best_move is None:
+            if board.is_attacked(king[c], c ^ 1):
+                return -CHECKMATE_SCORE, None
+            return STALEMATE_SCORE, None
+        self._store(board.key, depth, alpha, TT_EXACT, best_move, 0)
+        return alpha, best_move
+
+    def _store(self, key, depth, score, flag, move, ply):
+        idx = key & self.tt_mask
+        if self.tt_key[idx] != key or depth >= self.tt_info[idx] >> 2:
+            if score > CHECKMATE_SCORE - MAX_PLY:
+                score += ply
+            elif score < -(CHECKMATE_SCORE - MAX_PLY):
+                score -= ply
+            self.tt_key[idx] = key
+            self.tt_move[idx] = move
+            self.tt_score[idx] = score
+            self.tt_info[idx] = (depth << 2) | flag
+
+    def _negamax(self, board, depth, alpha, beta, ply):
+        if (board.nodes & 255) == 0 and ticks_diff(ticks_ms(), self.start_ms) >= self.time_ms:
+            self.stopped = True
+        if self.stopped:
+            return 0
+        c = board.side
+        if depth == 0:
+            return board.score if c == WHITE_SIDE else -board.score
+
+        key = board.key
+        idx = key & self.tt_mask
+        tt_move = 0
+        if self.tt_key[idx] == key:
+            tt_move = self.tt_move[idx]
+            info = self.tt_info[idx]
+            if info >> 2 >= depth:
+                self.tt_hits += 1
+                score = self.tt_score[idx]
+                if score > CHECKMATE_SCORE - MAX_PLY:
+                    score -= ply
+                elif score < -(CHECKMATE_SCORE - MAX_PLY):
+                    score += ply
+                flag = info & 3
+                if flag == TT_EXACT:
+                    return score
+                if flag == TT_LOWER and score >= beta:
+                    return score
+                if flag == TT_UPPER and score <= alpha:
+                    return score
+
+        sq = board.sq
+        king = board.king
+        moves = board.generate_moves(c)
+        self._order(board, moves, tt_move, ply)
+        alpha0 = alpha
+        best = -INF
+        best_move = 0
+        for m in moves:
+            quiet = not sq[(m >> 7) & 0x7F] and m >> 14 != FLAG_PROMO
+            board.make_move(m)
+            if board.is_attacked(king[c], c ^ 1):
+                board.undo_move()
+                continue
+            score = -self._negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            board.undo_move()
+            if self.stopped:
+                return 0
+            if score > best:
+                best = score
+                best_move = m
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if quiet:
+                            killers = self.killers
+                            if killers[ply * 2] != m:
+                                killers[ply * 2 + 1] = killers[ply * 2]
+                                killers[ply * 2] = m
+                            h = SQ64[m & 0x7F] * 64 + SQ64[(m >> 7) & 0x7F]
+                            v = self.history[h] + depth * depth
+                            self.history[h] = v if v < HISTORY_MAX else HISTORY_MAX
+                        break
+
+        if not best_move:
+            if board.is_attacked(king[c], c ^ 1):
+                return -CHECKMATE_SCORE + ply
+            return STALEMATE_SCORE
+
+        if best <= alpha0:
+            flag = TT_UPPER
+        elif best >= beta:
+            flag = TT_LOWER
+        else:
+            flag = TT_EXACT
+        self._store(key, depth, best, flag, best_move, ply)
+        return best
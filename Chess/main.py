@@ -11,7 +11,9 @@ from engine_resources import FontResource, TextureResource, WaveSoundResource
 from engine_animation import Tween, ONE_SHOT, EASE_SINE_IN
 from engine_draw import Color
 
-from chessengine import openings, piece_values, pstable
+from chessengine import piece_values, pstable
+from chessmailbox import MailboxBoard, Searcher, grid_of, move_from, move_to
+from chessbook import OpeningBook
 
 random.seed(time.ticks_ms())
 
@@ -33,7 +35,9 @@ CELL_WIDTH = 16
 CELL_HEIGHT = 16
 OFFSET = CELL_WIDTH / 2
 
-MAX_DEPTH=2
+# AI thinking time per move in milliseconds, the search deepens until it runs out
+AI_THINK_MS = 3000
+AI_THINK_MS_ENDGAME = 4000
 
 # Global dictionary to track timing
 timing_data = {}
@@ -710,14 +714,11 @@ class ChessGame(Rectangle2DNode):
         self.last_move = None
         self.moves = []
         self.endgame = False
-        # Choose a random opening if the AI is white
-        self.ai_opening_moves = None
+        self.opening_name = None
         if self.player_is_white:
             self.selected_grid_position = (4, 6)
         else:
             self.selected_grid_position = (7 - 4, 7 - 6)
-        if not self.player_is_white:
-            self.ai_opening_moves =random.choice(list(openings.values()))
 
         # Initialize evaluation lines
         self.white_evaluation_line = Line2DNode(start=Vector2(0, DISP_HEIGHT), end=Vector2(0, DISP_HEIGHT), thickness=2, color=engine_draw.white, opacity=1.0, outline=False)
@@ -858,56 +859,30 @@ class ChessGame(Rectangle2DNode):
 
     def make_ai_move(self):
         #start_time = time.ticks_ms()
-        opening_move = None
-        if self.current_player_is_white and self.ai_opening_moves and len(self.moves) < 4:
-            # start with a book opening
-            opening_move_index = len(self.moves)
-            if opening_move_index < len(self.ai_opening_moves):
-                opening_move = self.ai_opening_moves[opening_move_index]
-        else:
-            # Check if the current moves match any opening
-            matched_openings = [(name, moves) for name, moves in openings.items() if self.moves == moves[:len(self.moves)]]
-            
-            if matched_openings:
-                # Select a random opening from the matched openings
-                opening_name, opening_moves = random.choice(matched_openings)
-                try:
-                    opening_move = opening_moves[len(self.moves)]
-                    print(opening_name)
-                except:
-                    opening_move = None
-
-        if opening_move:
+        # Positions are looked up in the precompiled book by Zobrist key, so
+        # transposed move orders still find their book moves
+        ai_board = MailboxBoard.from_simulated(self.chessboard.board, not self.player_is_white)
+        book_move = opening_book.pick(ai_board.key)
+        if book_move:
             # Play the next move in the opening
-            piece_type, from_pos, to_pos = self.algebraic_to_positions(opening_move, self.current_player_is_white)
-            if from_pos is None:
-                # If from_pos is not determined, find the piece based on the to_pos and type
-                for p in self.chessboard.board.pieces:
-                    if p.is_white != self.current_player_is_white:
-                        continue
-                    if piece_type and get_piece_notation(p) != piece_type:
-                        continue
-                    if to_pos in p.valid_moves(self.chessboard.board):
-                        from_pos = p.grid_position
-                        break
+            from_pos, to_pos = book_move
         else:
             # Update endgame flag
             self.update_endgame_flag()
-            # Use minimax if no opening is tracked or opening moves are exhausted
-            global MAX_DEPTH
-            if self.endgame:
-                MAX_DEPTH = 3
+            # Search if no opening is tracked or opening moves are exhausted
+            think_ms = AI_THINK_MS_ENDGAME if self.endgame else AI_THINK_MS
      
             engine.freq(250 * 1000 * 1000)
 
-            eval_score, best_move = minimax(self.chessboard.board, depth=MAX_DEPTH, is_white=not self.player_is_white, alpha=float('-inf'), beta=float('inf'))
+            # Search on the compact mailbox copy of the position
+            eval_score, best_move = ai_searcher.think(ai_board, think_ms)
 
             engine.freq(150 * 1000 * 1000)
 
-            if not best_move:
+            if best_move is None:
                 return
-            p, to_pos = best_move
-            from_pos = p.grid_position
+            from_pos = grid_of(move_from(best_move))
+            to_pos = grid_of(move_to(best_move))
 
         # Execute the AI move
         self.execute_move(from_pos, to_pos)
@@ -945,7 +920,7 @@ class ChessGame(Rectangle2DNode):
         #print(generate_pgn_moves_list(self.moves))
 
         # Check for opening
-        self.opening_name = check_opening(self.moves)
+        self.opening_name = check_opening(self.chessboard.board, not self.current_player_is_white)
         #if self.opening_name:
             #print(self.opening_name)
 
@@ -960,62 +935,6 @@ class ChessGame(Rectangle2DNode):
         self.print_board_state()
         self.chessboard.render_pieces()
 
-    def algebraic_to_positions(self, move, is_white):
-        # Handle castling
-        if move == 'O-O':
-            # Kingside castling
-            return 'K', (4, 7 if is_white else 0), (6, 7 if is_white else 0)
-        elif move == 'O-O-O':
-            # Queenside castling
-            return 'K', (4, 7 if is_white else 0), (2, 7 if is_white else 0)
-
-        piece_type = ''
-        if move[0].isupper() and move[0] != 'x':
-            piece_type = move[0]
-            move = move[1:]
-
-        capture = 'x' in move
-        if capture:
-            parts = move.split('x')
-            if len(parts) != 2:
-                raise ValueError("Invalid move notation")
-            from_file = parts[0] if piece_type == '' else ''
-            to_pos = parts[1]
-        else:
-            from_file = ''
-            to_pos = move
-
-        to_pos = (ord(to_pos[0]) - ord('a'), 8 - int(to_pos[1]))
-        from_pos = None
-        possible_pieces = []
-
-        if piece_type == '':  # Handle pawn moves
-            for piece in self.chessboard.board.pieces:
-                if isinstance(piece, Pawn) and piece.is_white == is_white:
-                    valid_moves = piece.valid_moves(self.chessboard.board)
-                    if to_pos in valid_moves:
-                        if not from_file or piece.grid_position[0] == (ord(from_file) - ord('a')):
-                            possible_pieces.append(piece)
-        else:
-            for piece in self.chessboard.board.pieces:
-                if piece.is_white == is_white and get_piece_notation(piece) == piece_type:
-                    valid_moves = piece.valid_moves(self.chessboard.board)
-                    if to_pos in valid_moves:
-                        if not from_file or piece.grid_position[0] == (ord(from_file) - ord('a')):
-                            possible_pieces.append(piece)
-
-        if len(possible_pieces) == 1:
-            from_pos = possible_pieces[0].grid_position
-        elif len(possible_pieces) > 1:
-            for piece in possible_pieces:
-                if piece.grid_position[0] == (ord(from_file) - ord('a')):
-                    from_pos = piece.grid_position
-                    break
-            if from_pos is None:
-                raise ValueError("Ambiguous move notation")
-
-        return piece_type, from_pos, to_pos
-
 def generate_move_notation(piece, from_pos, to_pos, board):
     piece_notation = get_piece_notation(piece)
     target_piece = board.piece_positions.get(to_pos)
@@ -1125,11 +1044,8 @@ def get_piece_char(piece):
     return '.'
 
 
-def check_opening(moves):
-    for opening_name, opening_moves in openings.items():
-        if moves == opening_moves[:len(moves)]:
-            return opening_name
-    return None
+def check_opening(board, is_white_to_move):
+    return opening_book.name(MailboxBoard.from_simulated(board, is_white_to_move).key)
 
 
 def evaluate_board(board, endgame=False):
@@ -1138,59 +1054,6 @@ def evaluate_board(board, endgame=False):
         score += piece_score
     return score
 
-CHECKMATE_SCORE = 60000
-STALEMATE_SCORE = 0
-
-def minimax(board, depth, is_white, alpha, beta):
-    if depth == 0:
-        return evaluate_board(board), None
-
-    best_move = None
-    all_moves = board.get_all_safe_moves(is_white, sort=True)
-
-    if not all_moves:
-        eval_score = evaluate_board(board)
-        if abs(eval_score) >= CHECKMATE_SCORE:
-            return eval_score, None
-        return STALEMATE_SCORE, None
-
-    if is_white:
-        max_eval = float('-inf')
-        for piece, move in all_moves:
-            from_pos = piece.grid_position
-            to_pos = move
-            if isinstance(piece, King) and abs(from_pos[0] - to_pos[0]) > 1:
-                if board.is_in_check(is_white):
-                    continue
-            board.make_move(from_pos, to_pos)
-            eval, _ = minimax(board, depth - 1, False, alpha, beta)
-            board.undo_move()
-            if eval > max_eval:
-                max_eval = eval
-                best_move = (piece, move)
-            alpha = max(alpha, eval)
-            if beta <= alpha:
-                break
-        return max_eval, best_move
-    else:
-        min_eval = float('inf')
-        for piece, move in all_moves:
-            from_pos = piece.grid_position
-            to_pos = move
-            if isinstance(piece, King) and abs(from_pos[0] - to_pos[0]) > 1:
-                if board.is_in_check(is_white):
-                    continue
-            board.make_move(from_pos, to_pos)
-            eval, _ = minimax(board, depth - 1, True, alpha, beta)
-            board.undo_move()
-            if eval < min_eval:
-                min_eval = eval
-                best_move = (piece, move)
-            beta = min(beta, eval)
-            if beta <= alpha:
-                break
-        return min_eval, best_move
-
 def get_piece_frame_x(piece):
     if isinstance(piece, King):
         return 3
@@ -1215,6 +1078,8 @@ def start_chess_game():
 
 camera = CameraNode()
 camera.position = Vector3(DISP_WIDTH / 2, DISP_WIDTH / 2, 1)
+ai_searcher = Searcher()
+opening_book = OpeningBook()
 game = None
 start_chess_game()
 
@@ -11,6 +11,7 @@ Mirrors chal.h's API:
     get_legal_moves() -> list[(from, to, promo)]   (from/to are 0x88)
     play_move(from, to, promo) -> bool
     search_best_move(max_depth, time_ms) -> (from, to, promo)  ; from = 0x80 if none
+                                            (book move first, see book_open)
     undo_move() -> bool
     evaluate_position() -> int
     is_in_check() -> bool
@@ -20,6 +21,20 @@ Mirrors chal.h's API:
     get_last_depth() -> int
     stop_search()
 
+Resumable search (not in chal.h), used to keep the game loop running:
+    search_start(max_depth, time_ms)        begin a search of the current position
+    ponder_start()                          open-ended search, only fills the TT
+    search_step(ms, nodes) -> bool          run one slice, True when done
+    search_active() -> bool
+    search_result() -> (from, to, promo)    best move so far (from = 0x80 if none)
+    search_info() -> (depth, score, nodes)
+    search_abort()                          abandon the search, the TT is kept
+    book_open(path) -> bool / book_close()  opening book on flash, see chalbook.py
+A slice that runs out abandons the current iteration and the next slice
+searches it again, finding the finished subtrees in the TT. Between slices
+the board is at the root, so the position can be inspected freely; calls
+that change it abandon the search first.
+
 This is a literal port; runtime is dramatically slower than the C version
 (plan on depth ~3-4 in a few seconds on the RP2350). Move generation,
 make/undo, eval and search structure are all faithful, including TT,
@@ -59,6 +74,8 @@ TT_EXACT = 0
 TT_ALPHA = 1
 TT_BETA  = 2
 
+SLICE_SCALE_MAX = 4   # a search_step() slice grows to at most 16x its budget
+
 # ---- Move encoding ----
 # Bits 0-6 = from, 7-13 = to, 14-17 = promo
 def _from(m):   return m & 0x7F
@@ -229,6 +246,12 @@ castle_rights = 0
 hash_key = 0
 count = [bytearray(7), bytearray(7)]
 
+# Incremental eval terms, white minus black, kept by _make_move/_undo_move
+inc_mg    = 0        # material + piece-square, middlegame
+inc_eg    = 0        # material + piece-square, endgame
+inc_phase = 0        # game phase (sum of phase_inc)
+pawn_key  = 0        # Zobrist key of the pawns only, indexes the pawn hash
+
 # Piece list
 list_piece  = bytearray(32)              # type 0..6
 list_square = bytearray(32)              # 0..127 or 0x88(=136) sentinel
@@ -246,24 +269,75 @@ h_castle  = bytearray(HIST_MAX)
 h_hm      = array('h', [0] * HIST_MAX)
 h_hash    = array('Q', [0] * HIST_MAX)
 h_check   = bytearray(HIST_MAX)
+h_mg      = array('i', [0] * HIST_MAX)
+h_eg      = array('i', [0] * HIST_MAX)
+h_phase   = bytearray(HIST_MAX)
+h_pkey    = array('Q', [0] * HIST_MAX)
 
 # Search auxiliaries
 killers   = array('i', [0] * (MAX_PLY * 2))    # killers[sply*2 + slot]
 hist      = array('h', [0] * (64 * 64))        # hist[fr64*64 + to64]; range fits in int16
 pv_length = array('h', [0] * MAX_PLY)
 
+# Line occupancy bitboards (both colours), kept by _make_move/_undo_move:
+# one byte per rank/file/diagonal/anti-diagonal, so a slider line test is
+# a single AND instead of a walk over the 0x88 board.
+occ_rank = bytearray(8)      # [rank], bit = file
+occ_file = bytearray(8)      # [file], bit = rank
+occ_diag = bytearray(15)     # [rank - file + 7], bit = file
+occ_anti = bytearray(15)     # [rank + file], bit = file
+
+# Attack tables indexed by (to - from + 119): which pieces on `from` can
+# attack `to`, and which occupancy line the squares in between lie on.
+ATT_WP     = 0x01
+ATT_KNIGHT = 0x04
+ATT_BISHOP = 0x08
+ATT_ROOK   = 0x10
+ATT_KING   = 0x40
+ATT_BP     = 0x80
+ATT_SLIDER = ATT_BISHOP | ATT_ROOK
+att_mask  = bytearray(240)
+att_line  = bytearray(240)   # 0 none, 1 rank, 2 file, 3 diagonal, 4 anti-diagonal
+att_piece = bytearray(16)    # ATT_* bits for each piece code
+between8  = bytearray(64)    # [a*8 + b] bits strictly between a and b
+attack_tables = True
+
 # Zobrist (flat: zobrist_piece[(c*7 + p)*128 + sq]) — 64-bit raw to avoid boxing
 zobrist_piece  = array('Q', [0] * (2 * 7 * 128))
 zobrist_ep     = array('Q', [0] * 128)
 zobrist_castle = array('Q', [0] * 16)
 zobrist_side   = 0
 
+# Signed piece-square values incl. material: [(c*7 + p)*128 + sq], black negated
+pst_mg_sq = array('h', [0] * (2 * 7 * 128))
+pst_eg_sq = array('h', [0] * (2 * 7 * 128))
+
+# Pawn hash: pawn-only structure terms cached by pawn_key
+ph_size   = 0
+ph_key    = None   # array('Q')
+ph_score  = None   # doubled + isolated penalties, white minus black (same mg/eg)
+ph_lpr    = None   # 16 bytes/entry: least advanced own-rank per file, white then black
+ph_passed = None   # 16 bytes/entry: passed pawn squares, 0-terminated
+
 # Transposition table
-tt_size  = 0
-tt_key   = None   # list[int]
-tt_score = None
-tt_best  = None
-tt_df    = None   # depth<<2 | flag
+# Two-entry buckets (depth-preferred, then always-replace) packed into one
+# array('H'), 5 halfwords = 10 bytes per entry:
+#   [0] key bits 48-63  [1] key bits 32-47  (32-bit verification key)
+#   [2] move: from64 | to64 << 6 | promo << 12
+#   [3] score (int16 two's complement)
+#   [4] depth | flag << 7 | age << 9
+TT_ENTRY  = 5
+TT_BUCKET = 2 * TT_ENTRY
+tt_size    = 0      # entries
+tt_buckets = 0
+tt         = None   # array('H')
+tt_age     = 0      # 7-bit search counter, older entries are replaced first
+
+# TT counters for the current search, see tt_stats()
+tt_probes     = 0
+tt_hits       = 0
+tt_collisions = 0
+tt_cutoffs    = 0
 
 # Search globals
 nodes_searched = 0
@@ -280,6 +354,25 @@ last_search_depth = 0
 # LMR table
 lmr_table = None  # filled in init()
 
+# Resumable search, the iterative deepening state is kept between slices
+search_running = 0       # 1 while a search_start() search is unfinished
+slice_mode     = 0       # 1 while search_step() is running a slice
+slice_over     = 0       # the slice ran out, set together with time_over_flag
+slice_scale    = 0       # slices abandoned in a row, each doubles the next slice
+slice_t0_ms    = 0
+slice_ms       = 0
+slice_node_end = 0
+root_max_depth = 0
+root_prev_sc   = 0
+root_alpha     = 0       # aspiration window of iteration root_depth
+root_beta      = 0
+root_delta     = 0
+
+# Opening book (see S12), read from flash on demand
+book_file  = None
+book_count = 0
+book_buf   = bytearray(8)
+
 
 # ===============================================================
 # Helpers
@@ -383,7 +476,7 @@ def _generate_hash():
 # S5  Attack detection
 # ===============================================================
 
-def is_square_attacked(sq, ac):
+def _attacked_rays(sq, ac):
     if ac == WHITE:
         t = sq - 17
         if not (t & 0x88) and board[t] == WP: return True
@@ -428,6 +521,95 @@ def is_square_attacked(sq, ac):
     return False
 
 
+def _init_attack_tables():
+    for i in range(240):
+        att_mask[i] = 0
+        att_line[i] = 0
+    for a in range(8):
+        for b in range(8):
+            bits = 0
+            for k in range(min(a, b) + 1, max(a, b)):
+                bits |= 1 << k
+            between8[a * 8 + b] = bits
+    for d in (15, 17):
+        att_mask[d + 119] |= ATT_WP
+        att_mask[-d + 119] |= ATT_BP
+    for i in range(piece_offsets[KNIGHT], piece_limits[KNIGHT]):
+        att_mask[step_dir[i] + 119] |= ATT_KNIGHT
+    for i in range(piece_offsets[KING], piece_limits[KING]):
+        att_mask[step_dir[i] + 119] |= ATT_KING
+    for i in range(piece_offsets[BISHOP], piece_limits[ROOK]):
+        step = step_dir[i]
+        bit = ATT_BISHOP if i < piece_limits[BISHOP] else ATT_ROOK
+        if step == 1 or step == -1:      line = 1
+        elif step == 16 or step == -16:  line = 2
+        elif step == 17 or step == -17:  line = 3
+        else:                            line = 4
+        for k in range(1, 8):
+            att_mask[step * k + 119] |= bit
+            att_line[step * k + 119] = line
+    for c in (WHITE, BLACK):
+        att_piece[(c << 3) | KNIGHT] = ATT_KNIGHT
+        att_piece[(c << 3) | BISHOP] = ATT_BISHOP
+        att_piece[(c << 3) | ROOK]   = ATT_ROOK
+        att_piece[(c << 3) | QUEEN]  = ATT_SLIDER
+        att_piece[(c << 3) | KING]   = ATT_KING
+    att_piece[WP] = ATT_WP
+    att_piece[BP] = ATT_BP
+
+
+def _occ_flip(sq):
+    r = sq >> 4
+    f = sq & 7
+    occ_rank[r] ^= 1 << f
+    occ_file[f] ^= 1 << r
+    occ_diag[r - f + 7] ^= 1 << f
+    occ_anti[r + f] ^= 1 << f
+
+
+def _init_occ():
+    for i in range(8):
+        occ_rank[i] = 0
+        occ_file[i] = 0
+    for i in range(15):
+        occ_diag[i] = 0
+        occ_anti[i] = 0
+    for slot in range(32):
+        sq = list_square[slot]
+        if sq != LIST_OFF:
+            _occ_flip(sq)
+
+
+def _line_clear(fr, to):
+    """True if no square strictly between fr and to (on a shared line) is occupied."""
+    line = att_line[to - fr + 119]
+    if line == 1:
+        return not (occ_rank[fr >> 4] & between8[(fr & 7) * 8 + (to & 7)])
+    if line == 2:
+        return not (occ_file[fr & 7] & between8[(fr >> 4) * 8 + (to >> 4)])
+    if line == 3:
+        return not (occ_diag[(fr >> 4) - (fr & 7) + 7] & between8[(fr & 7) * 8 + (to & 7)])
+    return not (occ_anti[(fr >> 4) + (fr & 7)] & between8[(fr & 7) * 8 + (to & 7)])
+
+
+def _attacked_tables(sq, ac):
+    base = 0 if ac == WHITE else 16
+    for i in range(base, base + list_count[ac]):
+        psq = list_square[i]
+        if psq == LIST_OFF:
+            continue
+        hit = att_mask[sq - psq + 119] & att_piece[board[psq]]
+        if hit and (not (hit & ATT_SLIDER) or _line_clear(psq, sq)):
+            return True
+    return False
+
+
+def is_square_attacked(sq, ac):
+    if attack_tables:
+        return _attacked_tables(sq, ac)
+    return _attacked_rays(sq, ac)
+
+
 def _in_check(s):
     return is_square_attacked(_king_sq(s), s ^ 1)
 
@@ -442,6 +624,7 @@ def _is_illegal():
 
 def _make_move(m):
     global ep_square, halfmove_clock, side, xside, castle_rights, hash_key, ply
+    global inc_mg, inc_eg, inc_phase, pawn_key
     fr = m & 0x7F
     to = (m >> 7) & 0x7F
     pr = (m >> 14) & 0xF
@@ -456,6 +639,10 @@ def _make_move(m):
     h_hm[ply]     = halfmove_clock
     h_hash[ply]   = hash_key
     h_slot[ply]   = -1
+    h_mg[ply]     = inc_mg
+    h_eg[ply]     = inc_eg
+    h_phase[ply]  = inc_phase
+    h_pkey[ply]   = pawn_key
     halfmove_clock = 0 if (pt == PAWN or cap) else halfmove_clock + 1
 
     # En-passant capture
@@ -466,7 +653,12 @@ def _make_move(m):
         list_square[h_slot[ply]] = LIST_OFF
         list_index[ep_pawn] = -1
         board[ep_pawn] = EMPTY
-        hash_key ^= zobrist_piece[((xside * 7) + PAWN) * 128 + ep_pawn]
+        _occ_flip(ep_pawn)
+        _zc = ((xside * 7) + PAWN) * 128 + ep_pawn
+        hash_key ^= zobrist_piece[_zc]
+        pawn_key ^= zobrist_piece[_zc]
+        inc_mg -= pst_mg_sq[_zc]
+        inc_eg -= pst_eg_sq[_zc]
         count[xside][PAWN] -= 1
 
     # Capture
@@ -475,7 +667,13 @@ def _make_move(m):
         list_square[h_slot[ply]] = LIST_OFF
         list_index[to] = -1
         ct = cap & 7
-        hash_key ^= zobrist_piece[((xside * 7) + ct) * 128 + to]
+        _zc = ((xside * 7) + ct) * 128 + to
+        hash_key ^= zobrist_piece[_zc]
+        if ct == PAWN:
+            pawn_key ^= zobrist_piece[_zc]
+        inc_mg -= pst_mg_sq[_zc]
+        inc_eg -= pst_eg_sq[_zc]
+        inc_phase -= phase_inc[ct]
         count[xside][ct] -= 1
 
     # Move piece in lists/board
@@ -485,9 +683,16 @@ def _make_move(m):
     list_index[fr] = -1
     board[to] = p
     board[fr] = EMPTY
+    _occ_flip(fr)
+    if not cap:
+        _occ_flip(to)
     _zb = ((side * 7) + pt) * 128
     hash_key ^= zobrist_piece[_zb + fr]
     hash_key ^= zobrist_piece[_zb + to]
+    inc_mg += pst_mg_sq[_zb + to] - pst_mg_sq[_zb + fr]
+    inc_eg += pst_eg_sq[_zb + to] - pst_eg_sq[_zb + fr]
+    if pt == PAWN:
+        pawn_key ^= zobrist_piece[_zb + fr] ^ zobrist_piece[_zb + to]
 
     # Promotion
     if pr:
@@ -496,6 +701,10 @@ def _make_move(m):
         board[to] = (side << 3) | pr
         hash_key ^= zobrist_piece[((side * 7) + pt) * 128 + to]
         hash_key ^= zobrist_piece[((side * 7) + pr) * 128 + to]
+        pawn_key ^= zobrist_piece[((side * 7) + pt) * 128 + to]
+        inc_mg += pst_mg_sq[((side * 7) + pr) * 128 + to] - pst_mg_sq[((side * 7) + pt) * 128 + to]
+        inc_eg += pst_eg_sq[((side * 7) + pr) * 128 + to] - pst_eg_sq[((side * 7) + pt) * 128 + to]
+        inc_phase += phase_inc[pr]
         count[side][PAWN] -= 1
         count[side][pr] += 1
 
@@ -512,9 +721,13 @@ def _make_move(m):
                 list_square[rook_slot] = rook_to
                 list_index[rook_to] = rook_slot
                 list_index[rook_from] = -1
+                _occ_flip(rook_from)
+                _occ_flip(rook_to)
                 _zr = ((castle_col[ci] * 7) + ROOK) * 128
                 hash_key ^= zobrist_piece[_zr + rook_from]
                 hash_key ^= zobrist_piece[_zr + rook_to]
+                inc_mg += pst_mg_sq[_zr + rook_to] - pst_mg_sq[_zr + rook_from]
+                inc_eg += pst_eg_sq[_zr + rook_to] - pst_eg_sq[_zr + rook_from]
                 break
         castle_rights &= castle_kmask[side * 2]
     for ci in range(4):
@@ -538,6 +751,7 @@ def _make_move(m):
 
 def _undo_move():
     global ep_square, halfmove_clock, side, xside, castle_rights, hash_key, ply
+    global inc_mg, inc_eg, inc_phase, pawn_key
     ply -= 1
     side ^= 1
     xside ^= 1
@@ -553,6 +767,7 @@ def _undo_move():
     list_index[to] = -1
     board[fr] = board[to]
     board[to] = cap
+    _occ_flip(fr)
 
     if pr:
         slot2 = list_index[fr]
@@ -568,6 +783,8 @@ def _undo_move():
         ep_pawn = to + (-16 if side == WHITE else 16)
         board[to] = EMPTY
         board[ep_pawn] = cap
+        _occ_flip(to)
+        _occ_flip(ep_pawn)
         if cap:
             list_square[h_slot[ply]] = ep_pawn
             list_index[ep_pawn] = h_slot[ply]
@@ -576,6 +793,8 @@ def _undo_move():
         list_square[h_slot[ply]] = to
         list_index[to] = h_slot[ply]
         count[xside][cap & 7] += 1
+    else:
+        _occ_flip(to)
 
     if pt == KING:
         for ci in range(4):
@@ -588,12 +807,18 @@ def _undo_move():
                 list_square[rook_slot] = rook_to
                 list_index[rook_to] = rook_slot
                 list_index[rook_from] = -1
+                _occ_flip(rook_from)
+                _occ_flip(rook_to)
                 break
 
     ep_square      = h_ep[ply]
     castle_rights  = h_castle[ply]
     halfmove_clock = h_hm[ply]
     hash_key       = h_hash[ply]
+    inc_mg         = h_mg[ply]
+    inc_eg         = h_eg[ply]
+    inc_phase      = h_phase[ply]
+    pawn_key       = h_pkey[ply]
 
 
 # ===============================================================
@@ -680,14 +905,7 @@ def generate_moves(caps_only):
                     continue
                 if board[rf] != ((side << 3) | ROOK):
                     continue
-                sq1 = kf + 1 if kf < rf else rf + 1
-                sq2 = rf if kf < rf else kf
-                clear_ok = True
-                for sq3 in range(sq1, sq2):
-                    if board[sq3] != EMPTY:
-                        clear_ok = False
-                        break
-                if not clear_ok:
+                if occ_rank[kf >> 4] & between8[(kf & 7) * 8 + (rf & 7)]:
                     continue
                 step2 = 1 if kt > kf else -1
                 clear_ok = True
@@ -789,6 +1007,8 @@ def _parse_fen(fen):
             halfmove_clock = int(num)
 
     _set_list()
+    _init_occ()
+    _init_eval()
 
 
 def get_fen():
@@ -842,70 +1062,149 @@ def _distance(s1, s2):
     return a if a > b else b
 
 
-def evaluate():
-    mg_w = 0; mg_b = 0
-    eg_w = 0; eg_b = 0
-    phase = 0
-    lpr_w = [7]*8
-    lpr_b = [7]*8
-    pr_list = []
-
+def _init_eval_tables():
+    for pt in range(PAWN, KING + 1):
+        for sq in range(128):
+            if sq & 0x88:
+                continue
+            rank = sq >> 4
+            f = sq & 7
+            w = rank * 8 + f
+            b = (7 - rank) * 8 + f
+            pst_mg_sq[(WHITE * 7 + pt) * 128 + sq] = mg_pst[pt - 1][w]
+            pst_eg_sq[(WHITE * 7 + pt) * 128 + sq] = eg_pst[pt - 1][w]
+            pst_mg_sq[(BLACK * 7 + pt) * 128 + sq] = -mg_pst[pt - 1][b]
+            pst_eg_sq[(BLACK * 7 + pt) * 128 + sq] = -eg_pst[pt - 1][b]
+
+
+def _init_eval():
+    """Recompute the incremental eval terms from scratch (after set-up)."""
+    global inc_mg, inc_eg, inc_phase, pawn_key
+    inc_mg = 0
+    inc_eg = 0
+    inc_phase = 0
+    pawn_key = 0
     for slot in range(32):
         sq = list_square[slot]
         if sq == LIST_OFF:
             continue
         pt = list_piece[slot]
+        z = (((WHITE if slot < 16 else BLACK) * 7) + pt) * 128 + sq
+        inc_mg += pst_mg_sq[z]
+        inc_eg += pst_eg_sq[z]
+        inc_phase += phase_inc[pt]
+        if pt == PAWN:
+            pawn_key ^= zobrist_piece[z]
+
+
+def _pawn_entry():
+    """Index of the pawn hash entry for the current pawns, filled on a miss."""
+    e = pawn_key % ph_size
+    if ph_key[e] == pawn_key:
+        return e
+    base = e * 16
+    for i in range(16):
+        ph_lpr[base + i] = 7
+        ph_passed[base + i] = 0
+
+    for slot in range(32):
+        sq = list_square[slot]
+        if sq == LIST_OFF or list_piece[slot] != PAWN:
+            continue
+        rank = sq >> 4
+        f = sq & 7
+        if slot < 16:
+            if rank < ph_lpr[base + f]: ph_lpr[base + f] = rank
+        else:
+            if 7 - rank < ph_lpr[base + 8 + f]: ph_lpr[base + 8 + f] = 7 - rank
+
+    score = 0
+    npassed = 0
+    for slot in range(32):
+        sq = list_square[slot]
+        if sq == LIST_OFF or list_piece[slot] != PAWN:
+            continue
         color = WHITE if slot < 16 else BLACK
         rank = sq >> 4
         f = sq & 7
+        own_rank = rank if color == WHITE else (7 - rank)
+        own = base if color == WHITE else base + 8
+        opp = base + 8 if color == WHITE else base
+        pen = 0
+        if own_rank != ph_lpr[own + f]:
+            pen += 20
+        passed = True
+        isolated = True
+        for df in (-1, 0, 1):
+            ef = f + df
+            if ef < 0 or ef > 7:
+                continue
+            if ph_lpr[opp + ef] != 7:
+                if 7 - ph_lpr[opp + ef] >= own_rank:
+                    passed = False
+            if df != 0 and ph_lpr[own + ef] != 7:
+                isolated = False
+        if isolated:
+            pen += 10
+        score += -pen if color == WHITE else pen
+        if passed and npassed < 16:
+            ph_passed[base + npassed] = sq
+            npassed += 1
 
-        if pt == PAWN:
-            own_rank = rank if color == WHITE else (7 - rank)
-            if color == WHITE:
-                if own_rank < lpr_w[f]: lpr_w[f] = own_rank
-            else:
-                if own_rank < lpr_b[f]: lpr_b[f] = own_rank
-            pr_list.append(sq)
-        elif pt == ROOK:
-            pr_list.append(sq)
-
-        idx = (rank * 8 + f) if color == WHITE else ((7 - rank) * 8 + f)
-        mg_v = mg_pst[pt - 1][idx]
-        eg_v = eg_pst[pt - 1][idx]
-        if color == WHITE:
-            mg_w += mg_v; eg_w += eg_v
-        else:
-            mg_b += mg_v; eg_b += eg_v
-        phase += phase_inc[pt]
+    ph_score[e] = score
+    ph_key[e] = pawn_key
+    return e
 
-        if KNIGHT <= pt <= QUEEN:
-            mob = 0
-            for i in range(piece_offsets[pt], piece_limits[pt]):
-                step = step_dir[i]
-                target = sq + step
-                while not (target & 0x88):
-                    bt = board[target]
-                    if bt == EMPTY:
+
+def evaluate():
+    # Material, piece-square and phase are kept incrementally; mobility is
+    # scanned here and pawn structure comes from the pawn hash.
+    mg = inc_mg
+    eg = inc_eg
+    rooks = []
+
+    for slot in range(32):
+        sq = list_square[slot]
+        if sq == LIST_OFF:
+            continue
+        pt = list_piece[slot]
+        if pt < KNIGHT or pt > QUEEN:
+            continue
+        color = WHITE if slot < 16 else BLACK
+        if pt == ROOK:
+            rooks.append(sq)
+        mob = 0
+        for i in range(piece_offsets[pt], piece_limits[pt]):
+            step = step_dir[i]
+            target = sq + step
+            while not (target & 0x88):
+                bt = board[target]
+                if bt == EMPTY:
+                    mob += 1
+                else:
+                    if (bt >> 3) != color:
                         mob += 1
-                    else:
-                        if (bt >> 3) != color:
-                            mob += 1
-                        break
-                    if pt == KNIGHT:
-                        break
-                    target += step
-            mob -= mob_center[pt]
-            mv = mob_step_mg[pt] * mob
-            ev = mob_step_eg[pt] * mob
-            if color == WHITE:
-                mg_w += mv; eg_w += ev
-            else:
-                mg_b += mv; eg_b += ev
+                    break
+                if pt == KNIGHT:
+                    break
+                target += step
+        mob -= mob_center[pt]
+        if color == WHITE:
+            mg += mob_step_mg[pt] * mob
+            eg += mob_step_eg[pt] * mob
+        else:
+            mg -= mob_step_mg[pt] * mob
+            eg -= mob_step_eg[pt] * mob
 
     if count[WHITE][BISHOP] >= 2:
-        mg_w += 31; eg_w += 30
+        mg += 31; eg += 30
     if count[BLACK][BISHOP] >= 2:
-        mg_b += 31; eg_b += 30
+        mg -= 31; eg -= 30
+
+    e = _pawn_entry()
+    base = e * 16
+    mg += ph_score[e]
+    eg += ph_score[e]
 
     shield_val = (0, 12, 4, -2, -2, 0, 0, -12)
     for color in (WHITE, BLACK):
@@ -913,72 +1212,39 @@ def evaluate():
         kf = ksq & 7
         if kf <= 2 or kf >= 5:
             shield = 0
-            own = lpr_w if color == WHITE else lpr_b
-            opp = lpr_b if color == WHITE else lpr_w
+            own = base if color == WHITE else base + 8
+            opp = base + 8 if color == WHITE else base
             ft = kf - 1
             while ft <= kf + 1:
                 if 0 <= ft <= 7:
-                    shield += shield_val[own[ft]]
-                    if own[ft] == 7 and opp[ft] == 7:
+                    shield += shield_val[ph_lpr[own + ft]]
+                    if ph_lpr[own + ft] == 7 and ph_lpr[opp + ft] == 7:
                         shield -= 18
                 ft += 1
+            mg += shield if color == WHITE else -shield
+
+    for sq in rooks:
+        color = board[sq] >> 3
+        f = sq & 7
+        own = base if color == WHITE else base + 8
+        opp = base + 8 if color == WHITE else base
+        if ph_lpr[own + f] == 7:
+            bonus = 20 if ph_lpr[opp + f] == 7 else 10
             if color == WHITE:
-                mg_w += shield
+                mg += bonus; eg += bonus
             else:
-                mg_b += shield
+                mg -= bonus; eg -= bonus
 
     pp_eg = (0, 20, 30, 55, 80, 115, 170, 0)
     pp_mg = (0,  5, 10, 20, 35,  55,  80, 0)
 
-    for sq in pr_list:
-        p = board[sq]
-        pt = p & 7
-        color = p >> 3
-        f = sq & 7
-        if pt == ROOK:
-            own = lpr_w if color == WHITE else lpr_b
-            opp = lpr_b if color == WHITE else lpr_w
-            if own[f] == 7:
-                bonus = 20 if opp[f] == 7 else 10
-                if color == WHITE:
-                    mg_w += bonus; eg_w += bonus
-                else:
-                    mg_b += bonus; eg_b += bonus
-            continue
-
-        rank = sq >> 4
-        own_rank = rank if color == WHITE else (7 - rank)
-        own = lpr_w if color == WHITE else lpr_b
-        opp = lpr_b if color == WHITE else lpr_w
+    for i in range(16):
+        sq = ph_passed[base + i]
+        if not sq:
+            break
+        color = board[sq] >> 3
         enemy = color ^ 1
-
-        if own_rank != own[f]:
-            if color == WHITE:
-                mg_w -= 20; eg_w -= 20
-            else:
-                mg_b -= 20; eg_b -= 20
-
-        passed = True
-        isolated = True
-        for df in (-1, 0, 1):
-            ef = f + df
-            if ef < 0 or ef > 7:
-                continue
-            if opp[ef] != 7:
-                enemy_front_rank = 7 - opp[ef]
-                if enemy_front_rank >= own_rank:
-                    passed = False
-            if df != 0 and own[ef] != 7:
-                isolated = False
-
-        if isolated:
-            if color == WHITE:
-                mg_w -= 10; eg_w -= 10
-            else:
-                mg_b -= 10; eg_b -= 10
-        if not passed:
-            continue
-
+        own_rank = (sq >> 4) if color == WHITE else (7 - (sq >> 4))
         bonus_mg = pp_mg[own_rank]
         bonus_eg = pp_eg[own_rank]
         bonus_eg += 4 * (_distance(sq, _king_sq(enemy)) - _distance(sq, _king_sq(color)))
@@ -989,19 +1255,17 @@ def evaluate():
             bonus_eg //= 2
 
         if color == WHITE:
-            mg_w += bonus_mg; eg_w += bonus_eg
+            mg += bonus_mg; eg += bonus_eg
         else:
-            mg_b += bonus_mg; eg_b += bonus_eg
+            mg -= bonus_mg; eg -= bonus_eg
 
+    phase = inc_phase
     if phase > 24:
         phase = 24
-    if side == WHITE:
-        mg_score = mg_w - mg_b
-        eg_score = eg_w - eg_b
-    else:
-        mg_score = mg_b - mg_w
-        eg_score = eg_b - eg_w
-    return (mg_score * phase + eg_score * (24 - phase)) // 24
+    if side == BLACK:
+        mg = -mg
+        eg = -eg
+    return (mg * phase + eg * (24 - phase)) // 24
 
 
 # ===============================================================
@@ -1035,6 +1299,12 @@ def _line_step(fr, to):
 def _piece_attacks_sq(fr, to, cleared):
     diff = to - fr
     p = board[fr]
+    if attack_tables:
+        hit = att_mask[diff + 119] & att_piece[p]
+        if not hit:
+            return False
+        if not (hit & ATT_SLIDER) or _line_clear(fr, to):
+            return True
     pt = p & 7
     col = p >> 3
     if pt == PAWN:
@@ -1062,7 +1332,7 @@ def _piece_attacks_sq(fr, to, cleared):
     return False
 
 
-def _see(fr, to):
+def _see_rays(fr, to):
     cap_type = board[to] & 7
     if not cap_type:
         return 0
@@ -1102,6 +1372,58 @@ def _see(fr, to):
     return piece_val[cap_type] - result
 
 
+def _see_tables(fr, to):
+    # Pieces that have joined the exchange are lifted out of the occupancy
+    # bitboards, so x-ray attackers behind them show up on the next pass.
+    cap_type = board[to] & 7
+    if not cap_type:
+        return 0
+    _occ_flip(fr)
+    gone = [fr]
+    target_seq = [cap_type]
+    piece_on_to = board[fr] & 7
+    cur_side = (board[fr] >> 3) ^ 1
+    nsteps = 0
+    while nsteps < 31:
+        lva_sq = -1
+        lva_type = 0
+        lva_val = INF
+        base = 0 if cur_side == WHITE else 16
+        for i in range(base, base + list_count[cur_side]):
+            psq = list_square[i]
+            if psq == LIST_OFF or not (occ_rank[psq >> 4] >> (psq & 7)) & 1:
+                continue
+            pv = piece_val[list_piece[i]]
+            if pv < lva_val:
+                hit = att_mask[to - psq + 119] & att_piece[board[psq]]
+                if hit and (not (hit & ATT_SLIDER) or _line_clear(psq, to)):
+                    lva_val = pv
+                    lva_sq = psq
+                    lva_type = list_piece[i]
+        if lva_sq < 0:
+            break
+        target_seq.append(piece_on_to)
+        _occ_flip(lva_sq)
+        gone.append(lva_sq)
+        piece_on_to = lva_type
+        cur_side ^= 1
+        nsteps += 1
+    for sq in gone:
+        _occ_flip(sq)
+
+    result = 0
+    for d in range(nsteps - 1, -1, -1):
+        gain = piece_val[target_seq[d + 1]] - result
+        result = gain if gain > 0 else 0
+    return piece_val[cap_type] - result
+
+
+def _see(fr, to):
+    if attack_tables:
+        return _see_tables(fr, to)
+    return _see_rays(fr, to)
+
+
 def _is_bad_capture(fr, to):
     if piece_val[board[fr] & 7] <= piece_val[board[to] & 7]:
         return False
@@ -1212,9 +1534,68 @@ def _qsearch(alpha, beta, sply):
     return best_sc
 
 
+def _tt_probe():
+    """Offset in tt of the entry holding the current position, or -1."""
+    global tt_probes, tt_hits, tt_collisions
+    tt_probes += 1
+    khi = hash_key >> 48
+    klo = (hash_key >> 32) & 0xFFFF
+    if not (khi | klo):
+        return -1
+    e = (hash_key % tt_buckets) * TT_BUCKET
+    if tt[e] == khi and tt[e + 1] == klo:
+        tt_hits += 1
+        return e
+    e1 = e + TT_ENTRY
+    if tt[e1] == khi and tt[e1 + 1] == klo:
+        tt_hits += 1
+        return e1
+    if tt[e + 4] or tt[e1 + 4] or tt[e + 2] or tt[e1 + 2]:
+        tt_collisions += 1
+    return -1
+
+
+def _tt_move(e):
+    v = tt[e + 2]
+    fr = v & 63
+    to = (v >> 6) & 63
+    return (fr + (fr & 0x38)) | ((to + (to & 0x38)) << 7) | ((v >> 12) << 14)
+
+
+def _tt_score(e):
+    v = tt[e + 3]
+    return v - 0x10000 if v & 0x8000 else v
+
+
+def _tt_store(depth, flag, score, move):
+    khi = hash_key >> 48
+    klo = (hash_key >> 32) & 0xFFFF
+    e = (hash_key % tt_buckets) * TT_BUCKET
+    info = tt[e + 4]
+    if tt[e] == khi and tt[e + 1] == klo:
+        if depth < (info & 0x7F):
+            return
+    elif depth < (info & 0x7F) and (info >> 9) == tt_age:
+        # The depth-preferred entry is deeper and from this search
+        e += TT_ENTRY
+    fr = move & 0x7F
+    to = (move >> 7) & 0x7F
+    tt[e]     = khi
+    tt[e + 1] = klo
+    tt[e + 2] = ((fr + (fr & 7)) >> 1) | (((to + (to & 7)) >> 1) << 6) | (((move >> 14) & 0xF) << 12)
+    tt[e + 3] = score & 0xFFFF
+    tt[e + 4] = depth | (flag << 7) | (tt_age << 9)
+
+
+def tt_stats():
+    """(probes, hits, collisions, cutoffs) of the current or last search.
+    Collisions count probes that found their bucket holding other positions."""
+    return (tt_probes, tt_hits, tt_collisions, tt_cutoffs)
+
+
 def _search(depth, alpha, beta, sply, was_null):
     global nodes_searched, time_over_flag, ep_square, side, xside, hash_key, ply
-    global best_root_move
+    global best_root_move, tt_cutoffs, slice_over
 
     if depth <= 0:
         return _qsearch(alpha, beta, sply)
@@ -1224,13 +1605,15 @@ def _search(depth, alpha, beta, sply, was_null):
         if _time_check(): return 0
     if time_over_flag or chal_stop_flag:
         return 0
+    if slice_mode and (nodes_searched >= slice_node_end
+                       or time.ticks_diff(time.ticks_ms(), slice_t0_ms) >= slice_ms):
+        # Unwind like a timeout, _search_run() searches the iteration again
+        slice_over = 1
+        time_over_flag = 1
+        return 0
 
     is_pv = (beta - alpha > 1)
-    tt_idx = hash_key % tt_size
-    e_key = tt_key[tt_idx]
-    e_score = tt_score[tt_idx]
-    e_best = tt_best[tt_idx]
-    e_df = tt_df[tt_idx]
+    tt_idx = _tt_probe()
     hash_move = 0
 
     # Repetition / 50-move / insufficient material
@@ -1259,18 +1642,19 @@ def _search(depth, alpha, beta, sply, was_null):
             and not count[WHITE][QUEEN] and not count[BLACK][QUEEN]):
             return 0
 
-    if e_key == hash_key and e_key != 0:
-        hash_move = e_best
-        e_depth = e_df >> 2
-        if e_depth >= depth:
-            flag = e_df & 3
-            tt_sc = e_score
+    if tt_idx >= 0:
+        hash_move = _tt_move(tt_idx)
+        e_info = tt[tt_idx + 4]
+        if (e_info & 0x7F) >= depth:
+            flag = (e_info >> 7) & 3
+            tt_sc = _tt_score(tt_idx)
             if tt_sc > MATE - MAX_PLY: tt_sc -= sply
             if tt_sc < -(MATE - MAX_PLY): tt_sc += sply
-            if sply > 0:
-                if flag == TT_EXACT: return tt_sc
-                if not is_pv and flag == TT_BETA  and tt_sc >= beta:  return tt_sc
-                if not is_pv and flag == TT_ALPHA and tt_sc <= alpha: return tt_sc
+            if sply > 0 and (flag == TT_EXACT
+                             or (not is_pv and flag == TT_BETA and tt_sc >= beta)
+                             or (not is_pv and flag == TT_ALPHA and tt_sc <= alpha)):
+                tt_cutoffs += 1
+                return tt_sc
 
     best_sc = -INF
     nodes_searched += 1
@@ -1411,7 +1795,7 @@ def _search(depth, alpha, beta, sply, was_null):
     if not legal:
         return -(MATE - sply) if node_in_check else 0
 
-    if not time_over_flag and (tt_key[tt_idx] != hash_key or depth >= (tt_df[tt_idx] >> 2)):
+    if not time_over_flag:
         if best_sc <= old_alpha:
             flag = TT_ALPHA
         elif best_sc >= beta:
@@ -1421,24 +1805,26 @@ def _search(depth, alpha, beta, sply, was_null):
         sc_store = best_sc
         if sc_store > MATE - MAX_PLY: sc_store += sply
         if sc_store < -(MATE - MAX_PLY): sc_store -= sply
-        store_move = best if best else hash_move
-        tt_key[tt_idx]   = hash_key
-        tt_score[tt_idx] = sc_store
-        tt_best[tt_idx]  = store_move
-        tt_df[tt_idx]    = ((depth if depth > 0 else 0) << 2) | flag
+        _tt_store(depth if depth > 0 else 0, flag, sc_store, best if best else hash_move)
 
     return best_sc
 
 
-def _search_root(max_depth):
+def _search_begin(max_depth):
     global nodes_searched, root_depth, best_root_move, t_start_ms
-    global time_over_flag, chal_stop_flag, root_ply
-    global last_search_score, last_search_depth
-
-    sc = 0
-    prev_sc = 0
+    global time_over_flag, chal_stop_flag, slice_over, slice_scale, root_ply
+    global last_search_depth, root_max_depth, root_prev_sc
+    global tt_age, tt_probes, tt_hits, tt_collisions, tt_cutoffs
+
+    tt_age = (tt_age + 1) & 0x7F
+    tt_probes = 0
+    tt_hits = 0
+    tt_collisions = 0
+    tt_cutoffs = 0
     time_over_flag = 0
     chal_stop_flag = 0
+    slice_over = 0
+    slice_scale = 0
     best_root_move = 0
     t_start_ms = time.ticks_ms()
     for i in range(64 * 64):
@@ -1448,39 +1834,147 @@ def _search_root(max_depth):
     for i in range(MAX_PLY):
         pv_length[i] = 0
     nodes_searched = 0
+    last_search_depth = 0
     root_ply = ply
+    root_max_depth = max_depth
+    root_prev_sc = 0
+    root_depth = 1
+    _root_window()
 
-    rd = 1
-    while rd <= max_depth:
-        root_depth = rd
-        if rd < 5:
-            sc = _search(rd, -INF, INF, 0, 0)
-        else:
-            delta = 15 + prev_sc * prev_sc // 16384
-            alpha = max(prev_sc - delta, -INF)
-            beta  = min(prev_sc + delta,  INF)
-            while True:
-                sc = _search(rd, alpha, beta, 0, 0)
-                if time_over_flag or chal_stop_flag:
-                    break
-                if sc <= alpha:
-                    beta = (alpha + beta) // 2
-                    alpha = max(alpha - delta, -INF)
-                elif sc >= beta:
-                    beta = min(beta + delta, INF)
-                else:
-                    break
-                delta += delta // 2
+
+def _root_window():
+    global root_alpha, root_beta, root_delta
+    if root_depth < 5:
+        root_alpha = -INF
+        root_beta = INF
+    else:
+        root_delta = 15 + root_prev_sc * root_prev_sc // 16384
+        root_alpha = max(root_prev_sc - root_delta, -INF)
+        root_beta  = min(root_prev_sc + root_delta,  INF)
+
+
+def _search_run():
+    """Iterative deepening from root_depth on. Returns False if the slice
+    ran out (call again to go on), True once the search is over."""
+    global root_depth, root_alpha, root_beta, root_delta, root_prev_sc
+    global time_over_flag, slice_over, slice_scale, last_search_score, last_search_depth
+
+    while root_depth <= root_max_depth:
+        sc = _search(root_depth, root_alpha, root_beta, 0, 0)
+        if slice_over:
+            # The board is back at the root; the iteration is searched again
+            # next slice and finds the subtrees it finished in the TT. Walking
+            # back to where it stopped costs nodes too, so the next slice gets
+            # twice the budget until the iteration completes
+            slice_over = 0
+            time_over_flag = 0
+            if slice_scale < SLICE_SCALE_MAX:
+                slice_scale += 1
+            return _time_check()
         if time_over_flag or chal_stop_flag:
-            break
-        prev_sc = sc
+            return True
+        if root_depth >= 5 and (sc <= root_alpha or sc >= root_beta):
+            if sc <= root_alpha:
+                root_beta = (root_alpha + root_beta) // 2
+                root_alpha = max(root_alpha - root_delta, -INF)
+            else:
+                root_beta = min(root_beta + root_delta, INF)
+            root_delta += root_delta // 2
+            continue
+        slice_scale = 0
+        root_prev_sc = sc
         last_search_score = sc
-        last_search_depth = rd
+        last_search_depth = root_depth
         if time_budget_ms > 0:
             ms = time.ticks_diff(time.ticks_ms(), t_start_ms)
             if ms >= time_budget_ms // 2:
-                break
-        rd += 1
+                return True
+        root_depth += 1
+        _root_window()
+    return True
+
+
+# ===============================================================
+# S12  Opening book
+# ===============================================================
+# Written offline by chalbook.py. Layout (little endian):
+#   header  "CHB1", u32 entry count
+#   entries u32 key (hash_key >> 32), u32 move (internal encoding),
+#           sorted by key
+# The file stays on flash: a probe is a binary search of ~log2(n) seeks
+# and 8-byte reads into book_buf.
+
+BOOK_MAGIC  = b"CHB1"
+BOOK_HEADER = 8
+BOOK_ENTRY  = 8
+
+
+def book_open(path="book.bin"):
+    """Use the opening book at path. Returns False if it can't be read."""
+    global book_file, book_count
+    book_close()
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return False
+    if f.readinto(book_buf) != BOOK_HEADER or book_buf[0:4] != BOOK_MAGIC:
+        f.close()
+        return False
+    book_file = f
+    book_count = book_buf[4] | (book_buf[5] << 8) | (book_buf[6] << 16) | (book_buf[7] << 24)
+    return True
+
+
+def book_close():
+    global book_file, book_count
+    if book_file is not None:
+        book_file.close()
+    book_file = None
+    book_count = 0
+
+
+def _book_probe():
+    """Book move stored for hash_key (unchecked), or 0."""
+    key = hash_key >> 32
+    lo = 0
+    hi = book_count - 1
+    buf = book_buf
+    while lo <= hi:
+        mid = (lo + hi) >> 1
+        book_file.seek(BOOK_HEADER + mid * BOOK_ENTRY)
+        book_file.readinto(buf)
+        k = buf[0] | (buf[1] << 8) | (buf[2] << 16) | (buf[3] << 24)
+        if k == key:
+            return buf[4] | (buf[5] << 8) | (buf[6] << 16) | (buf[7] << 24)
+        if k < key:
+            lo = mid + 1
+        else:
+            hi = mid - 1
+    return 0
+
+
+def _book_move():
+    """Legal book move for the current position, or 0."""
+    global best_root_move, nodes_searched, last_search_depth, last_search_score
+    if book_file is None:
+        return 0
+    m = _book_probe()
+    if not m:
+        return 0
+    # 32 key bits can collide with a position outside the book
+    for bm in generate_moves(False):
+        if bm == m:
+            _make_move(m)
+            illegal = _is_illegal()
+            _undo_move()
+            if illegal:
+                return 0
+            best_root_move = m
+            nodes_searched = 0
+            last_search_depth = 0
+            last_search_score = 0
+            return m
+    return 0
 
 
 # ===============================================================
@@ -1498,17 +1992,30 @@ def _make_lmr():
     return t
 
 
-def init(tt_entries=4096):
-    """Initialize engine. Allocate TT (default 4096 entries ~ small)."""
-    global tt_size, tt_key, tt_score, tt_best, tt_df, lmr_table
+def init(tt_entries=4096, pawn_entries=64, use_attack_tables=True):
+    """Initialize engine. Allocate TT (default 4096 entries, 10 bytes each) and pawn hash.
+
+    use_attack_tables selects the table/bitboard attack tests over the
+    original ray walks (same results, fewer board reads).
+    """
+    global tt_size, tt_buckets, tt, tt_age, lmr_table, attack_tables
+    global ph_size, ph_key, ph_score, ph_lpr, ph_passed
     global last_search_score, last_search_depth
-    tt_size = tt_entries
-    tt_key   = array('Q', [0] * tt_entries)
-    tt_score = array('i', [0] * tt_entries)
-    tt_best  = array('i', [0] * tt_entries)
-    tt_df    = array('i', [0] * tt_entries)
+    tt_buckets = max(tt_entries // 2, 1)
+    tt_size = tt_buckets * 2
+    tt = array('H', [0] * (tt_buckets * TT_BUCKET))
+    tt_age = 0
+    # Key 0 with all files empty is the correct entry for a pawnless board
+    ph_size   = pawn_entries
+    ph_key    = array('Q', [0] * pawn_entries)
+    ph_score  = array('h', [0] * pawn_entries)
+    ph_lpr    = bytearray(b'\x07' * (16 * pawn_entries))
+    ph_passed = bytearray(16 * pawn_entries)
     lmr_table = _make_lmr()
     _init_zobrist()
+    _init_eval_tables()
+    _init_attack_tables()
+    attack_tables = use_attack_tables
     _parse_fen(STARTPOS)
     global hash_key
     hash_key = _generate_hash()
@@ -1518,12 +2025,10 @@ def init(tt_entries=4096):
 
 def new_game():
     global hash_key, last_search_score, last_search_depth
-    if tt_key is not None:
-        for i in range(tt_size):
-            tt_key[i] = 0
-            tt_score[i] = 0
-            tt_best[i] = 0
-            tt_df[i] = 0
+    search_abort()
+    if tt is not None:
+        for i in range(len(tt)):
+            tt[i] = 0
     for i in range(64 * 64):
         hist[i] = 0
     _parse_fen(STARTPOS)
@@ -1534,6 +2039,7 @@ def new_game():
 
 def set_fen(fen):
     global hash_key
+    search_abort()
     _parse_fen(fen)
     hash_key = _generate_hash()
 
@@ -1562,6 +2068,7 @@ def get_legal_moves():
 
 
 def play_move(from_sq, to_sq, promo):
+    search_abort()
     moves = generate_moves(False)
     for m in moves:
         if (m & 0x7F) == from_sq and ((m >> 7) & 0x7F) == to_sq and ((m >> 14) & 0xF) == promo:
@@ -1579,7 +2086,10 @@ def search_best_move(max_depth, time_ms):
     if max_depth < 1: max_depth = 1
     if max_depth > MAX_PLY: max_depth = MAX_PLY
     time_budget_ms = time_ms if time_ms > 0 else 0
-    _search_root(max_depth)
+    search_abort()
+    if not _book_move():
+        _search_begin(max_depth)
+        _search_run()
     if best_root_move:
         m = best_root_move
         return (m & 0x7F, (m >> 7) & 0x7F, (m >> 14) & 0xF)
@@ -1591,7 +2101,74 @@ def stop_search():
     chal_stop_flag = 1
 
 
+# ---- Resumable search ----
+
+def search_start(max_depth, time_ms):
+    """Begin a resumable search of the current position, run it with search_step()."""
+    global search_running, time_budget_ms
+    search_abort()
+    if max_depth < 1: max_depth = 1
+    if max_depth > MAX_PLY: max_depth = MAX_PLY
+    time_budget_ms = time_ms if time_ms > 0 else 0
+    if _book_move():
+        return
+    _search_begin(max_depth)
+    search_running = 1
+
+
+def ponder_start():
+    """Open-ended search of the current position while the player thinks.
+    Its only product is the TT, which the next search_start() reuses."""
+    search_start(MAX_PLY, 0)
+
+
+def search_step(ms, nodes=0):
+    """Advance the search by up to ms milliseconds and/or nodes nodes
+    (0 = no limit). Returns True once the search has finished."""
+    global search_running, slice_mode, slice_t0_ms, slice_ms, slice_node_end, t_start_ms
+    if not search_running:
+        return True
+    now = time.ticks_ms()
+    if slice_t0_ms:
+        # Don't charge the time spent outside the search to its budget
+        t_start_ms = time.ticks_add(t_start_ms, time.ticks_diff(now, slice_t0_ms))
+    slice_t0_ms = now
+    slice_ms = ms << slice_scale if ms > 0 else 0x3FFFFFFF
+    slice_node_end = nodes_searched + (nodes << slice_scale) if nodes > 0 else 0x3FFFFFFF
+    slice_mode = 1
+    if _search_run():
+        search_running = 0
+    slice_mode = 0
+    slice_t0_ms = time.ticks_ms() if search_running else 0
+    return not search_running
+
+
+def search_active():
+    return search_running != 0
+
+
+def search_result():
+    """Best move found so far as (from, to, promo), from = 0x80 if none yet."""
+    if best_root_move:
+        m = best_root_move
+        return (m & 0x7F, (m >> 7) & 0x7F, (m >> 14) & 0xF)
+    return (0x80, 0, 0)
+
+
+def search_info():
+    """(completed depth, score, nodes) of the current or last search."""
+    return (last_search_depth, last_search_score, nodes_searched)
+
+
+def search_abort():
+    """Drop an unfinished search. The TT is kept."""
+    global search_running, slice_t0_ms
+    search_running = 0
+    slice_t0_ms = 0
+
+
 def undo_move():
+    search_abort()
     if ply <= 0:
         return False
     _undo_move()
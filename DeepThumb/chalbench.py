@@ -0,0 +1,205 @@
+"""
+chalbench.py - Desktop perft / speed benchmark for chal.py (run with CPython).
+
+    python3 chalbench.py [--perft N] [--depth N] [--tt N] [--profile]
+                         [--baseline FILE] [--save FILE]
+
+Perft walks set_fen / generate_moves / _make_move / _undo_move on a set of
+standard positions and checks the published node counts. The search suite
+runs fixed-depth search_best_move() calls twice each and prints nodes,
+nodes/sec and the best move; any difference between the two runs, or
+against a baseline saved earlier with --save, is reported as DRIFT, since
+the search is deterministic and a change in node counts means a change in
+behaviour. Each search also shows the transposition table hit, collision
+and cutoff rates for the --tt size in entries (DeepThumb's main.py uses
+512). --profile adds a breakdown of search time spent in move
+generation, evaluation, SEE and the transposition table.
+"""
+
+import argparse
+import json
+import sys
+import time
+
+# chal.py only needs the MicroPython tick functions from the time module
+if not hasattr(time, "ticks_ms"):
+    time.ticks_ms = lambda: int(time.perf_counter() * 1000)
+    time.ticks_diff = lambda a, b: a - b
+    time.ticks_add = lambda a, b: a + b
+
+import chal
+
+# (name, fen, expected perft counts from depth 1)
+PERFT_SUITE = (
+    ("startpos", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     (20, 400, 8902, 197281)),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     (48, 2039, 97862)),
+    ("endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     (14, 191, 2812, 43238)),
+    ("promos", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     (6, 264, 9467)),
+    ("tricky", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     (44, 1486, 62379)),
+)
+
+SEARCH_SUITE = (
+    ("startpos", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"),
+    ("italian", "r1bqk1nr/pppp1ppp/2n5/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4"),
+    ("middlegame", "r2q1rk1/pp2bppp/2n1pn2/3p4/3P4/2NBPN2/PP3PPP/R2Q1RK1 w - - 0 10"),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"),
+    ("endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1"),
+)
+
+# Functions timed by --profile, grouped by what they account for
+PROFILE_GROUPS = (
+    ("movegen", ("generate_moves",)),
+    ("eval", ("evaluate",)),
+    ("see", ("_see",)),
+    ("tt", ("_tt_probe", "_tt_store")),
+)
+
+
+def move_name(fr, to, pr):
+    if fr == 0x80:
+        return "-"
+    name = "abcdefgh"[fr & 7] + str((fr >> 4) + 1) + "abcdefgh"[to & 7] + str((to >> 4) + 1)
+    if pr:
+        name += " pnbrqk"[pr]
+    return name
+
+
+def perft(depth):
+    if depth == 0:
+        return 1
+    nodes = 0
+    for m in chal.generate_moves(False):
+        chal._make_move(m)
+        if not chal._is_illegal():
+            nodes += perft(depth - 1)
+        chal._undo_move()
+    return nodes
+
+
+def run_perft(max_depth):
+    ok = True
+    for name, fen, expected in PERFT_SUITE:
+        chal.set_fen(fen)
+        for depth, want in enumerate(expected[:max_depth], 1):
+            start = time.perf_counter()
+            nodes = perft(depth)
+            elapsed = max(time.perf_counter() - start, 1e-6)
+            status = "ok" if nodes == want else "MISMATCH (want %d)" % want
+            ok = ok and nodes == want
+            print("perft  %-10s d%d %9d nodes %8.0f nps  %s" % (name, depth, nodes, nodes / elapsed, status))
+    return ok
+
+
+def search_once(fen, depth):
+    chal.new_game()
+    chal.set_fen(fen)
+    start = time.perf_counter()
+    best = chal.search_best_move(depth, 0)
+    elapsed = max(time.perf_counter() - start, 1e-6)
+    reached, score, nodes = chal.search_info()
+    return {"nodes": nodes, "score": score, "best": move_name(*best)}, elapsed
+
+
+def tt_rates():
+    probes, hits, collisions, cutoffs = chal.tt_stats()
+    probes = max(probes, 1)
+    return "tt hit %4.1f%% coll %4.1f%% cut %4.1f%%" % (
+        100.0 * hits / probes, 100.0 * collisions / probes, 100.0 * cutoffs / probes)
+
+
+def run_search(depth, baseline):
+    results = {}
+    drift = False
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen in SEARCH_SUITE:
+        first, elapsed = search_once(fen, depth)
+        rates = tt_rates()
+        second, _ = search_once(fen, depth)
+        total_nodes += first["nodes"]
+        total_time += elapsed
+        notes = []
+        if second != first:
+            notes.append("DRIFT between runs (%d nodes, %s)" % (second["nodes"], second["best"]))
+        key = "%s/d%d/tt%d" % (name, depth, chal.tt_size)
+        if key in baseline and baseline[key] != first:
+            notes.append("DRIFT vs baseline (%d nodes, %s)" % (baseline[key]["nodes"], baseline[key]["best"]))
+        drift = drift or bool(notes)
+        results[key] = first
+        print(("search %-10s d%d %8d nodes %8.0f nps %7.3fs  score %6d  best %-5s %s  %s"
+               % (name, depth, first["nodes"], first["nodes"] / elapsed, elapsed,
+                  first["score"], first["best"], rates, "  ".join(notes))).rstrip())
+    print("search total %d nodes %.3fs %.0f nps" % (total_nodes, total_time, total_nodes / max(total_time, 1e-6)))
+    return results, drift
+
+
+def _timed(fn, slot, stats):
+    def wrapper(*args):
+        t = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            stats[slot][0] += 1
+            stats[slot][1] += time.perf_counter() - t
+    return wrapper
+
+
+def run_profile(depth):
+    stats = {}
+    originals = {}
+    for group, names in PROFILE_GROUPS:
+        stats[group] = [0, 0.0]
+        for fn_name in names:
+            originals[fn_name] = getattr(chal, fn_name)
+            setattr(chal, fn_name, _timed(originals[fn_name], group, stats))
+    total = 0.0
+    try:
+        for name, fen in SEARCH_SUITE:
+            total += search_once(fen, depth)[1]
+    finally:
+        for fn_name, fn in originals.items():
+            setattr(chal, fn_name, fn)
+
+    # Wrapper overhead inflates the timed share a little; compare runs, not absolutes
+    print("profile d%d, %.3fs total search time" % (depth, total))
+    accounted = 0.0
+    for group, names in PROFILE_GROUPS:
+        calls, spent = stats[group]
+        accounted += spent
+        per_call = spent / calls * 1e6 if calls else 0.0
+        print("  %-8s %9d calls %8.3fs %5.1f%%  %7.1f us/call"
+              % (group, calls, spent, 100.0 * spent / total, per_call))
+    rest = total - accounted
+    print("  %-8s %9s       %8.3fs %5.1f%%" % ("other", "", rest, 100.0 * rest / total))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="perft and search benchmark for chal.py")
+    parser.add_argument("--perft", type=int, default=3, help="max perft depth (0 skips perft)")
+    parser.add_argument("--depth", type=int, default=5, help="fixed search depth")
+    parser.add_argument("--tt", type=int, default=4096, help="transposition table entries")
+    parser.add_argument("--profile", action="store_true", help="time movegen/eval/SEE/TT during search")
+    parser.add_argument("--baseline", help="compare search results against this JSON file")
+    parser.add_argument("--save", help="write search results to this JSON file")
+    args = parser.parse_args()
+
+    chal.init(args.tt)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    passed = run_perft(args.perft)
+    results, drift = run_search(args.depth, baseline)
+    if args.profile:
+        run_profile(args.depth)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if not passed or drift:
+        sys.exit(1)
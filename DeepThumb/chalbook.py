@@ -0,0 +1,123 @@
+"""
+chalbook.py - Offline opening book generator for chal.py (run with CPython).
+
+    python3 chalbook.py [--plies N] [--width N] [--depth N] [--out book.bin]
+
+Walks the opening tree from the start position. Every position gets the
+move chal finds with a deep fixed-depth search; the tree is expanded along
+the `width` most promising moves of each position (ranked by a shallow
+search), so the book covers both the engine's own lines and the most
+likely replies, whichever side the engine plays. Transpositions are stored
+once.
+
+The result is the file read by chal.book_open(): a sorted table of
+(hash_key >> 32, move) pairs that the engine binary-searches on flash.
+See "S12 Opening book" in chal.py for the layout.
+"""
+
+import argparse
+import struct
+import time
+
+# chal.py only needs the MicroPython tick functions from the time module
+if not hasattr(time, "ticks_ms"):
+    time.ticks_ms = lambda: int(time.perf_counter() * 1000)
+    time.ticks_diff = lambda a, b: a - b
+    time.ticks_add = lambda a, b: a + b
+
+import chal
+
+RANK_DEPTH = 2
+
+
+def _encode(fr, to, pr):
+    return fr | (to << 7) | (pr << 14)
+
+
+def _rank_moves():
+    """Legal moves of the current position, best first by a shallow search."""
+    ranked = []
+    for fr, to, pr in chal.get_legal_moves():
+        chal.play_move(fr, to, pr)
+        if chal.is_checkmate():
+            score = chal.MATE
+        elif chal.is_stalemate():
+            score = 0
+        else:
+            chal.search_best_move(RANK_DEPTH, 0)
+            score = -chal.get_last_score()
+        chal.undo_move()
+        ranked.append((score, _encode(fr, to, pr)))
+    ranked.sort(key=lambda e: -e[0])
+    return [m for _, m in ranked]
+
+
+def generate(plies, width, depth):
+    book = {}         # key -> move
+    clashes = set()   # keys shared by two different positions
+    seen = set()
+
+    def visit(ply):
+        full_key = chal.hash_key
+        if full_key in seen:
+            return
+        seen.add(full_key)
+        key = full_key >> 32
+        best = chal.search_best_move(depth, 0)
+        if best[0] == 0x80:
+            return
+        move = _encode(*best)
+        if key in book or key in clashes:
+            clashes.add(key)
+            book.pop(key, None)
+        else:
+            book[key] = move
+        print("ply %d  %s  %s  score %d" % (ply, chal.get_fen(), _move_name(move), chal.get_last_score()))
+        if ply + 1 >= plies:
+            return
+
+        children = [move]
+        for m in _rank_moves():
+            if len(children) >= width:
+                break
+            if m != move:
+                children.append(m)
+        for m in children:
+            chal.play_move(m & 0x7F, (m >> 7) & 0x7F, (m >> 14) & 0xF)
+            visit(ply + 1)
+            chal.undo_move()
+
+    chal.new_game()
+    visit(0)
+    if clashes:
+        print("dropped %d positions with clashing 32-bit keys" % len(clashes))
+    return book
+
+
+def _move_name(m):
+    fr = m & 0x7F
+    to = (m >> 7) & 0x7F
+    return "abcdefgh"[fr & 7] + str((fr >> 4) + 1) + "abcdefgh"[to & 7] + str((to >> 4) + 1)
+
+
+def write(book, path):
+    with open(path, "wb") as f:
+        f.write(chal.BOOK_MAGIC + struct.pack("<I", len(book)))
+        for key in sorted(book):
+            f.write(struct.pack("<II", key, book[key]))
+    print("%s: %d positions, %d bytes" % (path, len(book), chal.BOOK_HEADER + len(book) * chal.BOOK_ENTRY))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="build the chal opening book")
+    parser.add_argument("--plies", type=int, default=6, help="book depth in plies")
+    parser.add_argument("--width", type=int, default=3, help="moves followed per position")
+    parser.add_argument("--depth", type=int, default=9, help="search depth for book moves")
+    parser.add_argument("--out", default="book.bin")
+    args = parser.parse_args()
+
+    chal.init(1 << 16)
+    start = time.perf_counter()
+    book = generate(args.plies, args.width, args.depth)
+    write(book, args.out)
+    print("%.0fs" % (time.perf_counter() - start))
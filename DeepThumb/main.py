@@ -66,6 +66,11 @@ chal_elo   = ("~800", "~1200", "~1600", "~1900", "~2200")
 diff_names = ("BEGINNER", "EASY", "MEDIUM", "HARD", "EXPERT")
 NUM_DIFF   = 5
 
+# Search time per frame (ms): the engine runs in slices so the UI keeps
+# drawing, and ponders on the player's time to warm up its TT.
+AI_SLICE_MS     = 20
+PONDER_SLICE_MS = 8
+
 # Game states
 ST_TITLE       = 0
 ST_SETUP       = 1
@@ -110,9 +115,11 @@ _board_data  = board_tex.data
 _sprite_w = sprite_tex.width
 _board_w  = board_tex.width
 
-# Initialise the chess engine
+# Initialise the chess engine (512 TT entries at 10 bytes each); opening
+# moves come from the flash book
 gc.collect()
-chal.init(256)
+chal.init(512)
+chal.book_open("book.bin")
 
 
 # ===============================================================
@@ -501,6 +508,7 @@ def do_undo():
     game.selected = 0
     game.legal_targets = []
     game.has_last_move = 0
+    game.think_frame = 0    # restart pondering from the new position
     update_eval()
 
 
@@ -824,21 +832,34 @@ def tick_player_turn():
     if engine_io.LB.is_just_pressed:
         do_undo()
 
+    # Ponder with the leftover frame time; play_move/undo_move abandon it
+    if game.state == ST_PLAYER_TURN:
+        if game.think_frame == 0:
+            game.think_frame = 1
+            chal.ponder_start()
+        chal.search_step(PONDER_SLICE_MS)
+
 
 def tick_ai_thinking():
     draw_board()
     _fill_rect(0, SCREEN_H - 10, SCREEN_W, 10, COLOR_BG)
-    draw_text(30, SCREEN_H - 9, "THINKING...", COLOR_TEXT_WHITE)
+    draw_text(30, SCREEN_H - 9, "THINKING" + "..."[:(game.think_frame >> 3) & 3], COLOR_TEXT_WHITE)
+    depth_done = chal.search_info()[0]
+    if game.think_frame >= 2 and depth_done:
+        draw_text(104, SCREEN_H - 9, "D" + str(depth_done), COLOR_TEXT_DIM)
 
-    # Frame 0: render once so player sees the position; frame 1: search.
+    # Frame 0: render once so player sees the position; then search a
+    # slice per frame until the engine is done.
     game.think_frame += 1
     if game.think_frame < 2:
         return
+    if game.think_frame == 2:
+        gc.collect()
+        chal.search_start(chal_depth[game.difficulty], chal_time[game.difficulty])
+    if not chal.search_step(AI_SLICE_MS):
+        return
 
-    depth   = chal_depth[game.difficulty]
-    time_ms = chal_time[game.difficulty]
-    gc.collect()
-    fr, to, pr = chal.search_best_move(depth, time_ms)
+    fr, to, pr = chal.search_result()
 
     if fr == 0x80:
         game.result = 2
@@ -0,0 +1,367 @@
+"""
+selfplay.py - Engine-vs-engine tournament for tuning the chess AIs (run with CPython).
+
+    python3 selfplay.py [--games N] [--jobs N] [--plies N] [--seed N] ENGINE ENGINE [ENGINE ...]
+
+ENGINE is  kind[:key=value,...]  where kind is
+    chal      DeepThumb's chal.py            depth, time (ms), tt (entries)
+    mailbox   Chess's Searcher (../Chess)    depth, time (ms), P/N/B/R/Q piece values
+and name=... sets the label used in the report, e.g.
+
+    python3 selfplay.py --games 200 chal:depth=4,time=1500 chal:depth=6,time=3000 mailbox:time=3000
+
+Every pair of engines plays --games games from random --plies long
+openings, each opening once with either colour, spread over a process
+pool. Every engine gets its own copy of its module, so two chal configs
+never share a TT. A referee chal instance applies the moves, which the
+engines exchange as UCI strings, and scores mate, stalemate, threefold
+repetition, the 50 move rule, bare minor pieces and a 400 ply cap.
+
+The report gives each pairing's score with an Elo difference and 95%
+interval, every engine's Elo against the whole field, and its time per
+move (CPython wall clock, so only compare engines within one run).
+"""
+
+import argparse
+import importlib.util
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+# chal.py and chessmailbox.py only need the MicroPython tick functions
+if not hasattr(time, "ticks_ms"):
+    time.ticks_ms = lambda: int(time.perf_counter() * 1000)
+    time.ticks_diff = lambda a, b: a - b
+    time.ticks_add = lambda a, b: a + b
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CHESS_DIR = os.path.join(os.path.dirname(HERE), "Chess")
+STARTPOS = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+MAX_PLIES = 400
+PROMO_CHARS = "  nbrq"
+
+
+def _load(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def parse_spec(spec):
+    kind, _, rest = spec.partition(":")
+    opts = {}
+    for item in rest.split(","):
+        if item:
+            key, _, value = item.partition("=")
+            opts[key] = value
+    if kind not in ENGINES:
+        raise ValueError("unknown engine kind: " + kind)
+    return kind, opts
+
+
+def spec_name(spec):
+    return parse_spec(spec)[1].get("name", spec)
+
+
+# ===============================================================
+# Engines: new_game(), best_move(fen) -> uci string or None
+# ===============================================================
+
+class ChalEngine:
+    def __init__(self, opts, tag):
+        self.mod = _load("chal_" + tag, os.path.join(HERE, "chal.py"))
+        self.mod.init(int(opts.get("tt", 512)))
+        self.depth = int(opts.get("depth", 64))
+        self.time_ms = int(opts.get("time", 1000))
+
+    def new_game(self):
+        self.mod.new_game()
+
+    def best_move(self, fen):
+        self.mod.set_fen(fen)
+        fr, to, pr = self.mod.search_best_move(self.depth, self.time_ms)
+        if fr == 0x80:
+            return None
+        return _uci_0x88(fr, to, pr)
+
+
+class MailboxEngine:
+    def __init__(self, opts, tag):
+        if CHESS_DIR not in sys.path:
+            sys.path.insert(0, CHESS_DIR)
+        mod = _load("chessmailbox_" + tag, os.path.join(CHESS_DIR, "chessmailbox.py"))
+        values = dict(mod.piece_values)
+        for ch in "PNBRQ":
+            if ch in opts:
+                values[ch] = int(opts[ch])
+        if values != mod.piece_values:
+            # Rebuild this copy's score tables; same seed, so same Zobrist keys
+            mod.piece_values = values
+            mod._rand_state = 0x2545F491
+            mod._init_tables()
+        self.mod = mod
+        self.searcher = mod.Searcher()
+        self.depth = int(opts.get("depth", 32))
+        self.time_ms = int(opts.get("time", 1000))
+
+    def new_game(self):
+        self.searcher.clear()
+
+    def best_move(self, fen):
+        mod = self.mod
+        board = mod.MailboxBoard.from_fen(fen)
+        score, move = self.searcher.think(board, self.time_ms, self.depth)
+        if move is None:
+            return None
+        fr = mod.move_from(move)
+        to = mod.move_to(move)
+        fc, fr_row = mod.grid_of(fr)
+        tc, to_row = mod.grid_of(to)
+        uci = "abcdefgh"[fc] + str(8 - fr_row) + "abcdefgh"[tc] + str(8 - to_row)
+        # The game only ever promotes to a queen
+        if board.sq[fr] & 7 == mod.PAWN and to_row in (0, 7):
+            uci += "q"
+        return uci
+
+
+ENGINES = {"chal": ChalEngine, "mailbox": MailboxEngine}
+
+
+def _uci_0x88(fr, to, pr):
+    uci = "abcdefgh"[fr & 7] + str((fr >> 4) + 1) + "abcdefgh"[to & 7] + str((to >> 4) + 1)
+    if pr:
+        uci += PROMO_CHARS[pr]
+    return uci
+
+
+# ===============================================================
+# Referee
+# ===============================================================
+
+class Referee:
+    def __init__(self, tag="referee"):
+        self.chal = _load("chal_" + tag, os.path.join(HERE, "chal.py"))
+        self.chal.init(16)
+
+    def reset(self):
+        self.chal.set_fen(STARTPOS)
+        self.seen = {}
+        self.reps = self._count()
+
+    def _count(self):
+        key = self.chal.hash_key
+        self.seen[key] = self.seen.get(key, 0) + 1
+        return self.seen[key]
+
+    def legal_ucis(self):
+        return [_uci_0x88(fr, to, pr) for fr, to, pr in self.chal.get_legal_moves()]
+
+    def play(self, uci):
+        """Apply a UCI move; returns False if it is not legal here."""
+        if not uci or len(uci) < 4:
+            return False
+        fr = (ord(uci[1]) - ord('1')) * 16 + ord(uci[0]) - ord('a')
+        to = (ord(uci[3]) - ord('1')) * 16 + ord(uci[2]) - ord('a')
+        pr = PROMO_CHARS.find(uci[4]) if len(uci) > 4 else 0
+        if not (0 <= fr < 128 and 0 <= to < 128) or (fr | to) & 0x88 or pr < 0:
+            return False
+        if not self.chal.play_move(fr, to, pr):
+            return False
+        self.reps = self._count()
+        return True
+
+    def outcome(self):
+        """None while the game goes on, else (white score, reason)."""
+        c = self.chal
+        if c.is_checkmate():
+            return (0.0 if c.get_side() == c.WHITE else 1.0), "mate"
+        if c.is_stalemate():
+            return 0.5, "stalemate"
+        if self.reps >= 3:
+            return 0.5, "repetition"
+        if c.halfmove_clock >= 100:
+            return 0.5, "50 moves"
+        w, b = c.count[c.WHITE], c.count[c.BLACK]
+        heavy = w[c.PAWN] + b[c.PAWN] + w[c.ROOK] + b[c.ROOK] + w[c.QUEEN] + b[c.QUEEN]
+        if not heavy and w[c.KNIGHT] + w[c.BISHOP] + b[c.KNIGHT] + b[c.BISHOP] <= 1:
+            return 0.5, "material"
+        return None
+
+    def fen(self):
+        return self.chal.get_fen()
+
+
+def random_opening(referee, plies, rng):
+    while True:
+        referee.reset()
+        moves = []
+        for _ in range(plies):
+            legal = referee.legal_ucis()
+            if not legal:
+                break
+            m = rng.choice(legal)
+            referee.play(m)
+            moves.append(m)
+        if len(moves) == plies and referee.outcome() is None:
+            return moves
+
+
+# ===============================================================
+# Games (run in the worker processes)
+# ===============================================================
+
+_worker_engines = {}
+_worker_referee = None
+
+
+def _engine(spec, slot):
+    key = (spec, slot)
+    if key not in _worker_engines:
+        kind, opts = parse_spec(spec)
+        _worker_engines[key] = ENGINES[kind](opts, "%d_%d" % (len(_worker_engines), slot))
+    return _worker_engines[key]
+
+
+def play_game(task):
+    """task = (pair, spec_a, spec_b, opening, a_white). Returns A's score,
+    the reason, and the per-move times (ms) of A and B."""
+    global _worker_referee
+    pair, spec_a, spec_b, opening, a_white = task
+    if _worker_referee is None:
+        _worker_referee = Referee()
+    ref = _worker_referee
+    eng_a = _engine(spec_a, 0)
+    eng_b = _engine(spec_b, 1)
+    eng_a.new_game()
+    eng_b.new_game()
+    ref.reset()
+    for m in opening:
+        ref.play(m)
+
+    times = ([], [])
+    white_score, reason = 0.5, "ply cap"
+    for _ in range(MAX_PLIES):
+        result = ref.outcome()
+        if result is not None:
+            white_score, reason = result
+            break
+        white_to_move = ref.chal.get_side() == ref.chal.WHITE
+        a_to_move = white_to_move == a_white
+        engine = eng_a if a_to_move else eng_b
+        start = time.perf_counter()
+        move = engine.best_move(ref.fen())
+        times[0 if a_to_move else 1].append((time.perf_counter() - start) * 1000.0)
+        if not ref.play(move):
+            white_score = 0.0 if white_to_move else 1.0
+            reason = "illegal move %s" % move
+            break
+    a_score = white_score if a_white else 1.0 - white_score
+    return pair, a_score, reason, times[0], times[1]
+
+
+# ===============================================================
+# Report
+# ===============================================================
+
+def elo(score):
+    score = min(max(score, 1e-3), 1.0 - 1e-3)
+    return -400.0 * math.log10(1.0 / score - 1.0)
+
+
+def elo_interval(scores):
+    """Elo difference and 95% interval from a list of per-game scores."""
+    n = len(scores)
+    mean = sum(scores) / n
+    var = sum((s - mean) ** 2 for s in scores) / n
+    margin = 1.96 * math.sqrt(var / n)
+    return elo(mean), elo(mean - margin), elo(mean + margin)
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+def report(specs, pairs, results, times):
+    print()
+    print("%-28s %-28s %6s %5s %5s %5s %7s %s" % ("engine A", "engine B", "games", "+", "=", "-", "score", "elo A-B (95%)"))
+    field = {spec: [] for spec in specs}
+    for pair, (spec_a, spec_b) in enumerate(pairs):
+        scores = results[pair]
+        if not scores:
+            continue
+        field[spec_a].extend(scores)
+        field[spec_b].extend(1.0 - s for s in scores)
+        diff, lo, hi = elo_interval(scores)
+        print("%-28s %-28s %6d %5d %5d %5d %6.1f%% %+6.0f [%+.0f, %+.0f]"
+              % (spec_name(spec_a)[:28], spec_name(spec_b)[:28], len(scores),
+                 scores.count(1.0), scores.count(0.5), scores.count(0.0),
+                 100.0 * sum(scores) / len(scores), diff, lo, hi))
+
+    print()
+    print("%-28s %6s %7s %s" % ("engine", "games", "score", "elo vs field (95%)"))
+    for spec in specs:
+        scores = field[spec]
+        if scores:
+            diff, lo, hi = elo_interval(scores)
+            print("%-28s %6d %6.1f%% %+6.0f [%+.0f, %+.0f]"
+                  % (spec_name(spec)[:28], len(scores), 100.0 * sum(scores) / len(scores), diff, lo, hi))
+
+    print()
+    print("%-28s %7s %8s %8s %8s %8s %8s  (ms per move)" % ("engine", "moves", "mean", "median", "p90", "p99", "max"))
+    for spec in specs:
+        t = sorted(times[spec])
+        if t:
+            print("%-28s %7d %8.0f %8.0f %8.0f %8.0f %8.0f"
+                  % (spec_name(spec)[:28], len(t), sum(t) / len(t), percentile(t, 0.5),
+                     percentile(t, 0.9), percentile(t, 0.99), t[-1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="engine-vs-engine tournament for the chess AIs")
+    parser.add_argument("engines", nargs="+", help="kind[:key=value,...]")
+    parser.add_argument("--games", type=int, default=100, help="games per pairing (rounded up to even)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--plies", type=int, default=4, help="random opening plies")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    if len(args.engines) < 2:
+        parser.error("need at least two engines")
+    for spec in args.engines:
+        parse_spec(spec)
+
+    specs = args.engines
+    pairs = [(specs[i], specs[j]) for i in range(len(specs)) for j in range(i + 1, len(specs))]
+    rng = random.Random(args.seed)
+    referee = Referee("openings")
+    tasks = []
+    for pair, (spec_a, spec_b) in enumerate(pairs):
+        for _ in range((args.games + 1) // 2):
+            opening = random_opening(referee, args.plies, rng)
+            tasks.append((pair, spec_a, spec_b, opening, True))
+            tasks.append((pair, spec_a, spec_b, opening, False))
+
+    results = [[] for _ in pairs]
+    times = {spec: [] for spec in specs}
+    reasons = {}
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.jobs) as pool:
+        for done, (pair, a_score, reason, times_a, times_b) in enumerate(
+                pool.imap_unordered(play_game, tasks), 1):
+            results[pair].append(a_score)
+            times[pairs[pair][0]].extend(times_a)
+            times[pairs[pair][1]].extend(times_b)
+            reasons[reason] = reasons.get(reason, 0) + 1
+            if done % 10 == 0 or done == len(tasks):
+                print("%d/%d games, %.0fs" % (done, len(tasks), time.perf_counter() - start))
+    print("results by reason: " + ", ".join("%s %d" % kv for kv in sorted(reasons.items())))
+    report(specs, pairs, results, times)
+
+
+if __name__ == "__main__":
+    main()
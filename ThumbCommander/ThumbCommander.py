@@ -4,10 +4,11 @@ from time import sleep
 loc = "/Games/ThumbCommander/"
 path.insert(0, '/Games/ThumbCommander')
 
-from platform_loader import display, IS_THUMBY_COLOR, Sprite, PC, create_sprite, play_cutscene_animation, create_cancel_callback, audio_load, audio_play, audio_stop, audio_set_loop, audio_set_volume, audio_get_position, rumble, buttonA, buttonB, buttonU, buttonD, buttonL, buttonR, buttonLB, buttonRB, buttonMENU, dpadPressed, inputJustPressed
+from platform_loader import display, IS_THUMBY_COLOR, Sprite, PC, create_sprite, clear_sprite_cache, play_cutscene_animation, create_cancel_callback, audio_load, audio_play, audio_stop, audio_set_loop, audio_set_volume, audio_get_position, rumble, buttonA, buttonB, buttonU, buttonD, buttonL, buttonR, buttonLB, buttonRB, buttonMENU, dpadPressed, inputJustPressed
 display.enableGrayscale()
 
 from fpmath import int2fp, fp2int, fp2float, float2fp, fpmul, fpdiv, project, fpsin, fpcos, rotate_z_x, rotate_z_y, sign, sort_by_z, apply_physics
+from fpbatch import star_buffers, star_params, stars_step, STAR_Z, STAR_SPEED, STAR_COLOUR, STAR_OUT, P_BOUND, P_DEPTH, P_CENTER_X, P_CENTER_Y, P_WIDTH, P_HEIGHT, P_RESPAWN
 
 # Set platform-appropriate frequency
 if not IS_THUMBY_COLOR:
@@ -34,6 +35,10 @@ OBJECTS[0] = create_sprite(56, 54, (loc+"explode_56_54.BIT.bin", loc+"explode_56
 OBJECTS[1] = create_sprite(56, 47, (loc+"astroid1_56_47.BIT.bin", loc+"astroid1_56_47.SHD.bin"), 0, 0, 0)
 OBJECTS[2] = create_sprite(56, 47, (loc+"astroid2_56_47.BIT.bin", loc+"astroid2_56_47.SHD.bin"), 0, 0, 0)
 OBJECTS[3] = create_sprite(70, 59, (loc+"enemy1_70_59.BIT.bin", loc+"enemy1_70_59.SHD.bin"), 0, 0, 0)
+if IS_THUMBY_COLOR:
+    # Explosions and asteroid spins step through their frames, enemies pick theirs by orientation
+    for sprite in OBJECTS[:3]:
+        sprite.setSequential()
 
 # Import game modules
 from thumbyHardware import reset
@@ -166,57 +171,55 @@ class Stars:
     def __init__(self, num=None, scale_pos=4, stable=80):
         if num is None:
             num = PC.STAR_COUNT
-        stars = array('O', [None] * num)
+        stars, out, params = star_buffers(num)
         for i in range(num):
             speed = 0 if (randint(0,100) <= stable) else randint(42598, 62258)
             if speed != 0:
                 angle = randint(0, 4096)
                 radius = int2fp(randint(PC.WIDTH // scale_pos, PC.WIDTH*2) * scale_pos)
-                stars[i] = array('l', [fpmul(radius, fpcos(angle)),
-                          fpmul(radius, fpsin(angle)),
-                          randint(5, PC.Z_DISTANCE)<<16,
-                          choice(PC.STARCOLORS),
-                          speed])
+                stars[i] = fpmul(radius, fpcos(angle))
+                stars[num + i] = fpmul(radius, fpsin(angle))
+                stars[STAR_Z*num + i] = randint(5, PC.Z_DISTANCE)<<16
             else:
-                stars[i] = array('l', [randint(-200*PC.SCREEN_SCALE,200*PC.SCREEN_SCALE)<<16,
-                          randint(-200*PC.SCREEN_SCALE,200*PC.SCREEN_SCALE)<<16,
-                          7<<16,
-                          choice(PC.STARCOLORS),
-                          0])    
+                stars[i] = randint(-200*PC.SCREEN_SCALE,200*PC.SCREEN_SCALE)<<16
+                stars[num + i] = randint(-200*PC.SCREEN_SCALE,200*PC.SCREEN_SCALE)<<16
+                stars[STAR_Z*num + i] = 7<<16
+            stars[STAR_COLOUR*num + i] = choice(PC.STARCOLORS)
+            stars[STAR_SPEED*num + i] = speed
+        params[P_BOUND] = PC.SPACE_STARS<<16
+        params[P_DEPTH] = PC.Z_DISTANCE<<16
+        params[P_CENTER_X] = PC.CENTER_X
+        params[P_CENTER_Y] = PC.CENTER_Y
+        params[P_WIDTH] = PC.WIDTH
+        params[P_HEIGHT] = PC.HEIGHT
         self.stars = stars
+        self.out = out
+        self.params = params
+        self.num = num
         self.scale = scale_pos
 
     @micropython.native
     def run(self, angle=0):
         global player_speed
-
-        for s in self.stars:
-            x = project(s[0], s[2], PC.CENTER_X,0)
-            y = project(s[1], s[2], PC.CENTER_Y,0)
-            size = 1 if s[4] == 0 else fp2int(fpdiv(PC.Z_DISTANCE<<16, fpmul(72090, s[2])))
-  
-            if (-size < x < PC.WIDTH + size) and (-size < y < PC.HEIGHT + size):
-                display.drawFilledRectangle(x, y, size, size, s[3])
-            
-            # move forward
-            if s[4] == 0:
-                for c in range(2):
-                    s[c] += player_angle[c] + (player_speed-65536)
-                    if (s[c] > (PC.SPACE_STARS<<16)) or (s[c] < -(PC.SPACE_STARS<<16)): 
-                        s[c] = -s[c]
-            s[2]  -= fpmul(s[4], player_speed)
-            
-            # Rotate around z-axis
-            if angle != 0:
-                s[0] = rotate_z_x(s[0], s[1], angle)
-                s[1] = rotate_z_y(s[0], s[1], angle)
-         
-            if s[2] < (1<<16):
-                a = randint(0, 4096)
-                radius = int2fp(randint(PC.WIDTH // self.scale, PC.WIDTH*2) * self.scale)
-                s[0] = fpmul(radius, fpcos(a))
-                s[1] = fpmul(radius, fpsin(a))
-                s[2] = PC.Z_DISTANCE<<16
+        stars = self.stars
+        out = self.out
+        params = self.params
+        num = self.num
+
+        # project, move and rotate the whole field in one call, then draw what's visible
+        star_params(params, player_angle[0] + (player_speed-65536), player_angle[1] + (player_speed-65536), player_speed, angle)
+        visible = stars_step(stars, out, params)
+        for k in range(0, visible << 2, 4):
+            display.drawFilledRectangle(out[k], out[k+1], out[k+2], out[k+2], out[k+3])
+
+        # stars that passed the camera start again at the far end
+        for k in range(STAR_OUT*num, STAR_OUT*num + params[P_RESPAWN]):
+            i = out[k]
+            a = randint(0, 4096)
+            radius = int2fp(randint(PC.WIDTH // self.scale, PC.WIDTH*2) * self.scale)
+            stars[i] = fpmul(radius, fpcos(a))
+            stars[num + i] = fpmul(radius, fpsin(a))
+            stars[STAR_Z*num + i] = PC.Z_DISTANCE<<16
 
 class Astroids:
     def __init__(self, num=5):
@@ -621,6 +624,7 @@ class Ship:
             self.radar_sprite = create_sprite(24, 24,loc+"radar_24_24.COL.bin", PC.SHIP_X + PC.RADAR_X, PC.SHIP_Y + PC.RADAR_Y, 0)
             self.radar_frame = 0
             self.radar_framecount = self.radar_sprite.frameCount - 1
+            self.radar_sprite.setSequential()
             self.fx = FXEngine()
         else:
             # Load Grayscale sprites
@@ -1195,6 +1199,7 @@ def run_campaign(campaign_engine):
         display.update()
 
     del ship, stars, enemies, astroids
+    if clear_sprite_cache: clear_sprite_cache()
     collect()
     if mission_successful:
         home()
@@ -1260,6 +1265,7 @@ while True:
             ship.run()
             display.update()
         del stars, astroids, hudShip, ship
+        if clear_sprite_cache: clear_sprite_cache()
         collect()
         print(f"Free memory after flight: {mem_free()}")
         eject() if lifes > 0 else die() 
@@ -1283,6 +1289,7 @@ while True:
             ship.run()
             display.update()
         del stars, ship, enemies, hudShip
+        if clear_sprite_cache: clear_sprite_cache()
         collect()
         eject() if lifes > 0 else die()    
         game_over()
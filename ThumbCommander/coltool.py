@@ -0,0 +1,460 @@
+"""
+coltool.py - Offline encoder, validator and reference decoder for ThumbCommander's
+.COL.bin assets: TDL8 cutscenes and RGB565 sprites (run with CPython).
+
+    python3 coltool.py video SOURCE OUT.COL.bin [--keyint N] [--cost X]
+    python3 coltool.py sprite SOURCE OUT.COL.bin
+    python3 coltool.py validate FILE.COL.bin [--verbose]
+    python3 coltool.py decode FILE.COL.bin OUTDIR
+
+SOURCE is a directory of frames in name order (PPM natively, anything else
+through Pillow if it's installed) or an existing file of the same kind to
+re-encode. Sprites may also come from a single image.
+
+Colours are reduced to RGB565. Cutscenes hold up to 256 of them. Black, if
+the frames use it, gets index 0: FULL records leave out a trailing run of
+index 0, which is usually a black border. The other colours are ordered by
+use, and if there are too many the least used map to the nearest kept one.
+The RLE and delta records only compare indices, so the ordering doesn't
+change their size otherwise. For every frame the encoder tries an RLE key
+frame, a raw frame, a delta against the previous frame and an unchanged
+frame. The one with the lowest bytes + cost * decode operations wins. A
+decode operation is one index or screen pixel written by the viper kernels
+in cutscene_utils. Key frames expand the whole video through the palette,
+while deltas only write their changed pixels when the video is as wide as
+the screen. --keyint forces a key frame at least that often.
+
+validate walks a file with the reference decoder. It checks the header,
+the offset table and that every record uses exactly its own bytes, then
+prints the bytes read and estimated decode operations per frame. The
+largest record is also the RAM the player allocates for its record
+buffer. decode writes the frames as PPM images.
+
+TDL8 layout: "TDL8", <HHH width, height, frame count, 256 RGB565 palette
+entries, one u32 file offset per frame, then back to back records of a
+4 byte type, a u32 data size and the data:
+    FULL  (index, run length - 1) pairs, the rest of the frame is index 0
+    URAW  width * height indices
+    DLTA  u32 change count, then (u32 pixel, u8 index) per change
+    SAME  no data, the previous frame again
+Sprites are <HHHH width, height, frame count, flags (0), then every frame's
+width * height RGB565 pixels, little endian.
+"""
+
+import argparse
+import os
+import re
+import struct
+import sys
+
+DISPLAY = 128
+MAGIC = b"TDL8"
+HEADER = struct.Struct("<4sHHH")
+RECORD = struct.Struct("<4sI")
+SPRITE = struct.Struct("<HHHH")
+PALETTE_SIZE = 256
+
+FULL = b"FULL"
+URAW = b"URAW"
+DLTA = b"DLTA"
+SAME = b"SAME"
+KEY_TYPES = (FULL, URAW)
+
+
+class COLError(Exception):
+    pass
+
+
+def rgb565(r, g, b):
+    return (r >> 3) << 11 | (g >> 2) << 5 | b >> 3
+
+
+def rgb888(c):
+    return bytes(((c >> 11) * 255 // 31, ((c >> 5) & 63) * 255 // 63, (c & 31) * 255 // 31))
+
+
+# Records
+
+def encode_rle(frame):
+    out = bytearray()
+    i, n = 0, len(frame)
+    while i < n:
+        value = frame[i]
+        j = i + 1
+        while j < n and j - i < 256 and frame[j] == value:
+            j += 1
+        out += bytes((value, j - i - 1))
+        i = j
+    # the player fills the rest with index 0, so a trailing run of it can go
+    if len(out) >= 2 and out[-2] == 0:
+        del out[-2:]
+    return bytes(out)
+
+
+def encode_delta(prev, frame):
+    changes = [i for i in range(len(frame)) if frame[i] != prev[i]]
+    out = bytearray(struct.pack("<I", len(changes)))
+    for i in changes:
+        out += struct.pack("<IB", i, frame[i])
+    return bytes(out), len(changes)
+
+
+def decode_ops(kind, data_size, changes, area, direct):
+    """Pixels the cutscene_utils kernels write for a record."""
+    if kind == SAME:
+        return 0
+    if kind == DLTA:
+        return changes * 2 if direct else changes + area
+    if kind == FULL:
+        return data_size // 2 + area * 2
+    return area * 2
+
+
+def apply_record(frame, kind, data, area, problems=None, n=0):
+    """Reference decoder: the frame after one record, as cutscene_utils plays it."""
+    def warn(message):
+        if problems is not None:
+            problems.append("frame %d: %s" % (n, message))
+    if kind == SAME:
+        if data:
+            warn("SAME record has %d bytes of data" % len(data))
+        return frame
+    if kind == URAW:
+        if len(data) != area:
+            warn("URAW record has %d bytes for %d pixels" % (len(data), area))
+        out = bytearray(frame)
+        out[:min(area, len(data))] = data[:area]
+        return out
+    if kind == FULL:
+        out = bytearray(area)
+        pos = 0
+        for i in range(0, len(data) - 1, 2):
+            run = min(data[i + 1] + 1, area - pos)
+            out[pos:pos + run] = bytes((data[i],)) * run
+            pos += run
+            if pos >= area:
+                if i + 2 < len(data):
+                    warn("FULL record runs past the frame")
+                break
+        if len(data) & 1:
+            warn("FULL record has an odd length")
+        return out
+    if kind == DLTA:
+        out = bytearray(frame)
+        if len(data) < 4:
+            warn("DLTA record is too short")
+            return out
+        count = struct.unpack_from("<I", data)[0]
+        if len(data) != 4 + 5 * count:
+            warn("DLTA record has %d bytes for %d changes" % (len(data), count))
+        for i in range(4, min(len(data), 4 + 5 * count) - 4, 5):
+            pixel, value = struct.unpack_from("<IB", data, i)
+            if pixel < area:
+                out[pixel] = value
+            else:
+                warn("DLTA change outside the frame")
+        return out
+    warn("unknown record type %r, the player skips it" % kind)
+    return frame
+
+
+# Cutscenes
+
+def read_tdl8(path):
+    """Returns (width, height, palette, offsets, file bytes)."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    if len(raw) < HEADER.size or raw[:4] != MAGIC:
+        raise COLError("%s is not a TDL8 cutscene" % path)
+    _, width, height, count = HEADER.unpack_from(raw)
+    table = HEADER.size + PALETTE_SIZE * 2
+    if len(raw) < table + 4 * count:
+        raise COLError("%s is truncated in its header" % path)
+    palette = list(struct.unpack_from("<%dH" % PALETTE_SIZE, raw, HEADER.size))
+    offsets = list(struct.unpack_from("<%dI" % count, raw, table))
+    return width, height, palette, offsets, raw
+
+
+def iter_tdl8(path, problems=None):
+    """Yields (n, kind, record bytes, decode ops, frame indices) for each frame."""
+    width, height, palette, offsets, raw = read_tdl8(path)
+    area = width * height
+    direct = width == DISPLAY
+    expected = HEADER.size + PALETTE_SIZE * 2 + 4 * len(offsets)
+    frame = bytearray(area)
+    for n, offset in enumerate(offsets):
+        if problems is not None and offset != expected:
+            problems.append("frame %d: record at %d, expected %d (the player seeks, but records should be back to back)"
+                            % (n, offset, expected))
+        if offset + RECORD.size > len(raw):
+            raise COLError("frame %d: record header past the end of the file" % n)
+        kind, size = RECORD.unpack_from(raw, offset)
+        data = raw[offset + RECORD.size:offset + RECORD.size + size]
+        if len(data) != size:
+            raise COLError("frame %d: record data past the end of the file" % n)
+        expected = offset + RECORD.size + size
+        frame = apply_record(frame, kind, data, area, problems, n)
+        changes = struct.unpack_from("<I", data)[0] if kind == DLTA and size >= 4 else 0
+        yield n, kind, RECORD.size + size, decode_ops(kind, size, changes, area, direct), bytes(frame)
+    if problems is not None and expected != len(raw):
+        problems.append("%d bytes after the last record" % (len(raw) - expected))
+
+
+def build_palette(frames):
+    """Map RGB565 frames to (palette, index frames), black first if used and the rest by use."""
+    use = {}
+    for frame in frames:
+        for c in frame:
+            use[c] = use.get(c, 0) + 1
+    colours = sorted(use, key=lambda c: (c != 0, -use[c], c))
+    palette = colours[:PALETTE_SIZE]
+    index = {c: i for i, c in enumerate(palette)}
+    for c in colours[PALETTE_SIZE:]:  # too many colours, use the nearest kept one
+        r, g, b = c >> 11, (c >> 5) & 63, c & 31
+        index[c] = min(range(len(palette)), key=lambda i: (((palette[i] >> 11) - r) * 2) ** 2
+                       + ((palette[i] >> 5 & 63) - g) ** 2 + (((palette[i] & 31) - b) * 2) ** 2)
+    palette += [0] * (PALETTE_SIZE - len(palette))
+    return palette, [bytes(index[c] for c in frame) for frame in frames], max(0, len(colours) - PALETTE_SIZE)
+
+
+def choose_record(prev, frame, area, direct, key, cost):
+    """The cheapest record for frame, as (kind, data, changes)."""
+    candidates = []
+    if not key:
+        if frame == prev:
+            return SAME, b"", 0
+        data, changes = encode_delta(prev, frame)
+        candidates.append((DLTA, data, changes))
+    candidates.append((FULL, encode_rle(frame), 0))
+    candidates.append((URAW, bytes(frame), 0))
+    return min(candidates, key=lambda c: len(c[1]) + RECORD.size + cost * decode_ops(c[0], len(c[1]), c[2], area, direct))
+
+
+def write_tdl8(path, frames, width, height, palette, keyint=0, cost=0.01):
+    """Encode index frames, returns a count of each record type."""
+    area = width * height
+    direct = width == DISPLAY
+    records = []
+    prev = bytes(area)  # the player starts from a cleared index buffer
+    since_key = 0
+    for n, frame in enumerate(frames):
+        key = n == 0 or (keyint and since_key >= keyint)
+        kind, data, _ = choose_record(prev, frame, area, direct, key, cost)
+        since_key = 1 if kind in KEY_TYPES else since_key + 1
+        records.append(RECORD.pack(kind, len(data)) + data)
+        prev = frame
+    offset = HEADER.size + PALETTE_SIZE * 2 + 4 * len(records)
+    offsets = []
+    for record in records:
+        offsets.append(offset)
+        offset += len(record)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, width, height, len(records)))
+        f.write(struct.pack("<%dH" % PALETTE_SIZE, *palette))
+        f.write(struct.pack("<%dI" % len(offsets), *offsets))
+        for record in records:
+            f.write(record)
+    counts = {}
+    for record in records:
+        counts[record[:4]] = counts.get(record[:4], 0) + 1
+    return counts
+
+
+# Sprites
+
+def read_sprite(path):
+    """Returns (width, height, list of RGB565 frames as lists of ints)."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    if len(raw) < SPRITE.size or raw[:4] == MAGIC:
+        raise COLError("%s is not a sprite" % path)
+    width, height, count, flags = SPRITE.unpack_from(raw)
+    size = width * height * 2
+    if len(raw) != SPRITE.size + count * size:
+        raise COLError("%s: %d bytes, expected %d for %d %dx%d frames"
+                       % (path, len(raw), SPRITE.size + count * size, count, width, height))
+    return width, height, [list(struct.unpack_from("<%dH" % (width * height), raw, SPRITE.size + n * size))
+                           for n in range(count)]
+
+
+def write_sprite(path, frames, width, height):
+    with open(path, "wb") as f:
+        f.write(SPRITE.pack(width, height, len(frames), 0))
+        for frame in frames:
+            f.write(struct.pack("<%dH" % len(frame), *frame))
+
+
+# Frame sources
+
+def _read_ppm(path):
+    """PPM (P6) as (width, height, RGB565 pixels), or None for other files."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    if raw[:2] != b"P6":
+        return None
+    fields = []
+    pos = 2
+    while len(fields) < 3:
+        m = re.compile(rb"\s*(#[^\n]*\n\s*)*(\d+)").match(raw, pos)
+        fields.append(int(m.group(2)))
+        pos = m.end()
+    pos += 1  # single whitespace before the raster
+    width, height, maxval = fields
+    if maxval > 255:
+        raise COLError("%s: 16-bit PPM isn't supported" % path)
+    rgb = raw[pos:pos + width * height * 3]
+    if maxval != 255:
+        rgb = bytes(v * 255 // maxval for v in rgb)
+    return width, height, [rgb565(rgb[i], rgb[i + 1], rgb[i + 2]) for i in range(0, len(rgb), 3)]
+
+
+def _read_image(path):
+    frame = _read_ppm(path)
+    if frame is not None:
+        return frame
+    try:
+        from PIL import Image
+    except ImportError:
+        raise COLError("%s: only PPM frames can be read without Pillow" % path)
+    with Image.open(path) as img:
+        rgba = img.convert("RGBA")
+        # fully transparent pixels become black, the key colour sprites are drawn with
+        return rgba.width, rgba.height, [rgb565(r, g, b) if a else 0 for r, g, b, a in rgba.getdata()]
+
+
+def load_frames(source):
+    """Returns (width, height, RGB565 frames) from an image directory or a single image."""
+    if os.path.isfile(source):
+        width, height, frame = _read_image(source)
+        return width, height, [frame]
+    names = sorted(n for n in os.listdir(source) if not n.startswith("."))
+    if not names:
+        raise COLError("no frames in " + source)
+    frames = []
+    width = height = None
+    for name in names:
+        w, h, frame = _read_image(os.path.join(source, name))
+        if width is None:
+            width, height = w, h
+        elif (w, h) != (width, height):
+            raise COLError("%s is %dx%d, expected %dx%d" % (name, w, h, width, height))
+        frames.append(frame)
+    return width, height, frames
+
+
+def _is_tdl8(path):
+    with open(path, "rb") as f:
+        return f.read(4) == MAGIC
+
+
+def write_ppm(path, width, height, pixels):
+    with open(path, "wb") as f:
+        f.write(b"P6\n%d %d\n255\n" % (width, height) + b"".join(rgb888(c) for c in pixels))
+
+
+# Commands
+
+def cmd_validate(args):
+    problems = []
+    if not _is_tdl8(args.file):
+        width, height, frames = read_sprite(args.file)
+        print("%s: sprite, %dx%d, %d frames, %d bytes per frame, %d bytes"
+              % (args.file, width, height, len(frames), width * height * 2, os.path.getsize(args.file)))
+        print("ok")
+        return
+    width, height, palette, offsets, raw = read_tdl8(args.file)
+    print("%s: TDL8 cutscene, %dx%d, %d frames, %d bytes" % (args.file, width, height, len(offsets), len(raw)))
+    if width > DISPLAY or height > DISPLAY:
+        problems.append("larger than the screen, the player falls back to a framebuf blit")
+    sizes = []
+    costs = []
+    kinds = {}
+    for n, kind, size, ops, _ in iter_tdl8(args.file, problems):
+        sizes.append(size)
+        costs.append(ops)
+        name = kind.decode("ascii", "replace")
+        kinds[name] = kinds.get(name, 0) + 1
+        if args.verbose:
+            print("frame %5d  %s %6d bytes %6d ops" % (n, name, size, ops))
+    if sizes:
+        print("bytes read/frame avg %.1f max %d (the player's record buffer), decode ops/frame avg %.0f max %d"
+              % (sum(sizes) / len(sizes), max(sizes), sum(costs) / len(costs), max(costs)))
+        print("frames: " + ", ".join("%s %d" % kv for kv in sorted(kinds.items())))
+    for p in problems:
+        print("warning: " + p)
+    print("ok" if not problems else "%d warnings" % len(problems))
+
+
+def cmd_decode(args):
+    os.makedirs(args.outdir, exist_ok=True)
+    if _is_tdl8(args.file):
+        width, height, palette, offsets, _ = read_tdl8(args.file)
+        frames = ([palette[i] for i in frame] for _, _, _, _, frame in iter_tdl8(args.file))
+    else:
+        width, height, frames = read_sprite(args.file)
+    count = 0
+    for n, frame in enumerate(frames):
+        write_ppm(os.path.join(args.outdir, "frame%05d.ppm" % n), width, height, frame)
+        count += 1
+    print("%d frames written to %s" % (count, args.outdir))
+
+
+def cmd_video(args):
+    if os.path.isfile(args.source) and _is_tdl8(args.source):
+        width, height, palette, _, _ = read_tdl8(args.source)
+        frames = [[palette[i] for i in frame] for _, _, _, _, frame in iter_tdl8(args.source)]
+    else:
+        width, height, frames = load_frames(args.source)
+    if width > DISPLAY or height > DISPLAY:
+        raise COLError("%dx%d is larger than the %dx%d screen" % (width, height, DISPLAY, DISPLAY))
+    palette, indexed, merged = build_palette(frames)
+    if merged:
+        print("warning: %d colours over the palette were mapped to the nearest kept colour" % merged)
+    counts = write_tdl8(args.out, indexed, width, height, palette, keyint=args.keyint, cost=args.cost)
+    # the encoder is lossless after palette reduction, so the reference decoder has to give back every frame
+    for n, _, _, _, frame in iter_tdl8(args.out):
+        if frame != indexed[n]:
+            raise COLError("frame %d doesn't decode to its source" % n)
+    size = os.path.getsize(args.out)
+    print("%s: %dx%d, %d frames, %d bytes (%.1f per frame), %s"
+          % (args.out, width, height, len(indexed), size, size / max(len(indexed), 1),
+             ", ".join("%s %d" % (k.decode(), v) for k, v in sorted(counts.items()))))
+
+
+def cmd_sprite(args):
+    if os.path.isfile(args.source) and args.source.endswith(".COL.bin"):
+        width, height, frames = read_sprite(args.source)
+    else:
+        width, height, frames = load_frames(args.source)
+    write_sprite(args.out, frames, width, height)
+    if read_sprite(args.out)[2] != frames:
+        raise COLError("%s doesn't read back to its source" % args.out)
+    print("%s: %dx%d, %d frames, %d bytes" % (args.out, width, height, len(frames), os.path.getsize(args.out)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="encode, check and decode ThumbCommander .COL.bin assets")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("video", help="encode a frame directory or re-encode a cutscene as TDL8")
+    p.add_argument("source")
+    p.add_argument("out")
+    p.add_argument("--keyint", type=int, default=0, help="force a key frame at least every N frames")
+    p.add_argument("--cost", type=float, default=0.01, help="bytes one decoded pixel is worth")
+    p.set_defaults(run=cmd_video)
+    p = sub.add_parser("sprite", help="encode a frame directory or an image as an RGB565 sprite")
+    p.add_argument("source")
+    p.add_argument("out")
+    p.set_defaults(run=cmd_sprite)
+    p = sub.add_parser("validate", help="check a file and print bytes and decode cost per frame")
+    p.add_argument("file")
+    p.add_argument("--verbose", action="store_true", help="one line per frame")
+    p.set_defaults(run=cmd_validate)
+    p = sub.add_parser("decode", help="write every frame as a PPM image")
+    p.add_argument("file")
+    p.add_argument("outdir")
+    p.set_defaults(run=cmd_decode)
+    args = parser.parse_args()
+    try:
+        args.run(args)
+    except COLError as e:
+        sys.exit("error: %s" % e)
@@ -75,161 +75,181 @@ def play_cutscene_animation(filename, fps=20, frame_callback=None):
                 pass
 
 def _play_8bit_delta_cutscene(filename, frame_callback, fps):
-    """Play 8-bit palette delta-compressed cutscene"""
+    """Play 8-bit palette delta-compressed cutscene
+    Each frame record (type, size, data) is read whole into one preallocated buffer,
+    the next one while the current frame waits for its tick, and decoded by viper kernels
+    straight into the display buffer."""
     
     with open(filename, 'rb') as f:
         # Check magic header for 8-bit delta format
-        magic = f.read(4)
-        if magic != b'TDL8':
+        header = bytearray(10)
+        f.readinto(header)
+        if header[0:4] != b'TDL8':
             print(f"Error: {filename} is not 8-bit delta format (TDL8)")
             return
         
         # Read header
-        width, height, frame_count = struct.unpack('<HHH', f.read(6))
+        width, height, frame_count = struct.unpack_from('<HHH', header, 4)
         
         x = (PC.WIDTH - width) // 2
         y = (PC.HEIGHT - height) // 2
-        
-        # Create temporary buffer for streaming (used throughout)
-        temp_buffer = bytearray(4096)
+        fits = x >= 0 and y >= 0
 
         # Read palette (256 RGB565 colors)
-        palette_data = bytearray(256 * 2)
-        f.readinto(palette_data)
-        palette = FrameBuffer(palette_data, 256, 1, RGB565)
+        palette = array('H', [0] * 256)
+        f.readinto(palette)
+        palette_fb = FrameBuffer(palette, 256, 1, RGB565)
 
-        # Read frame offset table (pre-allocated array, no dynamic list)
+        # Read frame offset table in one go, records are back to back
         frame_offsets = array('I', [0] * frame_count)
+        f.readinto(frame_offsets)
+        file_size = stat(filename)[6]
+        record_size = 8
         for i in range(frame_count):
-            f.readinto(memoryview(temp_buffer)[0:4])
-            frame_offsets[i] = struct.unpack('<I', temp_buffer[0:4])[0]
+            end = frame_offsets[i + 1] if i + 1 < frame_count else file_size
+            record_size = max(record_size, end - frame_offsets[i])
+        record = bytearray(record_size)
 
         # Create persistent 8-bit index buffer
         index_buffer = bytearray(width * height)
         persistent_fb = FrameBuffer(index_buffer, width, height, GS8)
-        
+
+        # direct (deltas write to the screen), screen offset, pixels, height, width, screen width
+        geometry = array('I', [1 if fits and width == PC.WIDTH else 0, y * PC.WIDTH + x if fits else 0,
+                               width * height, height, width, PC.WIDTH])
+
+        display.fill(0)
+        pos = f.tell()
+        pos = _read_record(f, frame_offsets[0], pos, record) if frame_count else pos
+
         # Play each frame
         for frame_idx in range(frame_count):
-            # Seek to frame data
-            f.seek(frame_offsets[frame_idx])
-            
-            # Read frame type and data
-            frame_type = f.read(4)
-            data_size = struct.unpack('<I', f.read(4))[0]
-            
-            # Process frame based on type
-            if frame_type == b'FULL':
-                # RLE compressed full frame
-                _rle_decompress_8bit_stream(f, data_size, index_buffer, temp_buffer)
-            elif frame_type == b'URAW':
-                # Uncompressed full frame
-                _stream_into_buffer(f, data_size, index_buffer, temp_buffer)
-            elif frame_type == b'DLTA':
-                # Delta frame - stream using temp_buffer (no allocation)
-                _apply_8bit_delta_stream(f, data_size, index_buffer, temp_buffer)
-            elif frame_type == b'SAME':
-                # No changes
-                pass
+            # Process frame based on type, the first byte tells them apart
+            frame_type = record[0]
+            if frame_type == 70:  # FULL - RLE compressed full frame
+                _rle_decode(record, index_buffer, geometry)
+                redraw = True
+            elif frame_type == 85:  # URAW - uncompressed full frame
+                size = min(len(index_buffer), struct.unpack_from('<I', record, 4)[0])
+                index_buffer[0:size] = memoryview(record)[8:8 + size]
+                redraw = True
+            elif frame_type == 68:  # DLTA - delta frame
+                redraw = not _apply_delta(record, index_buffer, palette, geometry)
+            elif frame_type == 83:  # SAME - no changes
+                redraw = False
             else:
+                redraw = None
+
+            # Expand palette indices into the display buffer
+            if redraw:
+                if fits:
+                    _expand(index_buffer, palette, geometry)
+                else:
+                    display.fill(0)
+                    display.internal_fb.blit(persistent_fb, x, y, 0, palette_fb)
+
+            # Read ahead while the frame waits for its tick
+            if frame_idx + 1 < frame_count:
+                pos = _read_record(f, frame_offsets[frame_idx + 1], pos, record)
+            if redraw is None:
                 continue
             
-            # Clear display and blit with palette mapping
-            display.fill(0)
-            display.internal_fb.blit(persistent_fb, x, y, 0, palette)
-            
             display.update()
             
             # Handle frame callback
             if frame_callback:
                 if not frame_callback(frame_idx):
                     break
-            
-            collect()
         
         # Clean up
-        del temp_buffer, index_buffer, persistent_fb
+        del record, index_buffer, persistent_fb
         collect()
 
-def _stream_into_buffer(file_handle, data_size, target_buffer, temp_buffer):
-    """Stream data directly into buffer"""
-    bytes_read = 0
-    chunk_size = len(temp_buffer)
-    
-    while bytes_read < data_size:
-        to_read = min(chunk_size, data_size - bytes_read, len(target_buffer) - bytes_read)
-        if to_read <= 0:
-            break
-        
-        actual_read = file_handle.readinto(memoryview(temp_buffer)[0:to_read])
-        
-        for i in range(actual_read):
-            if bytes_read + i < len(target_buffer):
-                target_buffer[bytes_read + i] = temp_buffer[i]
-        
-        bytes_read += actual_read
-
-def _rle_decompress_8bit_stream(file_handle, data_size, index_buffer, temp_buffer):
-    """Stream RLE decompression for 8-bit data - no dynamic allocation"""
-    for i in range(len(index_buffer)):
-        index_buffer[i] = 0
-
-    buf_pos = 0
-    bytes_remaining = data_size
-    chunk_size = (len(temp_buffer) // 2) * 2  # Multiple of 2 bytes per record
-    remainder_bytes = 0
-
-    while bytes_remaining > 0 and buf_pos < len(index_buffer):
-        to_read = min(chunk_size - remainder_bytes, bytes_remaining)
-        actual_read = file_handle.readinto(memoryview(temp_buffer)[remainder_bytes:remainder_bytes + to_read])
-        bytes_remaining -= actual_read
-        total_bytes = remainder_bytes + actual_read
-
-        # Process complete 2-byte records (index + count)
-        i = 0
-        while i + 1 < total_bytes and buf_pos < len(index_buffer):
-            index = temp_buffer[i]
-            count = temp_buffer[i + 1] + 1
-            for _ in range(count):
-                if buf_pos < len(index_buffer):
-                    index_buffer[buf_pos] = index
-                    buf_pos += 1
-                else:
-                    break
-            i += 2
-
-        # Move remainder to start of buffer
-        remainder_bytes = total_bytes - i
-        if remainder_bytes > 0:
-            temp_buffer[0] = temp_buffer[i]
-
-def _apply_8bit_delta_stream(file_handle, data_size, index_buffer, temp_buffer):
-    """Apply delta changes by streaming - no large allocation"""
-    # Read change count (4 bytes)
-    file_handle.readinto(memoryview(temp_buffer)[0:4])
-    change_count = struct.unpack('<I', temp_buffer[0:4])[0]
-
-    bytes_remaining = data_size - 4
-    chunk_size = (len(temp_buffer) // 5) * 5  # Multiple of 5 bytes per record
-    remainder_bytes = 0
-    changes_processed = 0
-
-    while bytes_remaining > 0 and changes_processed < change_count:
-        to_read = min(chunk_size - remainder_bytes, bytes_remaining)
-        actual_read = file_handle.readinto(memoryview(temp_buffer)[remainder_bytes:remainder_bytes + to_read])
-        bytes_remaining -= actual_read
-        total_bytes = remainder_bytes + actual_read
-
-        # Process complete 5-byte records (4 byte pixel_idx + 1 byte new_index)
-        i = 0
-        while i + 5 <= total_bytes and changes_processed < change_count:
-            pixel_idx = struct.unpack('<I', temp_buffer[i:i+4])[0]
-            if pixel_idx < len(index_buffer):
-                index_buffer[pixel_idx] = temp_buffer[i+4]
-            i += 5
-            changes_processed += 1
-
-        # Move remainder to start of buffer
-        remainder_bytes = total_bytes - i
-        if remainder_bytes > 0:
-            for j in range(remainder_bytes):
-                temp_buffer[j] = temp_buffer[i + j]
\ No newline at end of file
+def _read_record(file_handle, offset, pos, record):
+    """Read the frame record at offset into record, returns the new file position
+    The size field is rewritten to the bytes actually read, the decode kernels take
+    their end from it and must not run into a previous record's bytes"""
+    if offset != pos:
+        file_handle.seek(offset)
+    if (file_handle.readinto(record, 8) or 0) < 8:
+        record[0] = 0
+        return offset
+    size = min(record[4] | (record[5] << 8) | (record[6] << 16) | (record[7] << 24), len(record) - 8)
+    if size:
+        size = file_handle.readinto(memoryview(record)[8:], size) or 0
+    struct.pack_into('<I', record, 4, size)
+    return offset + 8 + size
+
+@micropython.viper
+def _rle_decode(record, indexes, geometry):
+    """Decode a FULL record's (index, count - 1) pairs into the index buffer
+    The record's size field must be the one _read_record() clamped to the bytes read"""
+    src = ptr8(record)
+    dst = ptr8(indexes)
+    g = ptr32(geometry)
+    area = g[2]
+    end = 8 + (src[4] | (src[5] << 8) | (src[6] << 16) | (src[7] << 24))
+    i = 8
+    pos = 0
+    while i + 1 < end and pos < area:
+        value = src[i]
+        stop = pos + src[i + 1] + 1
+        if stop > area: stop = area
+        while pos < stop:
+            dst[pos] = value
+            pos += 1
+        i += 2
+    while pos < area:
+        dst[pos] = 0
+        pos += 1
+
+@micropython.viper
+def _apply_delta(record, indexes, palette, geometry) -> int:
+    """Apply a DLTA record's (u32 pixel, index) changes to the index buffer
+    When video rows line up with screen rows the changed pixels are also written
+    to the display buffer, returns 1 then and 0 if the frame needs expanding.
+    Like _rle_decode, it stops at the size field _read_record() clamped"""
+    src = ptr8(record)
+    dst = ptr8(indexes)
+    pal = ptr16(palette)
+    g = ptr32(geometry)
+    screen = ptr16(display.buffer)
+    direct = g[0]
+    offset = g[1]
+    area = g[2]
+    end = 8 + (src[4] | (src[5] << 8) | (src[6] << 16) | (src[7] << 24))
+    count = src[8] | (src[9] << 8) | (src[10] << 16) | (src[11] << 24)
+    i = 12
+    while count > 0 and i + 5 <= end:
+        pixel = src[i] | (src[i + 1] << 8) | (src[i + 2] << 16) | (src[i + 3] << 24)
+        value = src[i + 4]
+        if pixel >= 0 and pixel < area:
+            dst[pixel] = value
+            if direct:
+                screen[offset + pixel] = pal[value]
+        i += 5
+        count -= 1
+    return direct
+
+@micropython.viper
+def _expand(indexes, palette, geometry):
+    """Expand the index buffer through the palette into the display buffer"""
+    src = ptr8(indexes)
+    pal = ptr16(palette)
+    g = ptr32(geometry)
+    screen = ptr16(display.buffer)
+    height = g[3]
+    width = g[4]
+    stride = g[5]
+    dst = g[1]
+    pos = 0
+    row = 0
+    while row < height:
+        stop = pos + width
+        out = dst
+        while pos < stop:
+            screen[out] = pal[src[pos]]
+            pos += 1
+            out += 1
+        dst += stride
+        row += 1
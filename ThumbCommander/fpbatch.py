@@ -0,0 +1,134 @@
+# fpbatch.py - Batched fixed-point transforms for ThumbCommander
+# Entities of one kind live in a flat array('l') laid out as structure of
+# arrays: block k holds field k of every entity, so field k of entity i is
+# at k*n + i. One viper call moves, rotates and projects the whole batch
+# with the same 16.16 arithmetic as fpmath.fpmul/fpdiv/project.
+from array import array
+from fpmath import fpsin, fpcos
+try:
+    from micropython import const
+except ImportError:
+    const = lambda x: x
+
+# Star fields, one block of n values each
+STAR_X = const(0)
+STAR_Y = const(1)
+STAR_Z = const(2)
+STAR_SPEED = const(3)    # 0: stable star, drifts with the player instead of flying past
+STAR_COLOUR = const(4)
+STAR_FIELDS = const(5)
+
+# Star output: visible stars as x, y, size, colour, then the indexes to respawn
+STAR_OUT = const(4)
+
+# Kernel parameters, refreshed by star_params() every frame
+P_COUNT = const(0)
+P_DX = const(1)          # drift of stable stars
+P_DY = const(2)
+P_SPEED = const(3)       # player speed
+P_ROTATE = const(4)
+P_COS = const(5)
+P_SIN = const(6)
+P_BOUND = const(7)       # stable stars wrap at +-bound
+P_DEPTH = const(8)       # Z_DISTANCE<<16, scales the star size
+P_CENTER_X = const(9)
+P_CENTER_Y = const(10)
+P_WIDTH = const(11)
+P_HEIGHT = const(12)
+P_RESPAWN = const(13)    # written by the kernel: stars that passed the camera
+P_SIZE = const(14)
+
+_SIZE_SCALE = const(72090 >> 8)  # fpmul(72090, z) == _SIZE_SCALE * (z >> 8)
+
+def star_buffers(n):
+    """Return (stars, out, params) for n stars, the caller fills in the screen parameters"""
+    params = array('l', [0] * P_SIZE)
+    params[P_COUNT] = n
+    return array('l', [0] * (STAR_FIELDS * n)), array('l', [0] * ((STAR_OUT + 1) * n)), params
+
+@micropython.native
+def star_params(params, dx, dy, speed, angle):
+    """Set the per-frame parameters, angle is the z rotation in sintab units"""
+    params[P_DX] = dx
+    params[P_DY] = dy
+    params[P_SPEED] = speed
+    params[P_ROTATE] = angle
+    if angle != 0:
+        params[P_COS] = fpcos(angle)
+        params[P_SIN] = fpsin(angle)
+
+@micropython.viper
+def stars_step(stars, out, params) -> int:
+    """Project, move and rotate all stars, returns how many are visible
+
+    Each star is projected where it is before it moves, like Stars.run did.
+    Visible stars go to out as x, y, size, colour. The indexes of stars that
+    passed the camera follow at STAR_OUT*n, params[P_RESPAWN] of them.
+    """
+    p = ptr32(params)
+    s = ptr32(stars)
+    o = ptr32(out)
+    n = p[P_COUNT]
+    dx = p[P_DX]
+    dy = p[P_DY]
+    speed = p[P_SPEED] >> 8
+    rotate = p[P_ROTATE]
+    c = p[P_COS] >> 8
+    sn = p[P_SIN] >> 8
+    bound = p[P_BOUND]
+    depth = p[P_DEPTH] << 3
+    cx = p[P_CENTER_X]
+    cy = p[P_CENTER_Y]
+    w = p[P_WIDTH]
+    h = p[P_HEIGHT]
+    respawn = STAR_OUT * n
+    visible = 0
+    r = 0
+    for i in range(n):
+        x = s[i]
+        y = s[STAR_Y*n + i]
+        z = s[STAR_Z*n + i]
+        v = s[STAR_SPEED*n + i]
+
+        # project(), fpdiv(xy, abs(z)) >> 16
+        az = z if z >= 0 else 0 - z
+        d = az >> 3
+        sx = x if d == 0 else ((x << 3) // d) << 10
+        sy = y if d == 0 else ((y << 3) // d) << 10
+        sx = (sx >> 16) + cx
+        sy = (sy >> 16) + cy
+        size = 1
+        if v != 0:
+            d = (_SIZE_SCALE * (z >> 8)) >> 3
+            size = (p[P_DEPTH] if d == 0 else (depth // d) << 10) >> 16
+        if (0 - size < sx) and (sx < w + size) and (0 - size < sy) and (sy < h + size):
+            k = visible << 2
+            o[k] = sx
+            o[k + 1] = sy
+            o[k + 2] = size
+            o[k + 3] = s[STAR_COLOUR*n + i]
+            visible += 1
+
+        # move forward
+        if v == 0:
+            x += dx
+            if (x > bound) or (x < 0 - bound):
+                x = 0 - x
+            y += dy
+            if (y > bound) or (y < 0 - bound):
+                y = 0 - y
+        z -= (v >> 8) * speed
+
+        # rotate around the z axis, y uses the rotated x like rotate_z_x/rotate_z_y did
+        if rotate != 0:
+            x = (x >> 8) * c - (y >> 8) * sn
+            y = (x >> 8) * sn + (y >> 8) * c
+
+        s[i] = x
+        s[STAR_Y*n + i] = y
+        s[STAR_Z*n + i] = z
+        if z < 65536:
+            o[respawn + r] = i
+            r += 1
+    p[P_RESPAWN] = r
+    return visible
@@ -0,0 +1,112 @@
+#reference IMA ADPCM decoder and golden vectors for imastream.py, plain Python so it runs under CPython and on the device.
+#games are installed one folder at a time, so each game ships an identical copy of this file (and imastream.py) - change them together.
+#usage (CPython):
+#    python imatool.py check                          run the reference decoder against the golden vectors
+#    python imatool.py decode in.ima out.wav [rate]   decode raw (or IMAA header) IMA ADPCM to 16-bit mono WAV
+#on the device, imastream.selfcheck() runs the viper decoder against the same vectors.
+
+import struct
+
+INDEXTABLE = (-1, -1, -1, -1, 2, 4, 6, 8, -1, -1, -1, -1, 2, 4, 6, 8)
+
+STEPTABLE = (
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17,
+    19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+    50, 55, 60, 66, 73, 80, 88, 97, 107, 118,
+    130, 143, 157, 173, 190, 209, 230, 253, 279, 307,
+    337, 371, 408, 449, 494, 544, 598, 658, 724, 796,
+    876, 963, 1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066,
+    2272, 2499, 2749, 3024, 3327, 3660, 4026, 4428, 4871, 5358,
+    5894, 6484, 7132, 7845, 8630, 9493, 10442, 11487, 12635, 13899,
+    15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794, 32767
+)
+
+UNITY = 32768 #Q15 volume
+
+
+def decode(adpcm, volume=UNITY, prediction=0, index=0): #bytes to signed 16-bit samples, high nibble first
+    out = []
+    for byte in adpcm:
+        for delta in (byte >> 4, byte & 0b1111):
+            step = STEPTABLE[index]
+            diff = step >> 3
+            if delta & 0b100: diff += step
+            if delta & 0b10: diff += step >> 1
+            if delta & 0b1: diff += step >> 2
+            if delta & 0b1000: prediction = max(-32768, prediction - diff)
+            else: prediction = min(32767, prediction + diff)
+            index = min(88, max(0, index + INDEXTABLE[delta]))
+            out.append(max(-32768, min(32767, (prediction*volume) >> 15)))
+    return out
+
+
+def pattern(n, seed): #deterministic pseudo-random ADPCM bytes for the golden vectors
+    out = bytearray(n)
+    for i in range(n):
+        seed = (seed*1103515245 + 12345) & 0x7fffffff
+        out[i] = seed >> 16 & 0xff
+    return bytes(out)
+
+
+def checksum(samples): #position-weighted, so swapped or shifted samples change it
+    total = 0
+    for i, sample in enumerate(samples):
+        total = (total + (i + 1)*(sample & 0xffff)) & 0xffffffff
+    return total
+
+
+#name, ADPCM bytes, Q15 volume, sample count, first samples, checksum of all samples
+#the unity vectors were checked against CPython's audioop.adpcm2lin, which implements the same IMA/DVI decoder
+GOLDEN = (
+    ("rise", b"\x77"*8 + b"\x00"*8, UNITY, 32,
+        (11, 41, 104, 240, 533, 1164, 2521, 5431), 15926293),
+    ("clamp", b"\x77"*48 + b"\xff"*96, UNITY, 288,
+        (11, 41, 104, 240, 533, 1164, 2521, 5431), 1362691352),
+    ("random", pattern(1024, 1), UNITY, 2048,
+        (-7, 7, 37, -18, -25, -6, 75, -2), 2557852735),
+    ("half", pattern(1024, 1), UNITY >> 1, 2048,
+        (-4, 3, 18, -9, -13, -3, 37, -1), 217500801),
+    ("double", b"\x77"*48 + pattern(256, 7), 65535, 608,
+        (21, 81, 207, 479, 1065, 2327, 5041, 10861), 1724607159),
+)
+
+
+def check(decoder=decode): #run decoder(adpcm, volume) against the golden vectors, returns the names that failed
+    failed = []
+    for name, adpcm, volume, count, first, total in GOLDEN:
+        out = decoder(adpcm, volume)
+        if out is None or len(out) != count or tuple(out[:len(first)]) != first or checksum(out) != total:
+            failed.append(name)
+    return failed
+
+
+def readima(path): #(sample rate or None, ADPCM bytes), IMAA headers are 24 bytes: magic, rate, sample count and padding
+    with open(path, "rb") as f:
+        raw = f.read()
+    if raw[:4] == b"IMAA":
+        rate, count = struct.unpack_from("<II", raw, 4)
+        return rate, raw[24:24 + (count + 1)//2]
+    return None, raw
+
+
+if __name__ == "__main__":
+    import sys
+    import wave
+    args = sys.argv[1:]
+    if args[:1] == ["check"]:
+        failed = check()
+        print("failed: " + ", ".join(failed) if failed else f"{len(GOLDEN)} golden vectors OK")
+        sys.exit(1 if failed else 0)
+    elif args[:1] == ["decode"] and len(args) in (3, 4):
+        rate, adpcm = readima(args[1])
+        if len(args) == 4: rate = int(args[3])
+        if rate is None: sys.exit("raw IMA files don't contain a sample rate, pass one")
+        samples = decode(adpcm)
+        with wave.open(args[2], "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(rate)
+            w.writeframes(struct.pack(f"<{len(samples)}h", *samples))
+        print(f"{len(samples)} samples at {rate}Hz")
+    else:
+        sys.exit("usage: imatool.py check | decode in.ima out.wav [rate]")
@@ -35,6 +35,7 @@ audio_close_ids = None
 play_cutscene_animation = None
 create_cancel_callback = None
 create_sprite = None
+clear_sprite_cache = None
 
 # Platform-specific imports using try/except
 if IS_THUMBY_COLOR:
@@ -49,11 +50,12 @@ if IS_THUMBY_COLOR:
     buttonMENU = ButtonClass(engine_io.MENU)
     # Try to import ThumbyColor display and sprite classes
     try:
-        from thumbycolor_native import ColorDisplay, ColorSprite, _rumble, create_sprite as _create_sprite
+        from thumbycolor_native import ColorDisplay, ColorSprite, _rumble, create_sprite as _create_sprite, frame_cache
         display = ColorDisplay()
         Sprite = ColorSprite
         rumble = _rumble
         create_sprite = _create_sprite
+        clear_sprite_cache = frame_cache.clear
         print(f"ThumbyColor display initialized. Free memory: {gc.mem_free()}")
     except ImportError as e:
         print(f"Warning: Could not import thumbycolor_native: {e}")
@@ -72,7 +74,12 @@ if IS_THUMBY_COLOR:
         audio_play_id = play_id
         audio_close_ids = close_ids
         from cutscene_utils import init_cutscene_utils, play_cutscene_animation as _play_cutscene, create_cancel_callback as _create_cancel
-        play_cutscene_animation = _play_cutscene
+        def play_cutscene_animation(filename, fps=20, frame_callback=None):
+            """Free the cached sprite frames for the cutscene buffers, then play it"""
+            if clear_sprite_cache:
+                clear_sprite_cache()
+                gc.collect()
+            _play_cutscene(filename, fps, frame_callback)
         create_cancel_callback = _create_cancel
         init_cutscene_utils(display, PC, audio_load, audio_play, audio_stop, buttonMENU)
         print(f"Audio and Color Cutscene initialized. Free memory: {gc.mem_free()}")
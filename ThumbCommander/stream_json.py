@@ -1,7 +1,14 @@
 # stream_json.py - Generic streaming JSON parser for memory-constrained devices
 # Reads JSON files line-by-line without loading entire file into memory
+# Array objects are found through a byte offset index, cached in a sidecar file
 
 from gc import collect
+from os import stat
+from array import array
+import struct
+
+INDEX_MAGIC = b'SJI1'
+_index = None  # ((filepath, array_name, size, mtime), spans) of the last index used
 
 def extract_str(line, key):
     """Extract string value from a JSON line like: "key": "value"
@@ -51,79 +58,113 @@ def read_fields(filepath, fields, max_lines=10):
 
 def _find_array_start(f, array_name):
     """Find file position after array '[' for given array name
-    Returns position or -1. File handle must be open."""
-    target = f'"{array_name}"'
+    Returns position or -1. File handle must be open, text or binary."""
+    target, bracket = f'"{array_name}"', '['
     while True:
         line = f.readline()
         if not line: return -1
+        if isinstance(line, bytes) and isinstance(target, str):
+            target, bracket = target.encode(), b'['
         if target in line:
-            bracket_pos = line.find('[')
+            bracket_pos = line.find(bracket)
             if bracket_pos >= 0:
                 return f.tell() - len(line) + bracket_pos + 1
             pos = f.tell()
             line = f.readline()
             if not line: return -1
-            bracket_pos = line.find('[')
+            bracket_pos = line.find(bracket)
             if bracket_pos >= 0:
                 return pos + bracket_pos + 1
             return -1
 
-def count_array(filepath, array_name):
-    """Count objects in named array using streaming - no full file load"""
+def _scan_spans(f, arr_pos):
+    """Byte spans of the objects in the array starting at arr_pos
+    Returns flat array of start, end pairs. File handle must be binary."""
+    f.seek(arr_pos)
+    spans = array('I')
+    pos, depth, start = arr_pos - 1, 0, 0
+    in_str, escaped = False, False
+    while True:
+        chunk = f.read(256)
+        if not chunk: break
+        for c in chunk:
+            pos += 1
+            if in_str:
+                if escaped: escaped = False
+                elif c == 92: escaped = True  # backslash
+                elif c == 34: in_str = False  # quote
+            elif c == 34: in_str = True
+            elif c == 123:  # {
+                if depth == 0: start = pos
+                depth += 1
+            elif c == 125:  # }
+                depth -= 1
+                if depth == 0:
+                    spans.append(start)
+                    spans.append(pos + 1)
+            elif c == 93 and depth == 0:  # ]
+                return spans
+    return spans
+
+def _index_path(filepath, array_name):
+    return f"{filepath}.{array_name}.idx"
+
+def _load_index(path, size, mtime):
+    """Read a sidecar index, returns spans or None if missing or stale"""
     try:
-        with open(filepath, 'r') as f:
-            arr_pos = _find_array_start(f, array_name)
-            if arr_pos < 0: return 0
-            f.seek(arr_pos)
-            count, depth = 0, 0
-            while True:
-                line = f.readline()
-                if not line: break
-                for c in line:
-                    if c == '{': depth += 1
-                    elif c == '}':
-                        depth -= 1
-                        if depth == 0: count += 1
-                    elif c == ']' and depth == 0:
-                        return count
-            return count
-    except: return 0
+        with open(path, 'rb') as f:
+            magic, isize, imtime, count = struct.unpack('<4sIII', f.read(16))
+            if magic != INDEX_MAGIC or isize != size or imtime != mtime: return None
+            spans = array('I', bytes(count * 8))
+            if f.readinto(spans) != count * 8: return None
+            return spans
+    except: return None
+
+def _save_index(path, size, mtime, spans):
+    try:
+        with open(path, 'wb') as f:
+            f.write(struct.pack('<4sIII', INDEX_MAGIC, size, mtime, len(spans) // 2))
+            f.write(spans)
+    except: pass  # read-only storage, the index is rebuilt next time
+
+def array_index(filepath, array_name):
+    """Byte spans of the objects in named array, as a flat array of start, end pairs
+    Built with one pass over the file, then kept in memory and in a sidecar file
+    next to it until the file's size or mtime changes. Returns None if not found"""
+    global _index
+    try:
+        st = stat(filepath)
+        key = (filepath, array_name, st[6], st[8] & 0xffffffff)
+        if _index and _index[0] == key: return _index[1]
+        path = _index_path(filepath, array_name)
+        spans = _load_index(path, key[2], key[3])
+        if spans is None:
+            with open(filepath, 'rb') as f:
+                arr_pos = _find_array_start(f, array_name)
+                if arr_pos < 0: return None
+                spans = _scan_spans(f, arr_pos)
+            _save_index(path, key[2], key[3], spans)
+        _index = (key, spans)
+        return spans
+    except: return None
+
+def count_array(filepath, array_name):
+    """Count objects in named array using the offset index"""
+    spans = array_index(filepath, array_name)
+    return len(spans) // 2 if spans else 0
 
 def get_array_object(filepath, array_name, idx):
-    """Get object at index from named array using streaming
+    """Get object at index from named array using the offset index
     Returns parsed object dict or None"""
+    spans = array_index(filepath, array_name)
+    if not spans or idx < 0 or idx * 2 >= len(spans): return None
     try:
-        with open(filepath, 'r') as f:
-            arr_pos = _find_array_start(f, array_name)
-            if arr_pos < 0: return None
-            f.seek(arr_pos)
-            depth, count = 0, 0
-            obj_start, obj_end = -1, -1
-            while True:
-                pos = f.tell()
-                line = f.readline()
-                if not line: break
-                for i, c in enumerate(line):
-                    if c == '{':
-                        if depth == 0 and count == idx:
-                            obj_start = pos + i
-                        depth += 1
-                    elif c == '}':
-                        depth -= 1
-                        if depth == 0:
-                            if count == idx:
-                                obj_end = pos + i + 1
-                                break
-                            count += 1
-                    elif c == ']' and depth == 0:
-                        return None
-                if obj_end > 0: break
-            if obj_start < 0 or obj_end < 0: return None
-            f.seek(obj_start)
-            obj_str = f.read(obj_end - obj_start)
-            import json
-            result = json.loads(obj_str)
-            collect()
-            return result
+        with open(filepath, 'rb') as f:
+            f.seek(spans[idx * 2])
+            obj_str = f.read(spans[idx * 2 + 1] - spans[idx * 2])
+        import json
+        result = json.loads(obj_str.decode())
+        collect()
+        return result
     except: pass
     return None
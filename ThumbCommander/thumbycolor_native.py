@@ -2,6 +2,7 @@
 from array import array
 import gc
 import struct
+from collections import OrderedDict
 from platform_constants import get_constants
 from engine_draw import back_fb
 from  engine import time_to_next_tick, tick, fps_limit
@@ -226,6 +227,119 @@ class ColorDisplay:
             # Fallback if font not found
             self.font_bmap = None
             
+FRAME_CACHE_FRAMES = 6      # Frames kept per sheet whose frames are picked by position
+FRAME_CACHE_SEQUENCE = 16   # Longest animation kept whole, longer ones stream from the file
+FRAME_CACHE_SHARE = 2       # The cache may grow to 1/FRAME_CACHE_SHARE of free RAM
+
+class FrameCache:
+    """Shared LRU cache of sprite frames streamed from .COL.bin files
+
+    The budget is the working set of the sprites loaded so far: a few frames
+    of sheets that jump between frames, whole short animations of sheets that
+    play in order. Single frame sprites and long animations bypass it.
+    """
+
+    def __init__(self):
+        self.budget = 0
+        self.used = 0
+        self.entries = OrderedDict()  # (file id << 16) | frame: buffer, least recently used first
+        self.file_ids = {}  # filename: file id
+        self.reserved = {}  # file id: bytes of budget
+        self.hits = 0
+        self.misses = 0
+        self.prefetches = 0
+        self.evictions = 0
+
+    def file_id(self, filename):
+        """Small int identifying a sprite file in cache keys"""
+        if filename not in self.file_ids:
+            self.file_ids[filename] = len(self.file_ids) + 1
+        return self.file_ids[filename]
+
+    def reserve(self, sprite):
+        """Size the budget share of a sprite sheet from how it's animated"""
+        frames = 0
+        if sprite.frameCount > 1:
+            if not sprite.sequential:
+                frames = min(sprite.frameCount, FRAME_CACHE_FRAMES)
+            elif sprite.frameCount <= FRAME_CACHE_SEQUENCE:
+                frames = sprite.frameCount
+        size = frames * sprite.bytes_per_frame
+        old = self.reserved.get(sprite.cache_id, 0)
+        if size > old:
+            gc.collect()
+            size = min(size, old + max(0, gc.mem_free() // FRAME_CACHE_SHARE - (self.budget - self.used)))
+        self.reserved[sprite.cache_id] = size
+        self.set_budget(self.budget - old + size)
+
+    def _evict(self):
+        """Drop the least recently used frame, returns its buffer"""
+        key = next(iter(self.entries))
+        buffer = self.entries.pop(key)
+        self.used -= len(buffer)
+        self.evictions += 1
+        return buffer
+
+    def _take(self, size):
+        """Buffer for a new frame within the budget, reusing an evicted one of the same size
+        Returns None if the frame alone is over budget"""
+        if size > self.budget: return None
+        spare = None
+        while self.used + size > self.budget:
+            buffer = self._evict()
+            if len(buffer) == size: spare = buffer
+        self.used += size
+        return spare if spare is not None else bytearray(size)
+
+    def load(self, sprite, frame):
+        """Fill sprite.frame_data with frame, from RAM when cached"""
+        size = sprite.bytes_per_frame
+        f = sprite.file_handle
+        if not self.reserved.get(sprite.cache_id):
+            f.seek(8 + frame * size)
+            f.readinto(sprite.frame_data)
+            return
+        key = (sprite.cache_id << 16) | frame
+        buffer = self.entries.pop(key, None)
+        if buffer is not None:
+            self.entries[key] = buffer  # now the most recently used
+            self.hits += 1
+            sprite.frame_data[:] = buffer
+            return
+        self.misses += 1
+        f.seek(8 + frame * size)
+        f.readinto(sprite.frame_data)
+        buffer = self._take(size)
+        if buffer is None: return
+
+        # Animations that play in order read the next frame on without seeking.
+        # It goes in as older than this frame, so it's evicted first if unused.
+        if sprite.sequential and frame + 1 < sprite.frameCount and key + 1 not in self.entries \
+                and self.used + size <= self.budget:
+            ahead = self._take(size)
+            f.readinto(ahead)
+            self.entries[key + 1] = ahead
+            self.prefetches += 1
+        buffer[:] = sprite.frame_data
+        self.entries[key] = buffer
+
+    def set_budget(self, budget):
+        """Change the byte budget, evicting frames until it fits"""
+        self.budget = budget
+        while self.used > budget:
+            self._evict()
+
+    def clear(self):
+        """Drop every cached frame, the budget stays for when they're needed again"""
+        self.entries = OrderedDict()
+        self.used = 0
+
+    def stats(self):
+        """Hits, misses, prefetches, evictions, bytes in use and budget"""
+        return self.hits, self.misses, self.prefetches, self.evictions, self.used, self.budget
+
+frame_cache = FrameCache()
+
 class ColorSprite:
     """Native resolution sprite for ThumbyColor with efficient scaling"""
     
@@ -244,6 +358,7 @@ class ColorSprite:
         # File handle for efficient frame switching
         self.file_handle = None
         self.frame_data = None
+        self.sequential = False  # Frames play in order, see setSequential()
         
         # Detect if this is a color sprite
         if isinstance(bitmapData, str) and bitmapData.endswith('.COL.bin'):
@@ -281,7 +396,9 @@ class ColorSprite:
         self.frame_data = bytearray(self.bytes_per_frame)
         
         # Load first frame
-        self.file_handle.readinto(self.frame_data)
+        self.cache_id = frame_cache.file_id(filename)
+        frame_cache.reserve(self)
+        frame_cache.load(self, 0)
         
         # Create memoryview for efficient access
         self.frame_view = memoryview(self.frame_data)
@@ -291,20 +408,22 @@ class ColorSprite:
     
     @micropython.native  
     def setFrame(self, frame):
-        """Set animation frame efficiently using seek"""
+        """Set animation frame, from the shared frame cache or the file"""
         if frame == self.currentFrame:
             return
             
         self.currentFrame = frame % self.frameCount
         
         if self.file_handle:
-            # Seek to frame position
-            frame_offset = 8 + self.currentFrame * self.bytes_per_frame
-            self.file_handle.seek(frame_offset)
-            
-            # Read frame data directly into buffer
-            self.file_handle.readinto(self.frame_data)
+            frame_cache.load(self, self.currentFrame)
     
+    def setSequential(self, sequential=True):
+        """Mark an animation that plays its frames in order, so the frame cache
+        keeps it whole (or streams it when it's long) and reads ahead"""
+        self.sequential = sequential
+        if self.file_handle:
+            frame_cache.reserve(self)
+
     @micropython.native  
     def setScale(self, scale):
         """Set sprite scale in fixed point"""